@@ -0,0 +1,47 @@
+from wagtail.models import Site
+
+from toolkit.content.models import SectionRootWithLinks
+import toolkit.util.cache as toolkit_cache
+
+
+def _menu_entry(page, request):
+    return {
+        "title": page.seo_title or page.title,
+        "url": page.get_url(request=request),
+    }
+
+
+def _build_site_menu(request):
+    site = Site.find_for_request(request)
+    if site is None:
+        return []
+    menu = []
+    for page in site.root_page.get_children().live().in_menu().specific():
+        entry = _menu_entry(page, request)
+        entry["children"] = None
+        if isinstance(page, SectionRootWithLinks):
+            # Don't actually link to the page (as there isn't any content!),
+            # just list its children and links:
+            entry["url"] = None
+            entry["children"] = [
+                _menu_entry(child, request)
+                for child in page.get_children().live().in_menu()
+            ] + [
+                {"title": link.text, "url": link.link}
+                for link in page.links.all()
+            ]
+        menu.append(entry)
+    return menu
+
+
+def site_menu(request):
+    # The CMS pages (and links) in the site navigation menu, kept in memory
+    # until a page is published/moved/etc. (see toolkit.diary.signals). Which
+    # site the menu is for depends on the host name, so that's the key:
+    return {
+        "site_menu": toolkit_cache.get_local(
+            toolkit_cache.NAVIGATION,
+            ("site_menu", request.get_host(), request.is_secure()),
+            lambda: _build_site_menu(request),
+        )
+    }
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class DiaryConfig(AppConfig):
+    name = "toolkit.diary"
+    label = "diary"
+
+    def ready(self):
+        # Connect signal handlers:
+        import toolkit.diary.signals  # noqa: F401
@@ -0,0 +1,146 @@
+"""
+Creating events and series of showings ("bookings") in bulk.
+
+Saving showings one at a time, and then setting up the rota for each of them,
+costs dozens of queries per showing. These functions build all the showings
+in memory, validate them together, and insert them and their rota entries
+with a handful of queries, all inside one transaction.
+
+Note that bulk_create() doesn't send post_save signals, so the cached copies
+of the programme and calendar are thrown away explicitly.
+"""
+
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+
+from toolkit.diary import clashes
+from toolkit.diary.models import RotaEntry, Showing
+import toolkit.util.cache as toolkit_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _validate_showings(showings, allow_past):
+    # Check all the showings, and report all the problems in one go. The
+    # event and room foreign keys aren't checked, as that needs a query per
+    # showing (and they come from saved objects anyway):
+    exclude = ["event", "room"]
+    if allow_past:
+        exclude.append("start")
+    errors = []
+    for showing in showings:
+        try:
+            showing.full_clean(exclude=exclude, validate_unique=False)
+        except ValidationError as exc:
+            errors.extend(
+                f"{showing.start:%d/%m/%Y %H:%M}: {message}"
+                for message in exc.messages
+            )
+    if errors:
+        raise ValidationError(errors)
+
+
+def _insert_showings(event, showings):
+    db = Showing.objects.db
+    if connections[db].features.can_return_rows_from_bulk_insert:
+        return Showing.objects.bulk_create(showings)
+
+    # Some backends (MySQL) can't return the ids of the inserted rows, and
+    # they're needed for the rota entries, so look them up afterwards (this
+    # must be in the same transaction as the insert):
+    existing_ids = list(event.showings.values_list("pk", flat=True))
+    Showing.objects.bulk_create(showings)
+    new_ids = {}
+    for pk, start in (
+        event.showings.filter(start__in=[s.start for s in showings])
+        .exclude(pk__in=existing_ids)
+        .order_by("pk")
+        .values_list("pk", "start")
+    ):
+        new_ids.setdefault(start, []).append(pk)
+    for showing in showings:
+        showing.pk = new_ids[showing.start].pop(0)
+        showing._state.adding = False
+        showing._state.db = db
+    return showings
+
+
+def find_room_clashes(room, starts, duration):
+    """Return a dict mapping each of the given start times which would
+    overlap an existing (not cancelled) showing in room, for a showing of the
+    given duration (a datetime.time), to the list of Bookings (see
+    toolkit.diary.clashes) it would clash with. Uses one query, however many
+    start times there are."""
+    if room is None or not starts:
+        return {}
+    ends = [Showing.calculate_end_time(start, duration) for start in starts]
+    index = clashes.RoomClashIndex.for_range(
+        min(starts), max(ends), rooms=[room]
+    )
+    found = {}
+    for start, end in zip(starts, ends):
+        overlapping = index.overlapping(room.pk, start, end)
+        if overlapping:
+            found[start] = overlapping
+    return found
+
+
+def create_showings(event, starts, rota_from=None, allow_past=False, **fields):
+    """Create a showing of event (which must already be saved) at each of the
+    given start times, with any other keyword arguments used as field values
+    for all of them. Each showing gets a copy of the rota of the showing
+    rota_from, if that's given, otherwise the default rota for the event's
+    template.
+
+    Raises ValidationError (and creates nothing) if any of the showings are
+    invalid, including if any start in the past and allow_past isn't set.
+    Returns the list of new showings."""
+    assert event.pk is not None
+
+    showings = [
+        Showing(event=event, start=start, **fields) for start in starts
+    ]
+    _validate_showings(showings, allow_past)
+
+    if rota_from is not None:
+        rota_template = list(rota_from.rotaentry_set.select_related("role"))
+    elif event.template_id is not None:
+        rota_template = [
+            RotaEntry(role=role) for role in event.template.roles.all()
+        ]
+    else:
+        rota_template = []
+
+    with transaction.atomic():
+        showings = _insert_showings(event, showings)
+        RotaEntry.objects.bulk_create(
+            RotaEntry(
+                showing=showing,
+                role=entry.role,
+                required=entry.required,
+                rank=entry.rank,
+            )
+            for showing in showings
+            for entry in rota_template
+        )
+        toolkit_cache.invalidate_on_commit(toolkit_cache.PROGRAMME)
+        toolkit_cache.invalidate_on_commit(toolkit_cache.DIARY_CALENDAR)
+
+    logger.info(
+        f"Created {len(showings)} showings of event {event.pk}, with "
+        f"{len(rota_template)} rota entries each"
+    )
+    return showings
+
+
+def create_event_with_showings(event, starts, **kwargs):
+    """Save the new event, set its tags from its template, and create showings
+    of it at the given start times (see create_showings for the other
+    arguments). Either all of that happens, or none of it does. Returns the
+    list of new showings."""
+    with transaction.atomic():
+        event.save()
+        event.reset_tags_to_default()
+        return create_showings(event, starts, **kwargs)
@@ -0,0 +1,175 @@
+"""
+Finding showings that overlap in the same room (only relevant when
+MULTIROOM_ENABLED is set).
+
+Checking each showing with its own query gets slow for a calendar month or a
+series of bookings, so RoomClashIndex loads the (not cancelled) showings in a
+range of time with one query, and keeps them sorted by start time in each
+room so that "what overlaps this?" is a binary search.
+"""
+
+import bisect
+import collections
+import datetime
+
+import django.utils.timezone as timezone
+
+from toolkit.diary.models import Showing
+
+# Event.duration is a time, so nothing lasts longer than this; anything that
+# overlaps a range of time starts no more than this before it:
+MAX_SHOWING_LENGTH = datetime.timedelta(days=1)
+
+Booking = collections.namedtuple(
+    "Booking", "showing_id event_id event_name room_id start end"
+)
+
+
+def load_bookings(start, end, rooms=None, exclude=()):
+    """Return a list of Bookings for the showings which aren't cancelled, are
+    in a room (optionally one of the given rooms) and overlap the time from
+    start to end, excluding any with ids in exclude."""
+    showings = Showing.objects.filter(
+        cancelled=False,
+        room__isnull=False,
+        start__gt=start - MAX_SHOWING_LENGTH,
+        start__lt=end,
+    )
+    if rooms is not None:
+        showings = showings.filter(room__in=rooms)
+    exclude = [pk for pk in exclude if pk is not None]
+    if exclude:
+        showings = showings.exclude(pk__in=exclude)
+    bookings = []
+    for (
+        pk,
+        event_id,
+        name,
+        room_id,
+        showing_start,
+        duration,
+    ) in showings.values_list(
+        "pk",
+        "event_id",
+        "event__name",
+        "room_id",
+        "start",
+        "event__duration",
+    ).iterator():
+        showing_end = Showing.calculate_end_time(showing_start, duration)
+        if showing_end > start:
+            bookings.append(
+                Booking(
+                    pk, event_id, name, room_id, showing_start, showing_end
+                )
+            )
+    return bookings
+
+
+class RoomClashIndex:
+    """The bookings in each room, sorted by start time. Only complete for
+    times inside the range the bookings were loaded for."""
+
+    def __init__(self, bookings):
+        self._bookings = collections.defaultdict(list)
+        for booking in sorted(bookings, key=lambda b: b.start):
+            self._bookings[booking.room_id].append(booking)
+        self._starts = {
+            room_id: [booking.start for booking in room_bookings]
+            for room_id, room_bookings in self._bookings.items()
+        }
+        # Longest booking in each room, to limit how far back to look:
+        self._longest = {
+            room_id: max(b.end - b.start for b in room_bookings)
+            for room_id, room_bookings in self._bookings.items()
+        }
+
+    @classmethod
+    def for_range(cls, start, end, rooms=None):
+        return cls(load_bookings(start, end, rooms))
+
+    def overlapping(self, room_id, start, end):
+        """Return the list of bookings in the room which overlap the time
+        from start to end (ending as another starts doesn't count)"""
+        starts = self._starts.get(room_id)
+        if not starts:
+            return []
+        first = bisect.bisect_right(starts, start - self._longest[room_id])
+        last = bisect.bisect_left(starts, end)
+        return [
+            booking
+            for booking in self._bookings[room_id][first:last]
+            if booking.end > start
+        ]
+
+    def clashing_showing_ids(self):
+        """Return the set of ids of showings which overlap another"""
+        clashing = set()
+        for room_id, room_bookings in self._bookings.items():
+            for booking in room_bookings:
+                if any(
+                    other is not booking
+                    for other in self.overlapping(
+                        room_id, booking.start, booking.end
+                    )
+                ):
+                    clashing.add(booking.showing_id)
+        return clashing
+
+
+def find_showing_clashes(showings):
+    """Check a list of new or changed (unsaved) showings for clashes, with
+    each other or with the showings already in the database. Returns a list
+    with, for each of the showings, a list of the Bookings it overlaps."""
+    bookings = [
+        (
+            Booking(
+                showing.pk,
+                showing.event_id,
+                showing.event.name,
+                showing.room_id,
+                showing.start,
+                showing.end_time,
+            )
+            if showing.room_id and not showing.cancelled
+            else None
+        )
+        for showing in showings
+    ]
+    checked = [booking for booking in bookings if booking is not None]
+    if not checked:
+        return [[] for showing in showings]
+
+    index = RoomClashIndex(
+        load_bookings(
+            min(booking.start for booking in checked),
+            max(booking.end for booking in checked),
+            rooms={booking.room_id for booking in checked},
+            # The database has the old versions of changed showings:
+            exclude=[showing.pk for showing in showings],
+        )
+        + checked
+    )
+    return [
+        (
+            [
+                other
+                for other in index.overlapping(
+                    booking.room_id, booking.start, booking.end
+                )
+                if other is not booking
+            ]
+            if booking is not None
+            else []
+        )
+        for booking in bookings
+    ]
+
+
+def describe(bookings):
+    """Describe a list of clashing bookings, for error messages"""
+    return "Overlaps " + ", ".join(
+        f"'{booking.event_name}' at "
+        f"{timezone.localtime(booking.start):%H:%M on %d/%m/%Y}"
+        for booking in bookings
+    )
@@ -0,0 +1,97 @@
+"""
+Support for conditional GET (ETag / Last-Modified) on the public diary views,
+so that browsers, feed readers and proxies re-polling a page that hasn't
+changed get a 304 rather than a freshly rendered template.
+
+The validators are built from a cheap aggregate over the same queryset of
+showings that the page shows, plus the generation of the programme cache
+(which changes when things that don't have an updated_at column, like tags
+or media items, are edited, or when showings are deleted or events made
+private). Clients that only send If-Modified-Since never see the ETag, so
+Last-Modified is the later of the newest updated_at and the time the
+programme cache was last invalidated, to make it move whenever the ETag does.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max, Q, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+import django.utils.timezone as timezone
+
+import toolkit.util.cache as toolkit_cache
+
+
+def showing_validators(showings, *extra, include_started=False):
+    """Return (etag, last_modified) for the given queryset of showings.
+    last_modified is a unix timestamp (or None if there are no showings).
+
+    Anything in extra is folded into the ETag. If include_started is True
+    then the number of showings that have started is too, and the start of
+    the latest one is folded into last_modified, for pages that display
+    differently once showings are in the past"""
+    aggregates = {
+        "count": Count("pk"),
+        "pk_sum": Sum("pk"),
+        "showings_updated": Max("updated_at"),
+        "events_updated": Max("event__updated_at"),
+    }
+    if include_started:
+        started = Q(start__lt=timezone.now())
+        aggregates["started"] = Count("pk", filter=started)
+        # The page changed when the last showing started, too:
+        aggregates["last_started"] = Max("start", filter=started)
+    summary = showings.order_by().aggregate(**aggregates)
+
+    updated = [
+        dt.timestamp()
+        for dt in (
+            summary["showings_updated"],
+            summary["events_updated"],
+            summary.get("last_started"),
+        )
+        if dt is not None
+    ]
+    last_modified = None
+    if updated:
+        updated.append(
+            toolkit_cache.get_invalidated_time(toolkit_cache.PROGRAMME)
+        )
+        last_modified = int(max(updated))
+
+    etag_source = "/".join(
+        str(part)
+        for part in (
+            toolkit_cache.get_generation(toolkit_cache.PROGRAMME),
+            summary["count"],
+            summary["pk_sum"],
+            summary.get("started"),
+            last_modified,
+        )
+        + extra
+    )
+    etag = '"{}"'.format(hashlib.md5(etag_source.encode("utf-8")).hexdigest())
+
+    return etag, last_modified
+
+
+def set_validator_headers(response, etag, last_modified):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def respond_conditionally(request, validators, render):
+    """Return a 304 if the request's If-None-Match/If-Modified-Since headers
+    match the (etag, last_modified) validators, otherwise call render() to
+    generate the response"""
+    etag, last_modified = validators
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = render()
+        if response.status_code != 200:
+            return response
+    return set_validator_headers(response, etag, last_modified)
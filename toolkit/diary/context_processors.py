@@ -1,6 +1,7 @@
 from django.conf import settings
 
 from toolkit.diary.models import EventTag
+import toolkit.util.cache as toolkit_cache
 
 
 def diary_settings(request):
@@ -8,6 +9,12 @@ def diary_settings(request):
 
 
 def promoted_tags(request):
-    # This returns a QuerySet, so the database won't get accessed unless
-    # 'promoted_tags' is referenced.
-    return {"promoted_tags": EventTag.objects.filter(promoted=True)}
+    # This is on (nearly) every public page, so is kept in memory until a tag
+    # changes (see toolkit.diary.signals)
+    return {
+        "promoted_tags": toolkit_cache.get_local(
+            toolkit_cache.NAVIGATION,
+            "promoted_tags",
+            lambda: list(EventTag.objects.filter(promoted=True)),
+        )
+    }
@@ -1,14 +1,16 @@
 import json
 import datetime
 import logging
-import csv
 
 from collections import OrderedDict
 
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.http import (
     HttpResponse,
     Http404,
     HttpResponseRedirect,
+    StreamingHttpResponse,
 )
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
@@ -18,12 +20,14 @@ from django.contrib import messages
 from django.views.generic import View
 import django.template
 import django.db
-from django.db.models import Q
+from django.db.models import F, Q
 import django.utils.timezone as timezone
 from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.views.decorators.http import require_POST, require_http_methods
+from django.utils.dateparse import parse_datetime
 from django.utils.html import escape
+from django.utils.http import urlencode
 
 from toolkit.diary.models import (
     Showing,
@@ -39,15 +43,28 @@ from toolkit.diary.models import (
 )
 import toolkit.diary.forms as diary_forms
 import toolkit.diary.edit_prefs as edit_prefs
+import toolkit.diary.search as event_search
+import toolkit.diary.bookings as bookings
+import toolkit.diary.clashes as clashes
 from toolkit.util.image import adjust_colour
+import toolkit.util.cache as toolkit_cache
+import toolkit.util.csv_export as csv_export
 from toolkit.diary.form_widgets import ChosenSelectMultiple
 
 # Shared utility method:
 from toolkit.diary.daterange import get_date_range
+from toolkit.diary.templatetags.showing_date_format import (
+    set_public_showing_dates,
+)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Changes to the rota are fetched from a little before the last fetch, so
+# that rows saved with an earlier updated_at but committed after it (by a
+# slow request) aren't missed. (Sending the same change again is harmless)
+ROTA_CHANGES_OVERLAP = datetime.timedelta(minutes=1)
+
 
 def _return_to_editindex(request):
     # If the user has set the 'popup' preference, then close the popup
@@ -221,89 +238,177 @@ def _adjust_colour_historic(colour):
     )
 
 
-@permission_required("toolkit.read")
-def edit_diary_data(request):
-    date_format = "%Y-%m-%d"
-
-    current_tz = timezone.get_current_timezone()
-    try:
-        start_raw = request.GET.get("start", None)
-        end_raw = request.GET.get("end", None)
-        start_raw = start_raw.partition("T")[0] if start_raw else None
-        end_raw = end_raw.partition("T")[0] if end_raw else None
-        start = datetime.datetime.strptime(start_raw, date_format).replace(
-            tzinfo=current_tz
-        )
-        end = datetime.datetime.strptime(end_raw, date_format).replace(
-            tzinfo=current_tz
-        )
-    except (ValueError, TypeError):
-        logger.error(
-            f"Invalid value in date range, one of start '{start_raw}' or end, '{end_raw}'"
-        )
-        raise Http404("Invalid request")
-
+def _diary_data_json(start, end, local_now):
+    """Return (json, valid_until) for the showings between start and end,
+    where valid_until is the start of the first showing that's not yet in
+    the past (or None)"""
     showings = (
         Showing.objects.start_in_range(start, end)
         .order_by("start")
-        .select_related()
+        .values_list(
+            "pk",
+            "start",
+            "cancelled",
+            "discounted",
+            "hide_in_programme",
+            "confirmed",
+            "room_id",
+            "room__colour",
+            "event_id",
+            "event__name",
+            "event__duration",
+            "event__private",
+            "event__outside_hire",
+        )
     )
 
-    local_now = timezone.localtime(timezone.now())
+    # Build the URLs from templates, rather than calling reverse() for
+    # every showing:
+    showing_url = reverse("edit-showing", kwargs={"showing_id": 999}).replace(
+        "999", "{}"
+    )
+    event_url = reverse(
+        "edit-event-details-view", kwargs={"event_id": 999}
+    ).replace("999", "{}")
+    # Cache of the (slightly slow to calculate) historic colours:
+    historic_colours = {}
+    # Showings that overlap another in the same room:
+    if settings.MULTIROOM_ENABLED:
+        clashing = clashes.RoomClashIndex.for_range(
+            start, end
+        ).clashing_showing_ids()
+    else:
+        clashing = set()
 
+    valid_until = None
     results = []
-    for showing in showings:
+    for (
+        showing_id,
+        showing_start,
+        cancelled,
+        discounted,
+        hide_in_programme,
+        confirmed,
+        room_id,
+        room_colour,
+        event_id,
+        name,
+        duration,
+        private,
+        outside_hire,
+    ) in showings:
+        in_past = showing_start < local_now
         # For showings in the future, go to the edit showing page, for showings
         # in the past, show the event information (which should have edit links
         # disabled, when I get around to it)
-        if showing.start >= local_now:
-            url = reverse("edit-showing", kwargs={"showing_id": showing.pk})
+        if in_past:
+            url = event_url.format(event_id)
         else:
-            url = reverse(
-                "edit-event-details-view",
-                kwargs={"event_id": showing.event_id},
-            )
+            url = showing_url.format(showing_id)
+            if valid_until is None:
+                valid_until = showing_start
         styles = []
 
         # Initially set colour to "confirmed" colour for the room:
-        if settings.MULTIROOM_ENABLED and showing.room:
-            colour = showing.room.colour
+        if settings.MULTIROOM_ENABLED and room_id:
+            colour = room_colour
         else:
             colour = settings.CALENDAR_DEFAULT_COLOUR
 
-        if showing.cancelled:
+        if cancelled:
             styles.append("s_cancelled")
-        if showing.discounted:
+        if discounted:
             styles.append("s_discounted")
-        if showing.event.private or showing.hide_in_programme:
+        if private or hide_in_programme:
             styles.append("s_private")
-        if showing.event.outside_hire:
+        if outside_hire:
             styles.append("s_outside_hire")
-        if showing.in_past():
-            colour = _adjust_colour_historic(colour)
+        if showing_id in clashing:
+            styles.append("s_clash")
+        if in_past:
+            if colour not in historic_colours:
+                historic_colours[colour] = _adjust_colour_historic(colour)
+            colour = historic_colours[colour]
             styles.append("s_historic")
-        if showing.confirmed:
+        if confirmed:
             styles.append("s_confirmed")
         else:
             styles.append("s_unconfirmed")
 
+        # (Add the duration to the UTC start, as Showing.end_time does, so
+        # that showings over a change to/from summer time end at the same
+        # time as everywhere else)
+        showing_end = timezone.localtime(
+            Showing.calculate_end_time(showing_start, duration)
+        )
+        showing_start = timezone.localtime(showing_start)
         showing_data = {
-            "id": showing.pk,
-            "title": showing.event.name,
-            "start": timezone.localtime(showing.start).isoformat(),
-            "end": timezone.localtime(showing.end_time).isoformat(),
+            "id": showing_id,
+            "title": name,
+            "start": showing_start.isoformat(),
+            "end": showing_end.isoformat(),
             "url": url,
             "className": styles,
             "color": colour,
         }
 
         if settings.MULTIROOM_ENABLED:
-            showing_data["resourceId"] = showing.room_id
+            showing_data["resourceId"] = room_id
 
         results.append(showing_data)
 
+    return json.dumps(results), valid_until
+
+
+@permission_required("toolkit.read")
+def edit_diary_data(request):
+    date_format = "%Y-%m-%d"
+
+    current_tz = timezone.get_current_timezone()
+    try:
+        start_raw = request.GET.get("start", None)
+        end_raw = request.GET.get("end", None)
+        start_raw = start_raw.partition("T")[0] if start_raw else None
+        end_raw = end_raw.partition("T")[0] if end_raw else None
+        start = datetime.datetime.strptime(start_raw, date_format).replace(
+            tzinfo=current_tz
+        )
+        end = datetime.datetime.strptime(end_raw, date_format).replace(
+            tzinfo=current_tz
+        )
+    except (ValueError, TypeError):
+        logger.error(
+            f"Invalid value in date range, one of start '{start_raw}' or end, '{end_raw}'"
+        )
+        raise Http404("Invalid request")
+
+    local_now = timezone.localtime(timezone.now())
+
+    # FullCalendar asks for this every time the view changes, so keep the
+    # result for a few minutes (or until a showing/event/room changes). The
+    # output also depends on which showings are in the past, so it's only
+    # good until the next showing in the range starts:
+    cache_key = toolkit_cache.make_key(
+        toolkit_cache.DIARY_CALENDAR,
+        start.isoformat(),
+        end.isoformat(),
+        current_tz,
+        settings.MULTIROOM_ENABLED,
+        settings.CALENDAR_DEFAULT_COLOUR,
+    )
+    cached = cache.get(cache_key)
+    if cached is not None and (cached[1] is None or local_now < cached[1]):
+        content = cached[0]
+    else:
+        content, valid_until = _diary_data_json(start, end, local_now)
+        cache.set(
+            cache_key,
+            (content, valid_until),
+            settings.CALENDAR_DATA_CACHE_TIMEOUT_SECONDS,
+        )
+
     return HttpResponse(
-        json.dumps(results), content_type="application/json; charset=utf-8"
+        content, content_type="application/json; charset=utf-8"
     )
 
 
@@ -376,6 +481,23 @@ def event_detail_view(request, event_id):
 
     if request.method == "POST":
         showing_forms = diary_forms.ShowingFormSet(request.POST)
+        if showing_forms.is_valid() and settings.MULTIROOM_ENABLED:
+            # Check the new and changed showings don't overlap each other, or
+            # any others, in the same room:
+            changed_forms = [
+                form for form in showing_forms if form.has_changed()
+            ]
+            for form in changed_forms:
+                if form.instance.event_id in (None, event.pk):
+                    form.instance.event = event
+            for form, found in zip(
+                changed_forms,
+                clashes.find_showing_clashes(
+                    [form.instance for form in changed_forms]
+                ),
+            ):
+                if found:
+                    form.add_error("start", clashes.describe(found))
         if showing_forms.is_valid():
             showings = showing_forms.save(commit=False)
             for showing in showings:
@@ -442,27 +564,49 @@ def add_event(request):
                 outside_hire=form.cleaned_data["outside_hire"],
                 private=form.cleaned_data["private"],
             )
-            # Set event tags to those from its template:
-            new_event.save()
-            new_event.reset_tags_to_default()
-            # create number_of_bookings showings, each offset by one more from
-            # the date/time given in start parameter, and each with rota roles
-            # from the template
+            # Create number_of_bookings showings, each offset by one more day
+            # from the date/time given in start parameter, and each with rota
+            # roles from the template. The event gets tags from its template.
             start = form.cleaned_data["start"]
-            for day_count in range(0, form.cleaned_data["number_of_bookings"]):
-                day_offset = datetime.timedelta(days=day_count)
-                new_showing = Showing(
-                    event=new_event,
-                    start=(start + day_offset),
-                    discounted=form.cleaned_data["discounted"],
-                    # confirmed=form.cleaned_data['confirmed'],
-                    booked_by=form.cleaned_data["booked_by"],
+            starts = [
+                start + datetime.timedelta(days=day_count)
+                for day_count in range(form.cleaned_data["number_of_bookings"])
+            ]
+            showing_fields = {
+                "discounted": form.cleaned_data["discounted"],
+                # "confirmed": form.cleaned_data["confirmed"],
+                "booked_by": form.cleaned_data["booked_by"],
+            }
+            if settings.MULTIROOM_ENABLED:
+                showing_fields["room"] = form.cleaned_data["room"]
+                room_clashes = bookings.find_room_clashes(
+                    form.cleaned_data["room"],
+                    starts,
+                    form.cleaned_data["duration"],
                 )
-                if settings.MULTIROOM_ENABLED:
-                    new_showing.room = form.cleaned_data["room"]
-                new_showing.save()
-                # Set showing roles to those from its template:
-                new_showing.reset_rota_to_default()
+                for clash_start, found in sorted(room_clashes.items()):
+                    clash_start = timezone.localtime(clash_start)
+                    form.add_error(
+                        None,
+                        f"Booking at {clash_start:%H:%M on %d/%m/%Y}: "
+                        f"{clashes.describe(found)}",
+                    )
+                if room_clashes:
+                    return render(
+                        request,
+                        "form_new_event_and_showing.html",
+                        {"form": form},
+                    )
+            try:
+                new_showings = bookings.create_event_with_showings(
+                    new_event, starts, **showing_fields
+                )
+            except ValidationError as exc:
+                form.add_error(None, exc)
+                return render(
+                    request, "form_new_event_and_showing.html", {"form": form}
+                )
+            new_showing = new_showings[-1]
 
             messages.add_message(
                 request,
@@ -536,6 +680,70 @@ def add_event(request):
         return render(request, "form_new_event_and_showing.html", context)
 
 
+@permission_required("toolkit.write")
+@require_http_methods(["GET", "POST"])
+def add_event_series(request):
+    # Add a new event, with a series of bookings following a recurrence rule
+    # (e.g. weekly). Posting the form shows a preview of the bookings (and
+    # any room clashes); posting it again with "confirm" set creates them.
+    if request.method == "GET":
+        start = timezone.localtime().replace(
+            hour=20, minute=0, second=0, microsecond=0
+        ) + datetime.timedelta(days=1)
+        form = diary_forms.NewEventSeriesForm(
+            initial={
+                "start": start,
+                "duration": datetime.time(hour=1),
+                "until": (start + datetime.timedelta(weeks=8)).date(),
+            }
+        )
+        return render(request, "form_new_event_series.html", {"form": form})
+
+    form = diary_forms.NewEventSeriesForm(request.POST)
+    context = {"form": form}
+    if not form.is_valid():
+        return render(request, "form_new_event_series.html", context)
+
+    starts = form.cleaned_data["starts"]
+    showing_fields = {
+        "discounted": form.cleaned_data["discounted"],
+        "booked_by": form.cleaned_data["booked_by"],
+    }
+    clashes = {}
+    if settings.MULTIROOM_ENABLED:
+        showing_fields["room"] = form.cleaned_data["room"]
+        clashes = bookings.find_room_clashes(
+            form.cleaned_data["room"], starts, form.cleaned_data["duration"]
+        )
+
+    if "confirm" in request.POST and not clashes:
+        new_event = Event(
+            name=form.cleaned_data["event_name"],
+            template=form.cleaned_data["event_template"],
+            duration=form.cleaned_data["duration"],
+            outside_hire=form.cleaned_data["outside_hire"],
+            private=form.cleaned_data["private"],
+        )
+        try:
+            bookings.create_event_with_showings(
+                new_event, starts, **showing_fields
+            )
+        except ValidationError as exc:
+            form.add_error(None, exc)
+            return render(request, "form_new_event_series.html", context)
+        messages.success(
+            request,
+            f"Added event '{new_event.name}' with {len(starts)} bookings, "
+            f"from {starts[0]:%d/%m/%y} to {starts[-1]:%d/%m/%y} "
+            f"at {starts[0]:%H:%M}",
+        )
+        return _return_to_editindex(request)
+
+    context["preview"] = [(start, clashes.get(start, [])) for start in starts]
+    context["clashes"] = bool(clashes)
+    return render(request, "form_new_event_series.html", context)
+
+
 @permission_required("toolkit.write")
 @require_http_methods(["GET", "POST"])
 def edit_showing(request, showing_id=None):
@@ -771,44 +979,164 @@ def delete_showing(request, showing_id):
     return _return_to_editindex(request)
 
 
-@permission_required("toolkit.read")
-def view_terms_report_csv(
-    request, year: int, month: int, day: int
-) -> HttpResponse:
+def _event_field_showings(request, field, year, month, day):
+    # Showings for the copy/terms/rota reports, in the date range given by the
+    # URL and "daysahead" parameter, and matching the "search" parameter (if
+    # any). Returns (start_date, end_date, days_ahead, showings, search).
     query_days_ahead = request.GET.get("daysahead", None)
     start_date, days_ahead = get_date_range(year, month, day, query_days_ahead)
     if start_date is None:
         raise Http404(days_ahead)
-
-    end_date = start_date + datetime.timedelta(days=int(days_ahead))
-
+    end_date = start_date + datetime.timedelta(days=days_ahead)
     showings = (
         Showing.objects.not_cancelled()
         .confirmed()
         .start_in_range(start_date, end_date)
         .order_by("start")
-        .select_related()
     )
 
-    response = HttpResponse(
-        content_type="text/csv; charset=utf-8",
-        headers={
-            "Content-Disposition": f'attachment; filename="terms-{start_date.date().isoformat()}.csv"'
-        },
-    )
-    writer = csv.writer(response)
-    writer.writerow(["date", "time", "title", "terms"])
-    for showing in showings:
-        writer.writerow(
-            [
-                showing.start.date().isoformat(),
-                showing.start.time().isoformat(timespec="minutes"),
-                showing.event.name,
-                showing.event.terms,
-            ]
+    search = request.GET.get("search")
+    if search and field == "copy":
+        logging.info(f"Search term: {search}")
+        # Use the full-text index on event name/copy:
+        showings = event_search.search_events(
+            showings, search, search_copy=True
+        )
+    elif search:
+        logging.info(f"Search term: {search}")
+        # Note slightly sneaky use of **; this effectively results in a method
+        # call like: showings.filter(event__terms__icontains=search)
+        showings = showings.filter(
+            Q(**{f"event__{field}__icontains": search})
+            | Q(event__name__icontains=search)
+        )
+    return start_date, end_date, days_ahead, showings, search
+
+
+# Columns for the flags on each showing in the copy CSVs, and the fields
+# they're made from:
+_CSV_FLAGS = ["cancelled", "discounted", "private"]
+_CSV_FLAG_FIELDS = (
+    "cancelled",
+    "discounted",
+    "event__private",
+    "hide_in_programme",
+)
+
+
+def _csv_flags(cancelled, discounted, private, hide_in_programme):
+    return [
+        "yes" if flag else "no"
+        for flag in (cancelled, discounted, private or hide_in_programme)
+    ]
+
+
+def _event_field_csv_rows(field, showings):
+    # Return (header, rows) for the CSV version of a report. Only the columns
+    # that are needed are fetched, and rows are generated as they're read
+    # from the database.
+    def date_and_time(start):
+        start = timezone.localtime(start)
+        return [
+            start.date().isoformat(),
+            start.time().isoformat(timespec="minutes"),
+        ]
+
+    if field == "rota":
+        header = ["date", "time", "title", "role", "rank", "name", "notes"]
+        entries = (
+            RotaEntry.objects.filter(showing__in=showings)
+            .order_by("showing__start", "showing_id", "role__name", "rank")
+            .values_list(
+                "showing__start",
+                "showing__event__name",
+                "role__name",
+                "rank",
+                "name",
+                "showing__rota_notes",
+            )
+            .iterator(chunk_size=csv_export.CHUNK_SIZE)
+        )
+        rows = (
+            date_and_time(start) + [title, role, rank, name, notes]
+            for start, title, role, rank, name, notes in entries
+        )
+    elif field == "terms":
+        header = ["date", "time", "title", "terms"]
+        rows = (
+            date_and_time(start) + [title, terms]
+            for start, title, terms in showings.values_list(
+                "start", "event__name", "event__terms"
+            ).iterator(chunk_size=csv_export.CHUNK_SIZE)
+        )
+    elif field == "copy":
+        header = ["date", "time", "title"] + _CSV_FLAGS + ["copy"]
+        rows = (
+            date_and_time(start) + [title] + _csv_flags(*flags) + [copy]
+            for start, title, copy, *flags in showings.values_list(
+                "start",
+                "event__name",
+                "event__copy",
+                *_CSV_FLAG_FIELDS,
+            ).iterator(chunk_size=csv_export.CHUNK_SIZE)
         )
+    else:
+        header = (
+            ["date", "time", "pre_title", "title", "post_title"]
+            + _CSV_FLAGS
+            + ["pricing", "copy_summary"]
+        )
+        rows = (
+            date_and_time(start)
+            + [pre_title, title, post_title]
+            + _csv_flags(*flags)
+            + [pricing, copy_summary]
+            for (
+                start,
+                pre_title,
+                title,
+                post_title,
+                pricing,
+                copy_summary,
+                *flags,
+            ) in showings.values_list(
+                "start",
+                "event__pre_title",
+                "event__name",
+                "event__post_title",
+                "event__pricing",
+                "event__copy_summary",
+                *_CSV_FLAG_FIELDS,
+            ).iterator(
+                chunk_size=csv_export.CHUNK_SIZE
+            )
+        )
+    return header, rows
+
+
+def _event_field_csv(request, field, year, month, day):
+    start_date, _, _, showings, _ = _event_field_showings(
+        request, field, year, month, day
+    )
+    header, rows = _event_field_csv_rows(field, showings)
+    return csv_export.stream_csv(
+        f"{field}-{start_date.date().isoformat()}.csv", header, rows
+    )
+
+
+@permission_required("toolkit.read")
+def view_terms_report_csv(
+    request, year: int, month: int, day: int
+) -> StreamingHttpResponse:
+    return _event_field_csv(request, "terms", year, month, day)
+
 
-    return response
+@permission_required("toolkit.read")
+def view_event_field_csv(request, field, year, month, day):
+    # CSV versions of the copy, copy summary and rota reports (see
+    # view_event_field)
+    assert field in ("copy", "rota", "copy_summary")
+    return _event_field_csv(request, field, year, month, day)
 
 
 @permission_required("toolkit.read")
@@ -822,30 +1150,17 @@ def view_event_field(request, field, year=None, month=None, day=None):
 
     assert field in ("copy", "terms", "rota", "copy_summary")
 
-    query_days_ahead = request.GET.get("daysahead", None)
-    start_date, days_ahead = get_date_range(year, month, day, query_days_ahead)
-    if start_date is None:
-        raise Http404(days_ahead)
-    end_date = start_date + datetime.timedelta(days=days_ahead)
-    showings = (
-        Showing.objects.not_cancelled()
-        .confirmed()
-        .start_in_range(start_date, end_date)
-        .order_by("start")
-        #              following prefetch is for the rota view
-        .prefetch_related("rotaentry_set__role")
-        .select_related()
+    start_date, end_date, days_ahead, showings, search = _event_field_showings(
+        request, field, year, month, day
     )
+    # (The prefetch is for the rota view)
+    showings = showings.prefetch_related(
+        "rotaentry_set__role"
+    ).select_related()
 
-    search = request.GET.get("search")
-    if search:
-        logging.info(f"Search term: {search}")
-        # Note slightly sneaky use of **; this effectively results in a method
-        # call like: showings.filter(event__copy__icontains=search)
-        showings = showings.filter(
-            Q(**{f"event__{field}__icontains": search})
-            | Q(event__name__icontains=search)
-        )
+    if field == "copy_summary":
+        # Get dates of all showings of all events in one query:
+        set_public_showing_dates(showing.event for showing in showings)
 
     context = {
         "start_date": start_date,
@@ -867,6 +1182,7 @@ def edit_event_templates(request):
 
     event_template_formset = modelformset_factory(
         EventTemplate,
+        formset=diary_forms.BulkModelFormSet,
         fields=("name", "roles", "tags", "pricing"),
         can_delete=True,
         widgets={
@@ -896,7 +1212,10 @@ def edit_event_templates(request):
 @permission_required("toolkit.write")
 def edit_event_tags(request):
     event_tag_formset = modelformset_factory(
-        EventTag, fields=("name", "promoted", "sort_order"), can_delete=True
+        EventTag,
+        formset=diary_forms.EventTagFormSet,
+        fields=("name", "promoted", "sort_order"),
+        can_delete=True,
     )
 
     if request.method == "POST":
@@ -918,13 +1237,10 @@ def edit_event_tags(request):
 
 @permission_required("toolkit.write")
 def edit_roles(request):
-    # This is pretty slow,but it's not a commonly used bit of the UI...
-    # (To be precise, save involves >120 queries. This is because I've been
-    # lazy and used the formset save method)
-
     RoleFormset = modelformset_factory(
         Role,
         diary_forms.RoleForm,
+        formset=diary_forms.RoleFormSet,
         fields=(
             "name",
             "standard",
@@ -1014,15 +1330,11 @@ def view_rota_vacancies(request):
         .confirmed()
         .start_in_range(start, end_date)
         .order_by("start")
-        .prefetch_related("rotaentry_set__role")
+        .with_vacant_rota_entries()
         .select_related()
     )
     showings_vacant_roles = OrderedDict(
-        (
-            showing,
-            showing.rotaentry_set.filter(Q(name="") | Q(name__isnull=True)),
-        )
-        for showing in showings
+        (showing, showing.vacant_rota_entries) for showing in showings
     )
 
     # Surprisingly round-about way to get tomorrow's date:
@@ -1069,6 +1381,15 @@ class EditRotaView(PermissionRequiredMixin, View):
                 start_date = yesterday_local_date
 
         end_date = start_date + datetime.timedelta(days=days_ahead)
+        # The page fetches changes to its showings made after this, to keep
+        # itself up to date (see edit_rota_changes):
+        changes_since = django.utils.timezone.now() - ROTA_CHANGES_OVERLAP
+        changes_url = "{}?{}".format(
+            reverse("rota-edit-changes"),
+            urlencode(
+                {"start": start_date.isoformat(), "end": end_date.isoformat()}
+            ),
+        )
         showings = (
             Showing.objects.not_cancelled()
             .confirmed()
@@ -1091,6 +1412,8 @@ class EditRotaView(PermissionRequiredMixin, View):
             "days_ahead": days_ahead,
             "showings": showings,
             "edit_showing_notes_url_prefix": showing_notes_url_prefix,
+            "changes_since": changes_since.isoformat(),
+            "changes_url": changes_url,
         }
 
         return render(request, "edit_rota.html", context)
@@ -1141,6 +1464,121 @@ class EditRotaView(PermissionRequiredMixin, View):
         return HttpResponse(response, content_type="text/plain")
 
 
+@permission_required("diary.change_rotaentry")
+@require_POST
+def edit_rota_batch(request):
+    # Update several rota entries at once. Takes the same "id" and "value"
+    # parameters as EditRotaView.post, repeated for each entry, and returns
+    # a JSON list with a result for each id/value pair, in the same order.
+    entry_ids = request.POST.getlist("id")
+    names = request.POST.getlist("value")
+    if not entry_ids or len(entry_ids) != len(names):
+        return HttpResponse(
+            "Invalid request", status=400, content_type="text/plain"
+        )
+    try:
+        entry_ids = [int(entry_id) for entry_id in entry_ids]
+    except ValueError:
+        logger.error("Invalid entry_id")
+        return HttpResponse(
+            "Invalid entry id", status=400, content_type="text/plain"
+        )
+
+    # Fetch all the entries, with the start times of their showings, in one
+    # go:
+    rota_entries = RotaEntry.objects.annotate(
+        showing_start=F("showing__start")
+    ).in_bulk(entry_ids)
+    now = timezone.now()
+
+    results = []
+    changed = {}
+    for entry_id, name in zip(entry_ids, names):
+        rota_entry = rota_entries.get(entry_id)
+        if rota_entry is None:
+            results.append(
+                {"id": entry_id, "ok": False, "error": "Unknown rota entry"}
+            )
+            continue
+        if rota_entry.showing_start < now:
+            results.append(
+                {
+                    "id": entry_id,
+                    "ok": False,
+                    "error": "Can't change rota for showings in the past",
+                }
+            )
+            continue
+        logger.info(
+            f"Update role id {rota_entry.role_id} (#{rota_entry.rank}) for "
+            f"showing {rota_entry.showing_id} '{rota_entry.name}' -> "
+            f"'{name}' ({rota_entry.pk})"
+        )
+        rota_entry.name = name
+        # (bulk_update doesn't set auto_now fields)
+        rota_entry.updated_at = now
+        changed[entry_id] = rota_entry
+        results.append({"id": entry_id, "ok": True, "value": escape(name)})
+
+    if changed:
+        RotaEntry.objects.bulk_update(changed.values(), ["name", "updated_at"])
+
+    return HttpResponse(json.dumps(results), content_type="application/json")
+
+
+@permission_required("diary.change_rotaentry")
+@require_http_methods(["GET"])
+def edit_rota_changes(request):
+    # Return the rota entries and showing rota notes, for showings that start
+    # between the "start" and "end" parameters (the date range of the rota
+    # page), which have changed since the "since" parameter (all ISO 8601
+    # timestamps), so that open rota pages can update themselves. Values are
+    # escaped, as they are when returned after being edited. The returned
+    # "until" time should be used as "since" next time.
+    timestamps = {}
+    for name in ("since", "start", "end"):
+        try:
+            timestamps[name] = parse_datetime(request.GET[name])
+        except (KeyError, ValueError):
+            timestamps[name] = None
+        if timestamps[name] is None or timestamps[name].tzinfo is None:
+            return HttpResponse(
+                "Invalid timestamp", status=400, content_type="text/plain"
+            )
+    since = timestamps["since"]
+    showings = Showing.objects.start_in_range(
+        timestamps["start"], timestamps["end"]
+    )
+    # Anything saved while this is running (or a little before, but not
+    # committed yet) will be sent again next time, rather than missed:
+    until = timezone.now() - ROTA_CHANGES_OVERLAP
+
+    rota_entries = [
+        {"id": entry_id, "value": escape(name)}
+        for entry_id, name in RotaEntry.objects.filter(
+            updated_at__gte=since, showing__in=showings
+        )
+        .order_by()
+        .values_list("pk", "name")
+    ]
+    rota_notes = [
+        {"id": showing_id, "value": escape(notes)}
+        for showing_id, notes in showings.filter(updated_at__gte=since)
+        .order_by()
+        .values_list("pk", "rota_notes")
+    ]
+    return HttpResponse(
+        json.dumps(
+            {
+                "until": until.isoformat(),
+                "rota_entries": rota_entries,
+                "rota_notes": rota_notes,
+            }
+        ),
+        content_type="application/json",
+    )
+
+
 @permission_required("diary.change_rotaentry")
 @require_POST
 def edit_showing_rota_notes(request, showing_id):
@@ -1,11 +1,15 @@
 import datetime
 
 from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 import django.utils.timezone as timezone
 from django.conf import settings
 
 from toolkit.diary.models import Showing
+from toolkit.diary.conditional import showing_validators, respond_conditionally
+import toolkit.util.cache as toolkit_cache
 
 
 class BasicWhatsOnFeed(Feed):
@@ -19,16 +23,23 @@ class BasicWhatsOnFeed(Feed):
     )
     link = "/programme"
 
-    def items(self):
+    def __call__(self, request, *args, **kwargs):
+        # Feed readers poll frequently, so support conditional GET:
+        return respond_conditionally(
+            request,
+            showing_validators(self._showings()),
+            lambda: super(BasicWhatsOnFeed, self).__call__(
+                request, *args, **kwargs
+            ),
+        )
+
+    def _showings(self):
         startdate = timezone.now()
         enddate = startdate + datetime.timedelta(days=self.DAYS_AHEAD)
-        showings = (
-            Showing.objects.public()
-            .start_in_range(startdate, enddate)
-            .order_by("start")
-            .select_related()
-            .select_related()
-        )
+        return Showing.objects.public().start_in_range(startdate, enddate)
+
+    def items(self):
+        showings = self._showings().order_by("start").select_related()
         return showings.all()
 
     def item_title(self, showing):
@@ -47,3 +58,185 @@ class BasicWhatsOnFeed(Feed):
         return reverse(
             "single-event-view", kwargs={"event_id": showing.event_id}
         )
+
+
+# iCalendar (RFC 5545) feed of upcoming showings. Calendar clients poll these
+# frequently, so the feed is generated straight from a .values() query (no
+# model instances), streamed, cached until the programme changes, and
+# supports conditional GET.
+
+ICAL_DAYS_AHEAD = 365
+ICAL_CONTENT_TYPE = "text/calendar; charset=utf-8"
+
+
+def _ical_escape(text):
+    # Escape a TEXT value (RFC 5545 3.3.11)
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+        .replace("\r", "\\n")
+    )
+
+
+def _ical_line(name, value):
+    # Return a content line as bytes, folded so no line is longer than 75
+    # octets (RFC 5545 3.1), without splitting any UTF-8 sequences
+    line = f"{name}:{value}".encode("utf-8")
+    folded = []
+    limit = 75
+    while len(line) > limit:
+        cut = limit
+        while line[cut] & 0xC0 == 0x80:
+            # UTF-8 continuation byte; back up to the start of the character
+            cut -= 1
+        folded.append(line[:cut])
+        line = line[cut:]
+        # Continuation lines start with a space, which counts:
+        limit = 74
+    folded.append(line)
+    return b"\r\n ".join(folded) + b"\r\n"
+
+
+def _ical_datetime(dt):
+    return dt.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _ical_calendar(showings, name, event_url_prefix, uid_domain):
+    yield b"".join(
+        [
+            _ical_line("BEGIN", "VCALENDAR"),
+            _ical_line("VERSION", "2.0"),
+            _ical_line(
+                "PRODID", f"-//{settings.VENUE['longname']}//Programme//EN"
+            ),
+            _ical_line("CALSCALE", "GREGORIAN"),
+            _ical_line("METHOD", "PUBLISH"),
+            _ical_line("X-WR-CALNAME", _ical_escape(name)),
+        ]
+    )
+    rows = showings.order_by("start").values(
+        "pk",
+        "start",
+        "updated_at",
+        "cancelled",
+        "sold_out",
+        "event_id",
+        "event__name",
+        "event__pre_title",
+        "event__post_title",
+        "event__copy_summary",
+        "event__duration",
+    )
+    for row in rows.iterator(chunk_size=500):
+        summary = " ".join(
+            part
+            for part in (
+                row["event__pre_title"],
+                row["event__name"],
+                row["event__post_title"],
+            )
+            if part
+        )
+        if row["cancelled"]:
+            summary += " (CANCELLED)"
+        elif row["sold_out"]:
+            summary += " (SOLD OUT)"
+
+        lines = [
+            _ical_line("BEGIN", "VEVENT"),
+            _ical_line("UID", f"showing-{row['pk']}@{uid_domain}"),
+            _ical_line("DTSTAMP", _ical_datetime(row["updated_at"])),
+            _ical_line("DTSTART", _ical_datetime(row["start"])),
+        ]
+        if row["event__duration"]:
+            end = Showing.calculate_end_time(
+                row["start"], row["event__duration"]
+            )
+            if end > row["start"]:
+                lines.append(_ical_line("DTEND", _ical_datetime(end)))
+        lines.extend(
+            [
+                _ical_line("SUMMARY", _ical_escape(summary)),
+                _ical_line(
+                    "DESCRIPTION",
+                    _ical_escape(row["event__copy_summary"] or ""),
+                ),
+                _ical_line("URL", f"{event_url_prefix}{row['event_id']}/"),
+                _ical_line(
+                    "STATUS",
+                    "CANCELLED" if row["cancelled"] else "CONFIRMED",
+                ),
+                _ical_line("END", "VEVENT"),
+            ]
+        )
+        yield b"".join(lines)
+    yield _ical_line("END", "VCALENDAR")
+
+
+def _cache_when_complete(chunks, cache_key, validators):
+    # Pass the chunks through, then cache the complete content once it's all
+    # been generated
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cache.set(
+        cache_key,
+        (b"".join(content), validators),
+        settings.PROGRAMME_CACHE_TIMEOUT_SECONDS,
+    )
+
+
+def view_diary_ical(request, event_type=None):
+    # Upcoming public showings (from the start of today), optionally filtered
+    # by tag, as an iCalendar file
+    today = timezone.localtime().replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    showings = Showing.objects.public().start_in_range(
+        today, today + datetime.timedelta(days=ICAL_DAYS_AHEAD)
+    )
+    if event_type:
+        showings = showings.filter(event__tags__slug=event_type)
+
+    cache_key = toolkit_cache.make_key(
+        toolkit_cache.PROGRAMME,
+        "ical",
+        request.get_host(),
+        request.is_secure(),
+        event_type,
+        today.isoformat(),
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        content, validators = cached
+        return respond_conditionally(
+            request,
+            validators,
+            lambda: HttpResponse(content, content_type=ICAL_CONTENT_TYPE),
+        )
+
+    validators = showing_validators(showings, "ical", event_type)
+
+    def render():
+        # Build the event URLs from a prefix, rather than calling reverse()
+        # for every showing:
+        url_with_id = request.build_absolute_uri(
+            reverse("single-event-view", kwargs={"event_id": 999})
+        )
+        event_url_prefix = url_with_id[: url_with_id.rfind("999")]
+        name = f"{settings.VENUE['name']} programme"
+        if event_type:
+            name += f": {event_type}"
+        calendar = _ical_calendar(
+            showings, name, event_url_prefix, request.get_host()
+        )
+        return StreamingHttpResponse(
+            _cache_when_complete(calendar, cache_key, validators),
+            content_type=ICAL_CONTENT_TYPE,
+        )
+
+    return respond_conditionally(request, validators, render)
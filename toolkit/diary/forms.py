@@ -1,9 +1,12 @@
 import datetime
 import calendar
+import logging
 
 from django import forms
 import django.db.models
+from django.db import connections, transaction
 from django.conf import settings
+import django.utils.timezone as timezone
 from crispy_forms.helper import FormHelper
 
 # Custom form widgets:
@@ -14,10 +17,14 @@ from toolkit.diary.form_widgets import (
 )
 
 import toolkit.diary.models
-from collections import OrderedDict
+import toolkit.diary.recurrence
+import toolkit.util.cache as toolkit_cache
+from collections import OrderedDict, defaultdict
 
 from toolkit.diary.validators import validate_in_future
 
+logger = logging.getLogger(__name__)
+
 
 class RoleForm(forms.ModelForm):
     class Meta:
@@ -28,6 +35,174 @@ class RoleForm(forms.ModelForm):
         )
 
 
+class BulkModelFormSet(forms.BaseModelFormSet):
+    """Model formset for the pages that edit a whole table at once (roles,
+    tags, event templates), which avoids queries for each row:
+
+    - The options for choice fields are fetched once, and shared by all the
+      forms, and many-to-many values are prefetched
+    - Forms that haven't been changed aren't validated
+    - save() writes the changed and new rows with bulk_update/bulk_create,
+      and updates each many-to-many relation with one diff
+
+    As the model's save() isn't called, and no signals are sent, subclasses
+    should override prepare_instance() to apply any rules from save(), and
+    list the cache namespaces to throw away in invalidate_caches."""
+
+    invalidate_caches = ()
+
+    def __init__(self, *args, queryset=None, **kwargs):
+        if queryset is None:
+            queryset = self.model._default_manager.all()
+        m2m_fields = [
+            field.name
+            for field in self.model._meta.many_to_many
+            if field.name in self.form.base_fields
+        ]
+        if m2m_fields:
+            queryset = queryset.prefetch_related(*m2m_fields)
+        self._shared_choices = {}
+        super().__init__(*args, queryset=queryset, **kwargs)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        for name, field in form.fields.items():
+            if isinstance(field, forms.ModelChoiceField):
+                if name not in self._shared_choices:
+                    self._shared_choices[name] = list(field.choices)
+                field.choices = self._shared_choices[name]
+        if (
+            form.is_bound
+            and i < self.initial_form_count()
+            and not form.has_changed()
+        ):
+            # Nothing to check (or save):
+            form.empty_permitted = True
+        return form
+
+    def prepare_instance(self, instance):
+        """Called for each new or changed instance before it's saved. Return
+        False to not save it."""
+        return True
+
+    def _bulk_update(self, instances):
+        now = timezone.now()
+        fields = []
+        for field in self.model._meta.concrete_fields:
+            if field.primary_key or getattr(field, "auto_now_add", False):
+                continue
+            if getattr(field, "auto_now", False):
+                for instance in instances:
+                    setattr(instance, field.attname, now)
+            fields.append(field.name)
+        self.model._default_manager.bulk_update(instances, fields)
+
+    def _bulk_create(self, instances, m2m_fields):
+        db = self.model._default_manager.db
+        if (
+            m2m_fields
+            and not connections[db].features.can_return_rows_from_bulk_insert
+        ):
+            # The ids of the new rows are needed for the many-to-many
+            # relations, and some backends (MySQL) can't return them:
+            for instance in instances:
+                instance.save()
+        else:
+            self.model._default_manager.bulk_create(instances)
+
+    def _save_m2m(self, forms_to_save, new_forms, field):
+        through = field.remote_field.through
+        source = through._meta.get_field(field.m2m_field_name()).attname
+        target = through._meta.get_field(
+            field.m2m_reverse_field_name()
+        ).attname
+        wanted = {
+            form.instance.pk: {obj.pk for obj in form.cleaned_data[field.name]}
+            for form in forms_to_save
+            if form in new_forms or field.name in form.changed_data
+        }
+        if not wanted:
+            return
+        existing = defaultdict(set)
+        row_ids = {}
+        for row_id, source_id, target_id in through._default_manager.filter(
+            **{f"{source}__in": wanted}
+        ).values_list("pk", source, target):
+            existing[source_id].add(target_id)
+            row_ids[source_id, target_id] = row_id
+        to_delete = [
+            row_ids[source_id, target_id]
+            for source_id, target_ids in existing.items()
+            for target_id in target_ids - wanted[source_id]
+        ]
+        if to_delete:
+            through._default_manager.filter(pk__in=to_delete).delete()
+        through._default_manager.bulk_create(
+            through(**{source: source_id, target: target_id})
+            for source_id, target_ids in wanted.items()
+            for target_id in target_ids - existing[source_id]
+        )
+
+    def save(self, commit=True):
+        assert commit, "BulkModelFormSet always commits"
+        m2m_fields = [
+            field
+            for field in self.model._meta.many_to_many
+            if field.name in self.form.base_fields
+        ]
+        self.deleted_objects = []
+        changed_forms = []
+        new_forms = []
+        with transaction.atomic():
+            for form in self.deleted_forms:
+                if form.instance.pk is not None:
+                    self.deleted_objects.append(form.instance)
+                    self.delete_existing(form.instance)
+            for form in self.forms:
+                if form in self.deleted_forms or not form.has_changed():
+                    continue
+                if not self.prepare_instance(form.instance):
+                    continue
+                if form.instance.pk is None:
+                    new_forms.append(form)
+                else:
+                    changed_forms.append(form)
+
+            if changed_forms:
+                self._bulk_update([form.instance for form in changed_forms])
+            if new_forms:
+                self._bulk_create(
+                    [form.instance for form in new_forms], m2m_fields
+                )
+            for field in m2m_fields:
+                self._save_m2m(changed_forms + new_forms, new_forms, field)
+            for namespace in self.invalidate_caches:
+                toolkit_cache.invalidate_on_commit(namespace)
+
+        self.changed_objects = [
+            (form.instance, form.changed_data) for form in changed_forms
+        ]
+        self.new_objects = [form.instance for form in new_forms]
+        return [form.instance for form in changed_forms + new_forms]
+
+
+class RoleFormSet(BulkModelFormSet):
+    def prepare_instance(self, instance):
+        error = instance.protected_change()
+        if error:
+            logger.error(error)
+            return False
+        return True
+
+
+class EventTagFormSet(BulkModelFormSet):
+    invalidate_caches = (toolkit_cache.PROGRAMME, toolkit_cache.NAVIGATION)
+
+    def prepare_instance(self, instance):
+        instance.restore_read_only_fields()
+        return True
+
+
 class DiaryIdeaForm(forms.ModelForm):
     class Meta:
         model = toolkit.diary.models.DiaryIdea
@@ -365,6 +540,72 @@ class NewEventForm(forms.Form):
     discounted = forms.BooleanField(required=False)
 
 
+class NewEventSeriesForm(NewEventForm):
+    """As NewEventForm, but with a rule for repeating bookings instead of a
+    number of bookings on consecutive days"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        del self.fields["number_of_bookings"]
+
+    frequency = forms.ChoiceField(
+        choices=toolkit.diary.recurrence.FREQUENCY_CHOICES,
+        initial=toolkit.diary.recurrence.WEEKLY,
+        label="Repeat",
+    )
+    week_of_month = forms.TypedChoiceField(
+        choices=(("", "Same as first booking"),)
+        + toolkit.diary.recurrence.WEEK_OF_MONTH_CHOICES,
+        coerce=int,
+        empty_value=None,
+        required=False,
+        help_text="For monthly series, which week of the month",
+    )
+    until = forms.DateField(
+        required=True,
+        widget=forms.DateInput(attrs={"type": "date"}),
+        help_text="Date of the last booking (at the latest)",
+    )
+    exceptions = forms.CharField(
+        required=False,
+        help_text="Dates to skip, e.g. 24/12/2025, separated by commas",
+    )
+
+    def clean_exceptions(self):
+        dates = []
+        for part in self.cleaned_data["exceptions"].split(","):
+            if not part.strip():
+                continue
+            try:
+                dates.append(
+                    datetime.datetime.strptime(part.strip(), "%d/%m/%Y").date()
+                )
+            except ValueError:
+                raise forms.ValidationError(f"Invalid date '{part.strip()}'")
+        return dates
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        # Expand the rule, to check it makes sense:
+        try:
+            rule = toolkit.diary.recurrence.RecurrenceRule(
+                cleaned_data["frequency"],
+                cleaned_data["start"],
+                cleaned_data["until"],
+                week_of_month=cleaned_data["week_of_month"],
+                exceptions=cleaned_data["exceptions"],
+            )
+            cleaned_data["starts"] = rule.occurrences()
+        except toolkit.diary.recurrence.RecurrenceError as exc:
+            raise forms.ValidationError(str(exc))
+        if not cleaned_data["starts"]:
+            raise forms.ValidationError("Series doesn't have any bookings")
+        return cleaned_data
+
+
 class MailoutForm(forms.Form):
     def __init__(self, *args, **kwargs):
         self.html_mailout_enabled = kwargs.pop("html_mailout_enabled")
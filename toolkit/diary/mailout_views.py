@@ -15,6 +15,9 @@ from django.views.decorators.http import (
 from django.conf import settings
 
 from toolkit.diary.models import Showing
+from toolkit.diary.templatetags.showing_date_format import (
+    set_public_showing_dates,
+)
 from toolkit.members.models import Member
 import toolkit.mailer.forms as mailer_forms
 import toolkit.diary.forms as diary_forms
@@ -38,7 +41,7 @@ def _render_mailout_subject_and_body(days_ahead, copy_days_ahead):
         .start_in_range(start_date, end_date)
         .order_by("start")
         .select_related()
-        .prefetch_related("event__showings")
+        .with_main_mediaitem()
     )
 
     event_ids = set()
@@ -52,6 +55,9 @@ def _render_mailout_subject_and_body(days_ahead, copy_days_ahead):
             event_ids.add(s.event_id)
         show_cheap_night_key = show_cheap_night_key or s.discounted
 
+    # Get the dates of all showings of the events with details in one go:
+    set_public_showing_dates(s.event for s in showings_once_per_event)
+
     try:
         # %-d strips the leading 0 from the day of the month - as per the
         # python docs, this is platform specific to Linux / glibc. See
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diary", "0008_remove_terms_from_event_model"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="legacy_copy_html",
+            field=models.TextField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Full-text search index for event name / copy. See toolkit/diary/search.py
+
+from django.db import migrations
+
+# Should match toolkit.diary.search.SQLITE_FTS_TABLE:
+SQLITE_FTS_TABLE = "diary_event_search"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        # One index for each combination of columns that's searched:
+        schema_editor.execute(
+            "ALTER TABLE Events"
+            " ADD FULLTEXT INDEX Events_name_fulltext (name),"
+            " ADD FULLTEXT INDEX Events_name_copy_fulltext (name, copy)"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE}"
+            " USING fts5(name, copy)"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {SQLITE_FTS_TABLE} (rowid, name, copy)"
+            " SELECT id, name, COALESCE(copy, '') FROM Events"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        schema_editor.execute(
+            "ALTER TABLE Events"
+            " DROP INDEX Events_name_fulltext,"
+            " DROP INDEX Events_name_copy_fulltext"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE {SQLITE_FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("diary", "0009_event_legacy_copy_html"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
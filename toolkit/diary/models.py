@@ -3,9 +3,10 @@ import logging
 
 import datetime
 
-from django.db import models
+from django.db import models, transaction
 import django.utils.timezone
 from django.utils.safestring import mark_safe
+from django.db.models import Prefetch, Q
 from django.db.models.query import QuerySet
 from django.utils.text import slugify
 from django.conf import settings
@@ -52,13 +53,21 @@ class Role(models.Model):
         self._original_name = self.name
         self._original_read_only = self.read_only
 
-    def save(self, *args, **kwargs):
+    def protected_change(self):
+        """If this is a read only role and it's been renamed or unprotected
+        since it was loaded, return a description of the change (which
+        mustn't be saved), otherwise None"""
         if self._original_read_only and self._original_name != self.name:
-            logger.error(f"Tried to edit read-only role {self.name}")
-            return
+            return f"Tried to edit read-only role {self.name}"
         elif self._original_read_only and not self.read_only:
             # TODO: Unit test!
-            logger.error(f"Tried to unprotect read-only role {self.name}")
+            return f"Tried to unprotect read-only role {self.name}"
+        return None
+
+    def save(self, *args, **kwargs):
+        error = self.protected_change()
+        if error:
+            logger.error(error)
             return
         else:
             return super().save(*args, **kwargs)
@@ -166,13 +175,18 @@ class EventTag(models.Model):
         # Generate slug:
         self.slug = slugify(self.name)
 
-    # Overloaded Django ORM methods:
-    def save(self, *args, **kwargs):
+    def restore_read_only_fields(self):
+        """Undo any changes to the fields of a read only tag that mustn't be
+        changed"""
         if self.pk and self._read_only_at_load:
             # Allow "promoted" and "sort_order" to be changed:
             self.read_only = self._read_only_at_load
             self.name = self._name_at_load
             self.slug = self._slug_at_load
+
+    # Overloaded Django ORM methods:
+    def save(self, *args, **kwargs):
+        self.restore_read_only_fields()
         return super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
@@ -182,6 +196,23 @@ class EventTag(models.Model):
             return super().delete(*args, **kwargs)
 
 
+def _main_mediaitem_prefetch(lookup):
+    """Prefetch the main (ie. first) media item of each event, in one query
+    for the whole queryset, into the attribute that
+    Event.get_main_mediaitem() looks for"""
+    return Prefetch(
+        lookup,
+        queryset=MediaItem.objects.order_by("pk")[:1],
+        to_attr="_main_mediaitem_list",
+    )
+
+
+class EventQuerySet(QuerySet):
+    def with_main_mediaitem(self):
+        """Fetch the main media item for all events in bulk"""
+        return self.prefetch_related(_main_mediaitem_prefetch("media"))
+
+
 class Event(models.Model):
 
     name = models.CharField(max_length=256, blank=False)
@@ -228,6 +259,8 @@ class Event(models.Model):
     legacy_copy = models.BooleanField(
         default=False, null=False, editable=False
     )
+    # ...and this is the result of that, generated when the event is saved:
+    legacy_copy_html = models.TextField(null=True, editable=False)
 
     terms = models.TextField(max_length=4096, null=True, blank=True)
     notes = models.TextField(
@@ -240,6 +273,8 @@ class Event(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EventQuerySet.as_manager()
+
     class Meta:
         db_table = "Events"
 
@@ -254,8 +289,22 @@ class Event(models.Model):
 
     def reset_tags_to_default(self):
         if self.template:
-            for tag in self.template.tags.all():
-                self.tags.add(tag)
+            self.tags.add(*self.template.tags.all())
+
+    # Overloaded Django ORM methods:
+    def save(self, *args, **kwargs):
+        # Regenerate the HTML version of legacy copy, so that doesn't have to
+        # happen every time the event is displayed:
+        if self.legacy_copy and self.copy is not None:
+            self.legacy_copy_html = self.legacy_copy_to_html()
+        else:
+            self.legacy_copy_html = None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and (
+            "copy" in update_fields or "legacy_copy" in update_fields
+        ):
+            kwargs["update_fields"] = set(update_fields) | {"legacy_copy_html"}
+        return super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
         # Don't allow Events to be deleted. This doesn't block deletes on
@@ -264,11 +313,13 @@ class Event(models.Model):
 
     # Extra, custom methods:
     def clear_main_mediaitem(self):
-        if self.media.count() == 0:
+        media_item = self.get_main_mediaitem()
+        if media_item is None:
             return
-        media_item = self.media.all()[0]
         logger.info(f"Removing media file {media_item} from event {self.pk}")
         self.media.remove(media_item)
+        # remove() clears any prefetched media, but not the cached main item:
+        self.__dict__.pop("_main_mediaitem_list", None)
         # # If the media item isn't associated with any events, delete it:
         # # ACTUALLY: let's keep it. Disk space is cheap, etc.
         # if media_item.event_set.count() == 0:
@@ -278,11 +329,25 @@ class Event(models.Model):
         self.clear_main_mediaitem()
         logger.info(f"Adding media file {media_file} to event {self.pk}")
         self.media.add(media_file)
+        self.__dict__.pop("_main_mediaitem_list", None)
 
     def get_main_mediaitem(self):
-        if self.media.count() == 0:
-            return None
-        return self.media.all()[0]
+        """Return the main media item for the event, or None. Uses the item
+        fetched by with_main_mediaitem() or prefetch_related("media") if
+        either was used, otherwise does a single query (and remembers the
+        result)"""
+        if not hasattr(self, "_main_mediaitem_list"):
+            if "media" in getattr(self, "_prefetched_objects_cache", {}):
+                items = sorted(self.media.all(), key=lambda item: item.pk)
+            else:
+                items = self.media.order_by("pk")[:1]
+            self._main_mediaitem_list = list(items[:1])
+        return (
+            self._main_mediaitem_list[0] if self._main_mediaitem_list else None
+        )
+
+    # For templates:
+    main_mediaitem = property(get_main_mediaitem)
 
     # Regular expressions for mangling legacy copy:
     _wrap_re = re.compile(r"(.{70,})\n")
@@ -301,37 +366,43 @@ class Event(models.Model):
     def all_showings_confirmed(self) -> bool:
         return all(s.confirmed for s in self.showings.all())
 
-    @property
-    def copy_html(self):
-        """If self.legacy_copy == True, then try to mangle self.copy into
-        sane HTML fragment. Otherwise return self.copy
+    def legacy_copy_to_html(self):
+        """Try to mangle self.copy (assumed to be legacy copy) into a sane
+        HTML fragment.
         (Legacy cube copy has line breaks around the 70-80 character mark, and
         no hyperlinks)"""
+        # remove all whitespace from start and end of line:
+        result = self.copy.strip()
+        # Strip out carriage returns:
+
+        result = result.strip().replace("\r", "")
+        # Strip out new lines when they occur after 70 other characters
+        # (try to fix wrapping)
+        result = self._wrap_re.sub(r"\1 ", result)
+        # Replace a sequence of 2+ new lines with a double line break;
+        result = self._lotsofnewlines_re.sub(" <br><br>", result)
+
+        # Now replace all new lines with a single line break;
+        result = result.replace("\n", " <br>\n")
+
+        # Attempt to magically convert any links to HTML markup:
+        result = self._link_re_1.sub(r'<a href="\1">\1</a>', result)
+        result = self._link_re_2.sub(r'\1<a href="http://\2">\2</a>', result)
+
+        return result
+
+    @property
+    def copy_html(self):
+        """If self.legacy_copy == True, then return the copy as converted to
+        HTML (when the event was saved). Otherwise return self.copy"""
 
         if not self.legacy_copy:
             return mark_safe(self.copy)
+        elif self.legacy_copy_html is not None:
+            return mark_safe(self.legacy_copy_html)
         else:
-            # remove all whitespace from start and end of line:
-            result = self.copy.strip()
-            # Strip out carriage returns:
-
-            result = result.strip().replace("\r", "")
-            # Strip out new lines when they occur after 70 other characters
-            # (try to fix wrapping)
-            result = self._wrap_re.sub(r"\1 ", result)
-            # Replace a sequence of 2+ new lines with a double line break;
-            result = self._lotsofnewlines_re.sub(" <br><br>", result)
-
-            # Now replace all new lines with a single line break;
-            result = result.replace("\n", " <br>\n")
-
-            # Attempt to magically convert any links to HTML markup:
-            result = self._link_re_1.sub(r'<a href="\1">\1</a>', result)
-            result = self._link_re_2.sub(
-                r'\1<a href="http://\2">\2</a>', result
-            )
-
-            return mark_safe(result)
+            # Not converted yet (see the backfill_legacy_copy_html command)
+            return mark_safe(self.legacy_copy_to_html())
 
     # This RE needs to be compiled so that the flags can be specified, as the
     # flags option to re.sub() wasn't added until python 2.7
@@ -395,6 +466,23 @@ class ShowingQuerySet(QuerySet):
         """Filter out unconfirmed showings"""
         return self.filter(confirmed=True)
 
+    def with_main_mediaitem(self):
+        """Fetch the main media item for the events of all showings in bulk"""
+        return self.prefetch_related(_main_mediaitem_prefetch("event__media"))
+
+    def with_vacant_rota_entries(self):
+        """Fetch the rota entries that nobody has filled for all showings in
+        bulk, as a list in each showing's vacant_rota_entries attribute"""
+        return self.prefetch_related(
+            Prefetch(
+                "rotaentry_set",
+                queryset=RotaEntry.objects.filter(
+                    Q(name="") | Q(name__isnull=True)
+                ).select_related("role"),
+                to_attr="vacant_rota_entries",
+            )
+        )
+
 
 class Showing(models.Model):
 
@@ -429,7 +517,8 @@ class Showing(models.Model):
     rota_notes = models.TextField(max_length=1024, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # (Indexed for the rota page's feed of changes)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     # Custom manager, with some extra methods:
     objects = ShowingQuerySet.as_manager()
@@ -537,8 +626,13 @@ class Showing(models.Model):
     @property
     def end_time(self):
         # Used by templates
-        duration = self.event.duration
-        return self.start + datetime.timedelta(
+        return self.calculate_end_time(self.start, self.event.duration)
+
+    @staticmethod
+    def calculate_end_time(start, duration):
+        # For when there isn't a Showing object to hand (e.g. when working
+        # with .values() querysets). duration is a datetime.time
+        return start + datetime.timedelta(
             hours=duration.hour, minutes=duration.minute
         )
 
@@ -556,19 +650,25 @@ class Showing(models.Model):
         event type defined then apply the default set of rota entries for that
         type"""
 
-        # Delete all existing rota entries (if any)
-        self.rotaentry_set.all().delete()
+        with transaction.atomic():
+            # Delete all existing rota entries (if any)
+            self.rotaentry_set.all().delete()
 
-        if self.event.template is not None:
-            # Add a rota entry for each role in the event type:
-            for role in self.event.template.roles.all():
-                RotaEntry(role=role, showing=self).save()
+            if self.event.template is not None:
+                # Add a rota entry for each role in the event type:
+                RotaEntry.objects.bulk_create(
+                    RotaEntry(role=role, showing=self)
+                    for role in self.event.template.roles.all()
+                )
 
     def clone_rota_from_showing(self, source_showing):
         assert self.pk is not None
-        for rota_entry in source_showing.rotaentry_set.all():
-            new_entry = RotaEntry(showing=self, template=rota_entry)
-            new_entry.save()
+        RotaEntry.objects.bulk_create(
+            RotaEntry(showing=self, template=rota_entry)
+            for rota_entry in source_showing.rotaentry_set.select_related(
+                "role"
+            )
+        )
 
     def clone_or_reset_rota(self, source_showing):
         if source_showing:
@@ -588,33 +688,52 @@ class Showing(models.Model):
 
         # Build map of rota entries by role id
         rota_entries_by_id = {}
-        for rota_entry in self.rotaentry_set.select_related():
-            rota_entries_by_id.setdefault(rota_entry.role.pk, []).append(
+        for rota_entry in self.rotaentry_set.all():
+            rota_entries_by_id.setdefault(rota_entry.role_id, []).append(
                 rota_entry
             )
 
+        # Work out everything that needs to change, then make the changes in
+        # one go:
+        entries_to_delete = []
+        entries_to_add = []
         for role_id, count in rota.items():
-            # Number of existing rota entries for this role_id.
+            # Existing rota entries for this role_id, lowest rank first.
             # Remove from dict, so anything left in the dict at the end
             # is an error...
-            existing_entries = rota_entries_by_id.pop(role_id, [])
+            existing_entries = sorted(
+                rota_entries_by_id.pop(role_id, []), key=lambda re: re.rank
+            )
             # delete highest ranked instances
-            while count < len(existing_entries):
-                logger.info(f"Removing role {role_id} from showing {self.pk}")
-                highest_ranked = max(existing_entries, key=lambda re: re.rank)
-                highest_ranked.delete()
-                existing_entries.remove(highest_ranked)
-            # add required entries
-            while count > len(existing_entries):
-                logger.info(f"Adding role {role_id} to showing {self.pk}")
-                # add rotaentries
-                new_re = RotaEntry(role_id=role_id, showing=self)
-                if len(existing_entries) > 0:
-                    new_re.rank = (
-                        1 + max(existing_entries, key=lambda re: re.rank).rank
+            if count < len(existing_entries):
+                logger.info(
+                    f"Removing {len(existing_entries) - count} of role "
+                    f"{role_id} from showing {self.pk}"
+                )
+                entries_to_delete.extend(existing_entries[count:])
+            # add required entries, ranked after the existing ones
+            if count > len(existing_entries):
+                logger.info(
+                    f"Adding {count - len(existing_entries)} of role "
+                    f"{role_id} to showing {self.pk}"
+                )
+                next_rank = (
+                    existing_entries[-1].rank + 1 if existing_entries else 1
+                )
+                entries_to_add.extend(
+                    RotaEntry(role_id=role_id, showing=self, rank=rank)
+                    for rank in range(
+                        next_rank, next_rank + count - len(existing_entries)
                     )
-                new_re.save()
-                existing_entries.append(new_re)
+                )
+
+        with transaction.atomic():
+            if entries_to_delete:
+                RotaEntry.objects.filter(
+                    pk__in=[entry.pk for entry in entries_to_delete]
+                ).delete()
+            if entries_to_add:
+                RotaEntry.objects.bulk_create(entries_to_add)
 
 
 class DiaryIdea(models.Model):
@@ -666,7 +785,8 @@ class RotaEntry(models.Model):
     name = models.TextField(max_length=256, null=False, blank=True)
 
     # created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # (Indexed for the rota page's feed of changes)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         db_table = "RotaEntries"
@@ -1,12 +1,17 @@
 import datetime
+import functools
+import json
 import logging
 import calendar
+import math
 
 from collections import OrderedDict
 
-from django.db.models import Q
-from django.http import Http404
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.http import Http404, HttpResponse, QueryDict
 from django.shortcuts import render, redirect
+from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils.html import conditional_escape
 import django.utils.timezone as timezone
@@ -14,63 +19,248 @@ import django.views.generic as generic
 
 from toolkit.diary.models import Showing, Event, PrintedProgramme
 from toolkit.diary.daterange import get_date_range
+from toolkit.diary.conditional import showing_validators, respond_conditionally
 from toolkit.diary.forms import SearchForm
 from toolkit.content.models import BasicArticlePage
+import toolkit.diary.search as event_search
+import toolkit.util.cache as toolkit_cache
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
+def _public_showings(startdate, enddate, tag=None):
+    # Public showings in the given date range, optionally filtered by an
+    # event tag
+    showings = Showing.objects.public().start_in_range(startdate, enddate)
+    if tag:
+        showings = showings.filter(event__tags__slug=tag)
+    return showings
+
+
 def _view_diary(request, startdate, enddate, tag=None, extra_title=None):
     # Returns public diary view, for given date range, optionally filtered by
     # an event tag.
+    #
+    # The listing is split into pages of settings.PROGRAMME_EVENTS_PER_PAGE
+    # events. The page number is given by the "page" GET parameter. If the
+    # "fragment" parameter is present then the page is returned as a JSON
+    # object containing HTML fragments, for the listing page to load as it's
+    # scrolled (see diary/js/programme_pages.js)
+    #
+    # The rendered page is cached (along with its ETag/Last-Modified
+    # validators); anything that changes the data shown in the listing
+    # invalidates the cache (see toolkit.diary.signals)
+    try:
+        page = int(request.GET.get("page", 1))
+    except ValueError:
+        raise Http404("Invalid page")
+    if page < 1:
+        raise Http404("Invalid page")
+    fragment = "fragment" in request.GET
+
+    cache_key = toolkit_cache.make_key(
+        toolkit_cache.PROGRAMME,
+        "listing",
+        request.get_host(),
+        startdate.isoformat(),
+        enddate.isoformat(),
+        tag,
+        extra_title,
+        "daysahead" in request.GET,
+        page,
+        fragment,
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        content, content_type, validators = cached
+        return respond_conditionally(
+            request,
+            validators,
+            lambda: HttpResponse(content, content_type=content_type),
+        )
 
-    # If we're not looking at a tag, retrieve any CMS pages to show:
-    cms_pages = (
-        BasicArticlePage.objects.filter(show_on_programme_page=True)
-        if not tag
-        else []
+    validators = showing_validators(
+        _public_showings(startdate, enddate, tag), page, fragment
     )
+    response = respond_conditionally(
+        request,
+        validators,
+        lambda: _render_diary(
+            request, startdate, enddate, tag, extra_title, page, fragment
+        ),
+    )
+    if response.status_code == 200:
+        cache.set(
+            cache_key,
+            (response.content, response["Content-Type"], validators),
+            settings.PROGRAMME_CACHE_TIMEOUT_SECONDS,
+        )
+    return response
+
+
+def _page_url(request, startdate, enddate, page, fragment=False):
+    # URL for the given page of the current listing. Only built from things
+    # that are in the cache key (the date range, and whether it came from a
+    # daysahead parameter), so that other parameters in the request that
+    # rendered the page don't end up in the cached copy's links
+    params = QueryDict(mutable=True)
+    if "daysahead" in request.GET:
+        params["daysahead"] = (enddate - startdate).days
+    params["page"] = page
+    if fragment:
+        params["fragment"] = 1
+    return f"{request.path}?{params.urlencode()}"
+
+
+def _list_entries(showings, previous_start=None):
+    # For the list view; returns a list of (showing, new_month, new_year,
+    # new_day) for each showing, where the flags are set if the showing is the
+    # first in that month/year/day. previous_start is the start of the showing
+    # before the first one (if any), so headings aren't repeated at page
+    # boundaries.
+    entries = []
+    previous = timezone.localtime(previous_start) if previous_start else None
+    for showing in showings:
+        start = timezone.localtime(showing.start)
+        entries.append(
+            (
+                showing,
+                previous is None or start.month != previous.month,
+                previous is None or start.year != previous.year,
+                previous is None or start.date() != previous.date(),
+            )
+        )
+        previous = start
+    return entries
+
+
+def _render_diary(
+    request, startdate, enddate, tag, extra_title, page, fragment
+):
+    per_page = settings.PROGRAMME_EVENTS_PER_PAGE
+    all_showings = _public_showings(startdate, enddate, tag)
+
+    # Work out which events go on which page: events are ordered by the
+    # start of their first showing in the range, and each page gets the
+    # next per_page of them. This only fetches event ids and times, so is
+    # cheap even for long date ranges.
+    event_starts = list(
+        all_showings.values_list("event_id")
+        .annotate(first_start=Min("start"))
+        .order_by("first_start", "event_id")
+    )
+    page_count = max(1, math.ceil(len(event_starts) / per_page))
+    if page > page_count:
+        raise Http404("Invalid page")
+    page_event_starts = event_starts[(page - 1) * per_page : page * per_page]
+    page_event_ids = [event_id for event_id, _ in page_event_starts]
+
+    # The list view for this page has all showings from the first showing of
+    # the first event on this page to the first showing of the first event on
+    # the next page:
+    list_start = page_event_starts[0][1] if page > 1 else None
+    list_end = event_starts[page * per_page][1] if page < page_count else None
+    in_list = Q()
+    if list_start is not None:
+        in_list &= Q(start__gte=list_start)
+    if list_end is not None:
+        in_list &= Q(start__lt=list_end)
 
     # Build query. The select_related() and prefetch_related on the end
     # encourages it to get the associated showing/event data, to reduce the
     # number of SQL queries
-    showings = (
-        Showing.objects.public()
-        .start_in_range(startdate, enddate)
+    showings = list(
+        all_showings.filter(Q(event_id__in=page_event_ids) | in_list)
         .order_by("start")
         .select_related()
-        .prefetch_related("event__media")
+        .with_main_mediaitem()
         .prefetch_related("event__tags")
     )
-    if tag:
-        showings = showings.filter(event__tags__slug=tag)
 
     # Build a list of events for that list of showings:
     events = OrderedDict()
     for showing in showings:
-        events.setdefault(showing.event, list()).append(showing)
+        if showing.event_id in page_event_ids:
+            events.setdefault(showing.event, list()).append(showing)
+
+    # Showings for the list view:
+    list_showings = [
+        showing
+        for showing in showings
+        if (list_start is None or showing.start >= list_start)
+        and (list_end is None or showing.start < list_end)
+    ]
+    previous_start = (
+        all_showings.filter(start__lt=list_start)
+        .order_by("-start")
+        .values_list("start", flat=True)
+        .first()
+        if list_start is not None
+        else None
+    )
 
     context = {
-        "cms_pages": cms_pages,
         "start": startdate,
         "end": enddate,
-        # Make sure user input is escaped:
-        "event_type": conditional_escape(tag) if tag else None,
-        # Set page title:
-        "extra_title": extra_title,
-        # Set of Showing objects for date range
+        # Set of Showing objects on this page:
         "showings": showings,
         # Ordered dict mapping event -> list of showings:
         "events": events,
+        # (showing, new_month, new_year, new_day) for the list view:
+        "list_entries": _list_entries(list_showings, previous_start),
         # This is prepended to filepaths from the MediaPaths table to use
         # as a location for images:
         "media_url": settings.MEDIA_URL,
-        "printed_programmes": PrintedProgramme.objects.month_in_range(
-            startdate, enddate
+        "next_page_url": (
+            _page_url(request, startdate, enddate, page + 1)
+            if page < page_count
+            else None
+        ),
+        "next_fragment_url": (
+            _page_url(request, startdate, enddate, page + 1, fragment=True)
+            if page < page_count
+            else None
         ),
     }
 
+    if fragment:
+        return HttpResponse(
+            json.dumps(
+                {
+                    "events": render_to_string(
+                        "fragment_programme_events.html", context, request
+                    ),
+                    "list": render_to_string(
+                        "fragment_programme_list.html", context, request
+                    ),
+                    "next": context["next_fragment_url"],
+                }
+            ),
+            content_type="application/json; charset=utf-8",
+        )
+
+    # If we're not looking at a tag, retrieve any CMS pages to show (on the
+    # first page only):
+    cms_pages = (
+        BasicArticlePage.objects.filter(show_on_programme_page=True)
+        if not tag and page == 1
+        else []
+    )
+
+    context.update(
+        {
+            "cms_pages": cms_pages,
+            # Make sure user input is escaped:
+            "event_type": conditional_escape(tag) if tag else None,
+            # Set page title:
+            "extra_title": extra_title,
+            "printed_programmes": PrintedProgramme.objects.month_in_range(
+                startdate, enddate
+            ),
+        }
+    )
+
     return render(request, "view_showing_index.html", context)
 
 
@@ -203,25 +393,33 @@ def view_showing(request, showing_id=None):
 def view_event(request, event_id=None, legacy_id=None, event_slug=None):
     # Show details of an individual event, with given event_id. Also allows
     # lookup by 'legacy_id', the non-primary key id used in the old toolkit.
-    context = {}
     try:
         if event_id:
-            event = Event.objects.filter(pk=event_id).prefetch_related(
-                "media"
-            )[0]
+            event = Event.objects.filter(pk=event_id)[0]
         else:
-            event = Event.objects.filter(legacy_id=legacy_id).prefetch_related(
-                "media"
-            )[0]
+            event = Event.objects.filter(legacy_id=legacy_id)[0]
     except IndexError:
         raise Http404("Event not found")
 
-    media = event.get_main_mediaitem()
-    showings = event.showings.public()
-    now = timezone.now()
+    if event.private:
+        raise Http404("Event not found")
 
-    if event.private or len(showings) == 0:
+    showings = event.showings.public()
+    # The page shows differently once showings are finished, and includes
+    # the current year:
+    validators = showing_validators(
+        showings, timezone.now().year, include_started=True
+    )
+    if validators[1] is None:
+        # No last modified date, so no public showings
         raise Http404("Event not found")
+    return respond_conditionally(
+        request, validators, lambda: _render_event(request, event, showings)
+    )
+
+
+def _render_event(request, event, showings):
+    now = timezone.now()
 
     context = {
         "event": event,
@@ -230,7 +428,6 @@ def view_event(request, event_id=None, legacy_id=None, event_slug=None):
         "all_showings_cancelled": all([s.cancelled for s in showings]),
         "all_showings_sold_out": all([s.sold_out for s in showings]),
         "all_showings_finished": all([s.start < now for s in showings]),
-        "media": {event.id: media},
         "media_url": settings.MEDIA_URL,
     }
     return render(request, "view_event.html", context)
@@ -285,7 +482,30 @@ class ArchiveIndex(generic.ArchiveIndexView):
     template_name = "showing_archive.html"
 
 
-class ArchiveYear(generic.YearArchiveView):
+class ConditionalArchiveMixin:
+    # Respond with 304 Not Modified if none of the showings in the archive
+    # page have changed since the client last fetched it
+
+    def get_validator_queryset(self):
+        # The showings in the requested year (and month, for month views)
+        lookups = {f"{self.date_field}__year": int(self.get_year())}
+        if isinstance(self, generic.dates.MonthMixin):
+            lookups[f"{self.date_field}__month"] = int(self.get_month())
+        return self.get_queryset().filter(**lookups)
+
+    def get(self, request, *args, **kwargs):
+        render = functools.partial(super().get, request, *args, **kwargs)
+        try:
+            showings = self.get_validator_queryset()
+        except ValueError:
+            # Invalid date; let the archive view report the error
+            return render()
+        return respond_conditionally(
+            request, showing_validators(showings), render
+        )
+
+
+class ArchiveYear(ConditionalArchiveMixin, generic.YearArchiveView):
     # Limit to public events (select_related heavily reduces query count)
     queryset = Showing.objects.public().select_related()
 
@@ -294,7 +514,7 @@ class ArchiveYear(generic.YearArchiveView):
     ordering = "start"
 
 
-class ArchiveMonth(generic.MonthArchiveView):
+class ArchiveMonth(ConditionalArchiveMixin, generic.MonthArchiveView):
     # Limit to public events (select_related heavily reduces query count)
     queryset = Showing.objects.public().select_related()
 
@@ -342,18 +562,13 @@ class ArchiveSearch(generic.list.ListView, generic.edit.FormMixin):
         queryset = Showing.objects.public().select_related()
 
         if options["search_term"]:
-            if options["search_in_descriptions"]:
-                # If a search term was provided and "search descriptions"
-                # was checked, filter on the event name and copy:
-                queryset = queryset.filter(
-                    Q(event__name__icontains=options["search_term"])
-                    | Q(event__copy__icontains=options["search_term"])
-                )
-            else:
-                # Otherwise just the event name
-                queryset = queryset.filter(
-                    event__name__icontains=options["search_term"]
-                )
+            # Filter on the event name, and the copy if "search descriptions"
+            # was checked. Best matches first:
+            queryset = event_search.search_events(
+                queryset,
+                options["search_term"],
+                search_copy=options["search_in_descriptions"],
+            ).order_by("-search_relevance", "start")
         # Add extra filters if start/end date were specified:
         if options["start_date"]:
             queryset = queryset.filter(start__gte=options["start_date"])
@@ -0,0 +1,128 @@
+"""
+Rules for series of showings that repeat at regular intervals (e.g. a weekly
+film club, or a night on the first Friday of every month).
+
+A rule is expanded into a list of start times, which can then be shown to the
+user to check, and booked in one go with toolkit.diary.bookings. Start times
+keep the same local (wall clock) time across changes to/from summer time.
+"""
+
+import calendar
+import datetime
+
+import django.utils.timezone as timezone
+
+WEEKLY = "weekly"
+FORTNIGHTLY = "fortnightly"
+MONTHLY = "monthly"
+
+FREQUENCY_CHOICES = (
+    (WEEKLY, "Every week"),
+    (FORTNIGHTLY, "Every two weeks"),
+    (MONTHLY, "The same weekday every month"),
+)
+
+# For MONTHLY: which of the weekdays in the month (-1 being the last):
+WEEK_OF_MONTH_CHOICES = (
+    (1, "First"),
+    (2, "Second"),
+    (3, "Third"),
+    (4, "Fourth"),
+    (-1, "Last"),
+)
+
+# Upper limit on the length of a series, to stop typos booking decades of
+# showings:
+MAX_OCCURRENCES = 100
+
+
+class RecurrenceError(ValueError):
+    pass
+
+
+def _nth_weekday(year, month, weekday, week_of_month):
+    # Date of the given weekday (0 = Monday) in the given week of the month
+    # (1-4, or -1 for the last one)
+    days_in_month = calendar.monthrange(year, month)[1]
+    if week_of_month == -1:
+        last = datetime.date(year, month, days_in_month)
+        return last - datetime.timedelta(days=(last.weekday() - weekday) % 7)
+    first = datetime.date(year, month, 1)
+    return first + datetime.timedelta(
+        days=(weekday - first.weekday()) % 7 + 7 * (week_of_month - 1)
+    )
+
+
+class RecurrenceRule:
+    """A repeating series, starting at first_start (an aware datetime) and
+    repeating until the date until (inclusive), skipping any dates in
+    exceptions.
+
+    For MONTHLY rules the showings are on the same weekday as first_start,
+    in week_of_month of each month (if that's not given, it's worked out from
+    first_start; a showing in the fifth week counts as the last)."""
+
+    def __init__(
+        self,
+        frequency,
+        first_start,
+        until,
+        week_of_month=None,
+        exceptions=(),
+    ):
+        # Repeat at the same local time:
+        first_start = timezone.localtime(first_start)
+        if frequency not in dict(FREQUENCY_CHOICES):
+            raise RecurrenceError(f"Unknown frequency '{frequency}'")
+        if until < first_start.date():
+            raise RecurrenceError("Series ends before it starts")
+        self.frequency = frequency
+        self.first_start = first_start
+        self.until = until
+        if week_of_month is None:
+            week_of_month = (first_start.day - 1) // 7 + 1
+            if week_of_month == 5:
+                week_of_month = -1
+        if week_of_month not in dict(WEEK_OF_MONTH_CHOICES):
+            raise RecurrenceError(f"Invalid week of month {week_of_month}")
+        self.week_of_month = week_of_month
+        self.exceptions = frozenset(exceptions)
+
+    def _dates(self):
+        first_date = self.first_start.date()
+        if self.frequency in (WEEKLY, FORTNIGHTLY):
+            step = datetime.timedelta(
+                weeks=1 if self.frequency == WEEKLY else 2
+            )
+            day = first_date
+            while day <= self.until:
+                yield day
+                day += step
+        else:
+            year, month = first_date.year, first_date.month
+            while True:
+                day = _nth_weekday(
+                    year, month, first_date.weekday(), self.week_of_month
+                )
+                if day > self.until:
+                    break
+                if day >= first_date:
+                    yield day
+                year, month = (
+                    (year + 1, 1) if month == 12 else (year, month + 1)
+                )
+
+    def occurrences(self):
+        """Return a list of the start times of the showings in the series.
+        Raises RecurrenceError if there are more than MAX_OCCURRENCES."""
+        local_time = self.first_start.timetz()
+        starts = []
+        for day in self._dates():
+            if day in self.exceptions:
+                continue
+            if len(starts) == MAX_OCCURRENCES:
+                raise RecurrenceError(
+                    f"Series has more than {MAX_OCCURRENCES} showings"
+                )
+            starts.append(datetime.datetime.combine(day, local_time))
+        return starts
@@ -0,0 +1,142 @@
+"""
+Full-text search of event names and copy, used by the public archive search
+and the copy report.
+
+On MySQL this uses FULLTEXT indexes on the Events table (created in
+migration 0010) which MySQL keeps up to date itself. On SQLite (tests and
+development) it uses an FTS5 table, which is updated from a post_save signal
+whenever an event is saved (see toolkit.diary.signals), or by calling
+update_index_many() after writing events in bulk. For anything else, or
+if the search term has no words in it, it falls back to the old (slow)
+substring match. (On MySQL, words that it doesn't index, because they're too
+short or are stopwords, are left out of the search.)
+
+Matching is on word prefixes, so "film" finds "films" but not "microfilm".
+"""
+
+import re
+
+from django.db import connections, router
+from django.db.models import F, FloatField, Func, Q, Value
+
+from toolkit.diary.models import Event
+
+# Name of SQLite FTS5 table. The rowid of each row is the event id:
+SQLITE_FTS_TABLE = "diary_event_search"
+
+_word_re = re.compile(r"\w+")
+
+# MySQL doesn't index words shorter than innodb_ft_min_token_size (3 by
+# default) or in its stopword list (the default list is below), so a query
+# that requires them never matches anything:
+MYSQL_MIN_TOKEN_SIZE = 3
+MYSQL_STOPWORDS = frozenset(
+    "a about an are as at be by com de en for from how i in is it la of on or"
+    " that the this to was what when where who will with und www".split()
+)
+
+
+class _Match(Func):
+    # Base for the vendor specific match expressions; the template should
+    # have one "%%s" placeholder, for the query
+    output_field = FloatField()
+
+    def __init__(self, *expressions, query):
+        super().__init__(*expressions)
+        self.query = query
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, (*params, self.query)
+
+
+class _MySQLMatch(_Match):
+    template = "MATCH (%(expressions)s) AGAINST (%%s IN BOOLEAN MODE)"
+
+
+class _SQLiteMatch(_Match):
+    # bm25() gives smaller numbers for better matches, hence the "-". The
+    # result is NULL for events that don't match:
+    template = (
+        f"(SELECT -bm25({SQLITE_FTS_TABLE}) FROM {SQLITE_FTS_TABLE}"
+        f" WHERE {SQLITE_FTS_TABLE} MATCH %%s AND rowid = %(expressions)s)"
+    )
+
+
+def _mysql_words(words):
+    # The words that MySQL can actually search for (if there are none, the
+    # substring match is used instead):
+    return [
+        word
+        for word in words
+        if len(word) >= MYSQL_MIN_TOKEN_SIZE
+        and word.lower() not in MYSQL_STOPWORDS
+    ]
+
+
+def search_events(queryset, term, search_copy=False, event_path="event__"):
+    """Filter queryset to things with events whose name (and copy, if
+    search_copy is True) contain all the words in term. The results are
+    annotated with "search_relevance" (bigger is better).
+
+    event_path is the path from the queryset's model to the Event; the
+    default is right for querysets of Showings, use "" for Events."""
+    words = _word_re.findall(term)
+    vendor = connections[queryset.db].vendor
+
+    if vendor == "mysql":
+        words = _mysql_words(words)
+
+    if words and vendor == "mysql":
+        columns = [F(f"{event_path}name")]
+        if search_copy:
+            columns.append(F(f"{event_path}copy"))
+        query = " ".join(f"+{word}*" for word in words)
+        return queryset.annotate(
+            search_relevance=_MySQLMatch(*columns, query=query)
+        ).filter(search_relevance__gt=0)
+
+    elif words and vendor == "sqlite":
+        columns = "{name copy}" if search_copy else "name"
+        query = "{} : ({})".format(
+            columns, " AND ".join(f'"{word}"*' for word in words)
+        )
+        return queryset.annotate(
+            search_relevance=_SQLiteMatch(F(f"{event_path}pk"), query=query)
+        ).filter(search_relevance__isnull=False)
+
+    else:
+        match = Q(**{f"{event_path}name__icontains": term})
+        if search_copy:
+            match |= Q(**{f"{event_path}copy__icontains": term})
+        return queryset.filter(match).annotate(
+            search_relevance=Value(1.0, output_field=FloatField())
+        )
+
+
+def update_index(event, using=None):
+    """Update the search index for the given event, in the given database
+    (by default, the one the event would be written to). Only needed for
+    SQLite, MySQL maintains FULLTEXT indexes itself."""
+    if using is None:
+        using = router.db_for_write(type(event), instance=event)
+    update_index_many([event], using=using)
+
+
+def update_index_many(events, using=None):
+    """As update_index(), for several events at once. The post_save signal
+    that calls update_index() isn't sent by bulk_create(), bulk_update() or
+    QuerySet.update(), so anything that changes event names or copy that way
+    should call this afterwards, or the events won't be found by their new
+    names (or at all, for new events) until they're next saved."""
+    if using is None:
+        using = router.db_for_write(Event)
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {SQLITE_FTS_TABLE} (rowid, name, copy)"
+            " VALUES (%s, %s, %s)",
+            [(event.pk, event.name, event.copy or "") for event in events],
+        )
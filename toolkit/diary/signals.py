@@ -0,0 +1,80 @@
+"""
+Signal handlers to throw away cached copies of the public programme, the
+editing calendar data and the site navigation menu when any of the data that
+goes into them is changed, and to keep the event search index up to date.
+"""
+
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+import wagtail.signals
+from wagtail.models import Page, Site
+
+from toolkit.diary.models import (
+    Showing,
+    Event,
+    EventTag,
+    MediaItem,
+    PrintedProgramme,
+    Room,
+)
+from toolkit.content.models import BasicArticlePage
+import toolkit.diary.search as search
+import toolkit.util.cache as toolkit_cache
+
+PROGRAMME_MODELS = (
+    Showing,
+    Event,
+    EventTag,
+    MediaItem,
+    PrintedProgramme,
+    BasicArticlePage,
+)
+
+
+def invalidate_programme_on_change(sender, **kwargs):
+    toolkit_cache.invalidate_on_commit(toolkit_cache.PROGRAMME)
+
+
+for model in PROGRAMME_MODELS:
+    post_save.connect(invalidate_programme_on_change, sender=model)
+    post_delete.connect(invalidate_programme_on_change, sender=model)
+
+
+@receiver(post_save, sender=Showing)
+@receiver(post_delete, sender=Showing)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def invalidate_calendar_on_change(sender, **kwargs):
+    toolkit_cache.invalidate_on_commit(toolkit_cache.DIARY_CALENDAR)
+
+
+@receiver(m2m_changed, sender=Event.tags.through)
+@receiver(m2m_changed, sender=Event.media.through)
+def invalidate_programme_on_m2m_change(sender, action, **kwargs):
+    if action.startswith("post_"):
+        toolkit_cache.invalidate_on_commit(toolkit_cache.PROGRAMME)
+
+
+@receiver(wagtail.signals.page_published, sender=BasicArticlePage)
+@receiver(wagtail.signals.page_unpublished, sender=BasicArticlePage)
+def invalidate_programme_on_publish(sender, **kwargs):
+    toolkit_cache.invalidate_on_commit(toolkit_cache.PROGRAMME)
+
+
+@receiver(post_save, sender=EventTag)
+@receiver(post_delete, sender=EventTag)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+@receiver(post_delete, sender=Page)
+@receiver(wagtail.signals.page_published)
+@receiver(wagtail.signals.page_unpublished)
+@receiver(wagtail.signals.post_page_move)
+def invalidate_navigation_on_change(sender, **kwargs):
+    toolkit_cache.invalidate_on_commit(toolkit_cache.NAVIGATION)
+
+
+@receiver(post_save, sender=Event)
+def update_search_index(sender, instance, using, **kwargs):
+    search.update_index(instance, using=using)
@@ -1,6 +1,10 @@
-function edit_rota(jQuery, rota_edit_base_url, edit_rota_notes_url_prefix, vol_email, CSRF_TOKEN) {
+function edit_rota(jQuery, rota_edit_base_url, edit_rota_notes_url_prefix, vol_email, CSRF_TOKEN, rota_changes_url, changes_since) {
     "use strict";
     const $ = jQuery;
+    // How often to check for changes made by other people:
+    const CHANGES_POLL_INTERVAL_MS = 30000;
+    const NAME_PLACEHOLDER = '<span class="na">Click to edit</span>';
+    const NOTES_PLACEHOLDER = '<span class="na">General notes (click to edit)</span>';
     let fromDatePicker;
     let toDatePicker;
 
@@ -52,7 +56,7 @@ function edit_rota(jQuery, rota_edit_base_url, edit_rota_notes_url_prefix, vol_e
     function configureRotaNameEditInPlaceControls() {
         $('.rota_name').editable('', {
             width: "25%",
-            placeholder: '<span class="na">Click to edit</span>',
+            placeholder: NAME_PLACEHOLDER,
             submit: "Save",
             submitdata: {
                 csrfmiddlewaretoken: CSRF_TOKEN
@@ -88,7 +92,7 @@ function edit_rota(jQuery, rota_edit_base_url, edit_rota_notes_url_prefix, vol_e
                         type: 'textarea',
                         rows: 5,
                         width: '90%',
-                        placeholder: '<span class="na">General notes (click to edit)</span>',
+                        placeholder: NOTES_PLACEHOLDER,
                         submit: 'Save',
                         submitdata: {
                             csrfmiddlewaretoken: CSRF_TOKEN
@@ -107,9 +111,47 @@ function edit_rota(jQuery, rota_edit_base_url, edit_rota_notes_url_prefix, vol_e
         });
     }
 
+    function updateElement(element, value, placeholder) {
+        // Leave alone anything that isn't on this page, or that's being
+        // edited (jeditable replaces the text with a form while it is):
+        if(!element || $(element).find('form').length) {
+            return;
+        }
+        element.innerHTML = value === "" ? placeholder : value;
+    }
+
+    function pollForChanges() {
+        if(document.hidden) {
+            setTimeout(pollForChanges, CHANGES_POLL_INTERVAL_MS);
+            return;
+        }
+        $.getJSON(rota_changes_url, {since: changes_since})
+            .done(function(data) {
+                changes_since = data.until;
+                // Values are already escaped:
+                data.rota_entries.forEach(function(entry) {
+                    const element = document.getElementById(String(entry.id));
+                    if(element && $(element).hasClass('rota_name')) {
+                        updateElement(element, entry.value, NAME_PLACEHOLDER);
+                    }
+                });
+                data.rota_notes.forEach(function(notes) {
+                    updateElement(
+                        document.getElementById('showing_rota_notes_' + notes.id),
+                        notes.value,
+                        NOTES_PLACEHOLDER
+                    );
+                });
+            })
+            .always(function() {
+                setTimeout(pollForChanges, CHANGES_POLL_INTERVAL_MS);
+            });
+    }
+
     $(document).ready(function() {
         configureDatePickerControls();
         configureRotaNameEditInPlaceControls();
         configureRotaNotesEditInPlaceControls();
+        setTimeout(pollForChanges, CHANGES_POLL_INTERVAL_MS);
     });
 }
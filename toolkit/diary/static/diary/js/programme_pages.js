@@ -0,0 +1,61 @@
+/* Progressive loading of the pages of the public programme listing.
+ *
+ * The listing is served in pages; the "Later events" link at the bottom of
+ * each page links to the next one. If the browser supports it, the link is
+ * replaced by loading the next page (as a JSON object of HTML fragments, from
+ * the URL in its data-fragment-url attribute) when it scrolls into view, and
+ * adding the events to the grid and list views.
+ */
+function setup_programme_pages() {
+    "use strict";
+
+    $(document).ready(function($) {
+        const $next = $('p.next-page');
+        if($next.length === 0 || !('IntersectionObserver' in window)) {
+            return;
+        }
+        let fragmentUrl = $next.find('a').data('fragment-url');
+        let loading = false;
+
+        function loadNextPage() {
+            if(loading || !fragmentUrl) {
+                return;
+            }
+            loading = true;
+            $.getJSON(fragmentUrl).done(function(data) {
+                const $events = $($.parseHTML(data.events)).filter('.showing');
+                const $grid = $('.programme');
+                $grid.append($events).masonry('appended', $events);
+                $grid.imagesLoaded().progress(function() {
+                    $grid.masonry('layout');
+                });
+                $('.list p.list-end').before(data.list);
+
+                fragmentUrl = data.next;
+                if(fragmentUrl) {
+                    // Re-observing triggers the callback again, so the next
+                    // page is loaded if the link is still in view:
+                    observer.unobserve($next[0]);
+                    observer.observe($next[0]);
+                } else {
+                    observer.disconnect();
+                    $next.remove();
+                }
+            }).always(function() {
+                loading = false;
+            });
+        }
+
+        const observer = new IntersectionObserver(function(entries) {
+            if(entries.some(function(entry) { return entry.isIntersecting; })) {
+                loadNextPage();
+            }
+        }, {rootMargin: '400px'});
+        observer.observe($next[0]);
+
+        $next.find('a').click(function() {
+            loadNextPage();
+            return false;
+        });
+    });
+}
@@ -2,11 +2,15 @@
 Filter to format a list of showings as a human readable date range
 """
 
+from collections import defaultdict
 import datetime
+import functools
 
 from django import template
 from django.utils.timezone import get_current_timezone
 
+from toolkit.diary.models import Showing
+
 register = template.Library()
 
 
@@ -106,7 +110,46 @@ def _pretty_print_dateset(dates):
     return ", ".join(out_strings)
 
 
+# The same events tend to get formatted over and over (e.g. in each mailout
+# preview) so remember the results. The timezone is part of the key as the
+# output depends on it:
+@functools.lru_cache(maxsize=4096)
+def _summarise_dates(dates, timezone_name):
+    return _pretty_print_dateset(list(dates))
+
+
+def _summarise_current_tz(dates):
+    return _summarise_dates(tuple(dates), str(get_current_timezone()))
+
+
 @register.filter(name="showingdates")
 def format_showing_dates(showings):
-    dates = [s.start for s in showings]
-    return _pretty_print_dateset(dates)
+    return _summarise_current_tz(s.start for s in showings)
+
+
+def set_public_showing_dates(events):
+    """Fetch the start times of the public showings of all the given events
+    in one query, and store the summary of them on each event, for the
+    public_showing_dates filter"""
+    events = list(events)
+    starts = defaultdict(list)
+    showings = (
+        Showing.objects.public()
+        .filter(event_id__in={event.pk for event in events})
+        .order_by("start")
+        .values_list("event_id", "start")
+    )
+    for event_id, start in showings:
+        starts[event_id].append(start)
+    for event in events:
+        event._public_showing_dates = _summarise_current_tz(starts[event.pk])
+
+
+@register.filter(name="public_showing_dates")
+def format_public_showing_dates(event):
+    """Summary of the dates of the public showings of an event. Uses the value
+    stored by set_public_showing_dates() if that's been called, otherwise
+    queries for the dates"""
+    if not hasattr(event, "_public_showing_dates"):
+        set_public_showing_dates([event])
+    return event._public_showing_dates
@@ -1,8 +1,12 @@
 from unittest.mock import patch
 
+from django.db import connection
 from django.test import TestCase
 from django.urls import reverse
 
+from toolkit.diary.models import Event
+from toolkit.diary.search import _mysql_words
+import toolkit.diary.search as search
 from .common import DiaryTestsMixin
 
 
@@ -61,3 +65,103 @@ class ArchiveViews(DiaryTestsMixin, TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "showing_archive_search.html")
         self.assertContains(response, "4 Results")
+
+    def _search_results(self, **data):
+        response = self.client.get(reverse("archive-search"), data=data)
+        self.assertEqual(response.status_code, 200)
+        return [showing.event for showing in response.context["showing_list"]]
+
+    def test_run_search_prefix(self):
+        results = self._search_results(search_term="ev titl")
+        self.assertEqual(len(results), 4)
+        self.assertEqual(self._search_results(search_term="vent"), [])
+
+    def test_run_search_in_descriptions(self):
+        self.assertEqual(self._search_results(search_term="copy"), [])
+        results = self._search_results(
+            search_term="copy", search_in_descriptions="on"
+        )
+        self.assertEqual(len(results), 4)
+
+    def test_run_search_relevance_order(self):
+        self.e4.name = "Four four four"
+        self.e4.copy = "Four"
+        self.e4.save()
+        results = self._search_results(
+            search_term="four", search_in_descriptions="on"
+        )
+        self.assertEqual(results[0], self.e4)
+
+    def test_run_search_index_updated_on_save(self):
+        self.assertEqual(self._search_results(search_term="aardvark"), [])
+        self.e2.name = "Aardvarks!"
+        self.e2.save()
+        self.assertEqual(
+            set(self._search_results(search_term="aardvark")), {self.e2}
+        )
+        self.assertEqual(self._search_results(search_term="two"), [])
+
+    def test_search_index_updated_in_saved_database(self):
+        with patch("toolkit.diary.search.update_index") as update_mock:
+            self.e2.save(using="default")
+        update_mock.assert_called_once_with(self.e2, using="default")
+
+    def test_search_index_uses_write_database(self):
+        # Without a database given, the index is updated in the one that
+        # the router would write the event to:
+        self.e2.name = "Aardvarks!"
+        Event.objects.filter(pk=self.e2.pk).update(name=self.e2.name)
+        with patch(
+            "toolkit.diary.search.router.db_for_write", return_value="other"
+        ) as router_mock, patch(
+            "toolkit.diary.search.connections", {"other": connection}
+        ):
+            search.update_index(self.e2)
+        router_mock.assert_called_once_with(Event, instance=self.e2)
+        self.assertEqual(
+            set(self._search_results(search_term="aardvark")), {self.e2}
+        )
+
+    def test_search_index_bulk_writes(self):
+        # bulk_create() doesn't send post_save, so the new events aren't
+        # searchable until the index is updated:
+        events = Event.objects.bulk_create(
+            [Event(name="Aardvark one"), Event(name="Aardvark two")]
+        )
+        self.assertEqual(
+            Event.objects.filter(name__startswith="Aardvark").count(), 2
+        )
+        results = search.search_events(
+            Event.objects.all(), "aardvark", event_path=""
+        )
+        self.assertEqual(list(results), [])
+
+        search.update_index_many(events)
+        results = search.search_events(
+            Event.objects.all(), "aardvark", event_path=""
+        )
+        self.assertEqual(set(results), set(events))
+
+    def test_run_search_no_words(self):
+        # Falls back to a substring match:
+        self.e2.name = "Event ???"
+        self.e2.save()
+        self.assertEqual(
+            set(self._search_results(search_term="???")), {self.e2}
+        )
+
+    def test_mysql_unindexed_words_dropped(self):
+        # Too short, or stopwords, so MySQL would never match them:
+        self.assertEqual(
+            _mysql_words(["Don", "t", "look", "The", "at", "Now"]),
+            ["Don", "look", "Now"],
+        )
+
+    def test_run_search_only_unindexed_words_mysql(self):
+        # Nothing that MySQL could search for, so falls back to a substring
+        # match (which works on SQLite too):
+        self.e2.name = "To be or not to be"
+        self.e2.save()
+        with patch.object(connection, "vendor", "mysql"):
+            results = self._search_results(search_term="to be")
+        self.assertEqual(set(results), {self.e2})
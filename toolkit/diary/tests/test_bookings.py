@@ -0,0 +1,177 @@
+from datetime import datetime, time, timedelta
+from unittest.mock import patch
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+
+from toolkit.diary.bookings import (
+    create_event_with_showings,
+    create_showings,
+    find_room_clashes,
+)
+from toolkit.diary.models import Event, Room, Showing
+
+from .common import DiaryTestsMixin, NowPatchMixin, UKTZ
+
+
+class CreateShowingsTests(DiaryTestsMixin, NowPatchMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.start = datetime(2013, 7, 1, 20, 0, tzinfo=UKTZ)
+
+    def _starts(self, count):
+        return [self.start + timedelta(days=n) for n in range(count)]
+
+    def _rota(self, showing):
+        return sorted(showing.rotaentry_set.values_list("role__name", "rank"))
+
+    def _new_event(self):
+        return Event(
+            name="New event", template=self.tmpl2, duration="01:00:00"
+        )
+
+    def test_create_event_with_showings(self):
+        event = self._new_event()
+        showings = create_event_with_showings(
+            event, self._starts(3), booked_by="Someone", discounted=True
+        )
+
+        self.assertEqual(
+            list(event.showings.order_by("start")),
+            showings,
+        )
+        self.assertEqual(
+            sorted(event.tags.values_list("slug", flat=True)),
+            ["tag-one", "tag-three"],
+        )
+        for n, showing in enumerate(showings):
+            showing.refresh_from_db()
+            self.assertEqual(showing.start, self._starts(3)[n])
+            self.assertEqual(showing.booked_by, "Someone")
+            self.assertTrue(showing.discounted)
+            self.assertEqual(
+                self._rota(showing),
+                [("Role 1 (standard)", 1), ("Role 2 (nonstandard)", 1)],
+            )
+
+    def test_query_count(self):
+        # The number of queries doesn't depend on the number of showings:
+        with self.assertNumQueries(12):
+            create_event_with_showings(
+                self._new_event(), self._starts(1), booked_by="Someone"
+            )
+        with self.assertNumQueries(12):
+            create_event_with_showings(
+                self._new_event(), self._starts(14), booked_by="Someone"
+            )
+
+    def test_without_bulk_insert_ids(self):
+        # e.g. MySQL, where the ids of the new showings have to be looked up
+        event = self._new_event()
+        event.save()
+        # Existing showing at the same time, which should be left alone:
+        create_showings(event, self._starts(1), booked_by="Someone")
+        with patch.object(
+            type(connection.features),
+            "can_return_rows_from_bulk_insert",
+            False,
+        ):
+            showings = create_showings(
+                event, self._starts(2), booked_by="Someone else"
+            )
+        self.assertEqual(event.showings.count(), 3)
+        for showing in showings:
+            self.assertEqual(
+                Showing.objects.get(pk=showing.pk).booked_by, "Someone else"
+            )
+            self.assertEqual(len(self._rota(showing)), 2)
+
+    def test_rota_from(self):
+        showings = create_showings(
+            self.e2s1.event,
+            self._starts(2),
+            rota_from=self.e2s1,
+            booked_by="Someone",
+        )
+        for showing in showings:
+            self.assertEqual(
+                self._rota(showing),
+                [("Role 2 (nonstandard)", 1), ("Role 3", 1)],
+            )
+
+    def test_invalid(self):
+        event = self._new_event()
+        starts = [self.start, datetime(2013, 5, 1, 20, 0, tzinfo=UKTZ)]
+        with self.assertRaises(ValidationError) as cm:
+            create_event_with_showings(event, starts, booked_by="Someone")
+        self.assertEqual(len(cm.exception.messages), 1)
+        self.assertTrue(cm.exception.messages[0].startswith("01/05/2013"))
+        # Nothing was created:
+        self.assertFalse(Event.objects.filter(name="New event").exists())
+
+        # Missing booked_by for both:
+        with self.assertRaises(ValidationError) as cm:
+            create_event_with_showings(self._new_event(), self._starts(2))
+        self.assertEqual(len(cm.exception.messages), 2)
+
+    def test_allow_past(self):
+        event = self._new_event()
+        past_start = datetime(2013, 5, 1, 20, 0, tzinfo=UKTZ)
+        create_event_with_showings(
+            event, [past_start], allow_past=True, booked_by="Someone"
+        )
+        self.assertEqual(event.showings.get().start, past_start)
+
+
+class FindRoomClashesTests(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Two showings in room 2 on 1/7/2013, 20:00-21:00 and 22:00-23:00,
+        # and a cancelled one in between:
+        event = Event.objects.create(name="Existing", duration=time(1, 0))
+        for hour, cancelled in ((20, False), (22, False), (21, True)):
+            Showing(
+                event=event,
+                start=datetime(2013, 7, 1, hour, 0, tzinfo=UKTZ),
+                room=self.room_2,
+                cancelled=cancelled,
+                booked_by="Someone",
+            ).save(force=True)
+
+    def _clash_hours(self, starts, duration, room=None):
+        clashes = find_room_clashes(room or self.room_2, starts, duration)
+        return {
+            start.hour: sorted(s.start.astimezone(UKTZ).hour for s in found)
+            for start, found in clashes.items()
+        }
+
+    def test_clashes(self):
+        starts = [
+            datetime(2013, 7, 1, hour, minute, tzinfo=UKTZ)
+            for hour, minute in ((18, 30), (19, 30), (21, 0), (21, 30))
+        ]
+        self.assertEqual(
+            self._clash_hours(starts, time(1, 0)),
+            # 18:30-19:30 touches nothing, 21:00-22:00 fits in the gap:
+            {19: [20], 21: [22]},
+        )
+        # A longer showing from 19:30 overlaps both:
+        self.assertEqual(
+            self._clash_hours(starts[1:2], time(3, 0)), {19: [20, 22]}
+        )
+
+    def test_other_room(self):
+        room_1 = Room.objects.get(name="Room one")
+        start = datetime(2013, 7, 1, 20, 0, tzinfo=UKTZ)
+        self.assertEqual(self._clash_hours([start], time(1, 0), room_1), {})
+        self.assertEqual(find_room_clashes(None, [start], time(1, 0)), {})
+
+    def test_query_count(self):
+        starts = [
+            datetime(2013, 7, 1, 20, 0, tzinfo=UKTZ) + timedelta(weeks=n)
+            for n in range(20)
+        ]
+        with self.assertNumQueries(1):
+            clashes = find_room_clashes(self.room_2, starts, time(1, 0))
+        self.assertEqual(list(clashes), starts[:1])
@@ -0,0 +1,131 @@
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase
+
+from toolkit.diary.clashes import (
+    Booking,
+    RoomClashIndex,
+    describe,
+    find_showing_clashes,
+    load_bookings,
+)
+from toolkit.diary.models import Event, Room, Showing
+
+from .common import DiaryTestsMixin, UKTZ
+
+
+def _at(hour, minute=0, day=1):
+    return datetime(2013, 7, day, hour, minute, tzinfo=UKTZ)
+
+
+class RoomClashIndexTests(TestCase):
+    def _booking(self, showing_id, room_id, start, hours):
+        return Booking(
+            showing_id,
+            1,
+            f"Event {showing_id}",
+            room_id,
+            start,
+            start + timedelta(hours=hours),
+        )
+
+    def setUp(self):
+        self.index = RoomClashIndex(
+            [
+                self._booking(3, 1, _at(22), 1),
+                self._booking(1, 1, _at(14), 7),
+                self._booking(2, 1, _at(20, 30), 1),
+                self._booking(4, 2, _at(20), 1),
+                # Overnight, from the day before:
+                self._booking(5, 2, _at(23) - timedelta(days=1), 2),
+            ]
+        )
+
+    def _overlapping(self, room_id, start, end):
+        return sorted(
+            b.showing_id for b in self.index.overlapping(room_id, start, end)
+        )
+
+    def test_overlapping(self):
+        self.assertEqual(self._overlapping(1, _at(19), _at(21)), [1, 2])
+        # Finishing as another starts, or starting as another finishes, is
+        # fine:
+        self.assertEqual(self._overlapping(1, _at(21, 30), _at(22)), [])
+        self.assertEqual(self._overlapping(1, _at(23), _at(23, 30)), [])
+        # The long showing from 14:00 is still found:
+        self.assertEqual(self._overlapping(1, _at(19, 59), _at(20)), [1])
+        self.assertEqual(self._overlapping(2, _at(0), _at(1)), [5])
+        self.assertEqual(self._overlapping(2, _at(19), _at(21)), [4])
+        self.assertEqual(self._overlapping(3, _at(19), _at(21)), [])
+
+    def test_clashing_showing_ids(self):
+        self.assertEqual(self.index.clashing_showing_ids(), {1, 2})
+
+    def test_describe(self):
+        self.assertEqual(
+            describe(self.index.overlapping(1, _at(19), _at(21))),
+            "Overlaps 'Event 1' at 14:00 on 01/07/2013, "
+            "'Event 2' at 20:30 on 01/07/2013",
+        )
+
+
+class FindShowingClashesTests(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(name="Existing", duration=time(1, 0))
+        self.room_1 = Room.objects.get(name="Room one")
+        self.existing = Showing(
+            event=self.event,
+            start=_at(20),
+            room=self.room_2,
+            booked_by="Someone",
+        )
+        self.existing.save(force=True)
+
+    def _showing(self, start, room, **kwargs):
+        return Showing(
+            event=self.event,
+            start=start,
+            room=room,
+            booked_by="Someone",
+            **kwargs,
+        )
+
+    def test_load_bookings(self):
+        # Something that ended as the range starts isn't included:
+        self.assertEqual(load_bookings(_at(21), _at(22)), [])
+        (booking,) = load_bookings(_at(20, 59), _at(22), rooms=[self.room_2])
+        self.assertEqual(booking.showing_id, self.existing.pk)
+        self.assertEqual(booking.end, _at(21))
+        self.assertEqual(load_bookings(_at(20), _at(21), rooms=[1]), [])
+        self.assertEqual(
+            load_bookings(_at(20), _at(21), exclude=[self.existing.pk]), []
+        )
+
+    def test_new_showings(self):
+        showings = [
+            self._showing(_at(20, 30), self.room_2),
+            # These two clash with each other:
+            self._showing(_at(18), self.room_1),
+            self._showing(_at(18, 30), self.room_1),
+            # Cancelled, so doesn't count:
+            self._showing(_at(20, 30), self.room_2, cancelled=True),
+        ]
+        found = find_showing_clashes(showings)
+        self.assertEqual(
+            [[b.showing_id for b in bookings] for bookings in found],
+            [[self.existing.pk], [None], [None], []],
+        )
+
+    def test_changed_showing(self):
+        # Moving the existing showing doesn't clash with where it was:
+        self.existing.start = _at(20, 30)
+        self.assertEqual(find_showing_clashes([self.existing]), [[]])
+
+        with self.assertNumQueries(1):
+            found = find_showing_clashes(
+                [self.existing, self._showing(_at(21), self.room_2)]
+            )
+        self.assertEqual(len(found[0]), 1)
+        self.assertEqual(found[0][0].start, _at(21))
+        self.assertEqual(found[1][0].showing_id, self.existing.pk)
@@ -3,10 +3,15 @@ from datetime import timedelta, datetime
 import zoneinfo
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 
 from toolkit.diary.models import RotaEntry, Showing
+from toolkit.util.management.commands import email_vols_rota_vacancies
 
 from .common import DiaryTestsMixin
 
@@ -228,6 +233,221 @@ class EditRotaViewPost(DiaryTestsMixin, TestCase):
         self.assertEqual(response.content.decode("utf-8"), "Invalid entry id")
 
 
+class EditRotaBatchPost(DiaryTestsMixin, TestCase):
+    """Test of posting several rota entries at once"""
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(
+            self.client.login(
+                username="rota_editor", password="T3stPassword!3"
+            )
+        )
+        self.url = reverse("rota-edit-batch")
+        self.future_entry = self.e4s3.rotaentry_set.get()
+        self.past_entry = Showing.objects.get(pk=6).rotaentry_set.first()
+
+    def tearDown(self):
+        self.client.logout()
+
+    @patch("django.utils.timezone.now")
+    def test_edit_entries(self, now_patch):
+        now_patch.return_value = self._fake_now
+        entry = "\u01aeesty <McTestingt\u01d2n>"
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                self.url,
+                data={
+                    "id": [
+                        self.future_entry.pk,
+                        self.past_entry.pk,
+                        "1001",
+                    ],
+                    "value": [entry, "Spang", "Foo!"],
+                },
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            [
+                {
+                    "id": self.future_entry.pk,
+                    "ok": True,
+                    "value": "\u01aeesty &lt;McTestingt\u01d2n&gt;",
+                },
+                {
+                    "id": self.past_entry.pk,
+                    "ok": False,
+                    "error": "Can't change rota for showings in the past",
+                },
+                {"id": 1001, "ok": False, "error": "Unknown rota entry"},
+            ],
+        )
+        # One query to fetch the entries, one to update them:
+        self.assertEqual(
+            len([q for q in queries if '"RotaEntries"' in q["sql"]]), 2
+        )
+
+        self.future_entry.refresh_from_db()
+        self.assertEqual(self.future_entry.name, entry)
+        self.assertEqual(self.future_entry.updated_at, self._fake_now)
+        self.past_entry.refresh_from_db()
+        self.assertEqual(self.past_entry.name, "")
+
+    def test_invalid_requests(self):
+        for data, message in (
+            ({}, "Invalid request"),
+            ({"id": ["1", "2"], "value": ["Foo!"]}, "Invalid request"),
+            ({"id": ["spanner"], "value": ["Foo!"]}, "Invalid entry id"),
+        ):
+            response = self.client.post(self.url, data=data)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.content.decode("utf-8"), message)
+
+    def test_get_not_allowed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 405)
+
+
+class EditRotaChanges(DiaryTestsMixin, TestCase):
+    """Test of the feed of rota changes"""
+
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(
+            self.client.login(
+                username="rota_editor", password="T3stPassword!3"
+            )
+        )
+        self.url = reverse("rota-edit-changes")
+
+    def tearDown(self):
+        self.client.logout()
+
+    def _get_changes(self, since, start=None, end=None):
+        # By default, for the whole of June 2013 (e4s3 is on the 9th)
+        start = start or datetime(2013, 6, 1, tzinfo=zoneinfo.ZoneInfo("UTC"))
+        end = end or start + timedelta(days=30)
+        response = self.client.get(
+            self.url,
+            {
+                "since": since.isoformat(),
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @patch("django.utils.timezone.now")
+    def test_changes(self, now_patch):
+        # (The test data was saved with the real time)
+        page_loaded = datetime.now(zoneinfo.ZoneInfo("UTC")) + timedelta(
+            minutes=2
+        )
+        now_patch.return_value = page_loaded
+        response = self.client.get(reverse("rota-edit"))
+        # Fetches changes from a little before the page was loaded:
+        changes_since = page_loaded - timedelta(minutes=1)
+        self.assertContains(response, f'"{changes_since.isoformat()}"')
+        # Nothing has changed since the page loaded:
+        changes = self._get_changes(changes_since)
+        self.assertEqual(changes["rota_entries"], [])
+        self.assertEqual(changes["rota_notes"], [])
+        self.assertEqual(changes["until"], changes_since.isoformat())
+
+        later = page_loaded + timedelta(minutes=1)
+        now_patch.return_value = later
+        rota_entry = self.e4s3.rotaentry_set.get()
+        rota_entry.name = "Someone & Co"
+        rota_entry.save()
+        self.e4s3.rota_notes = "New notes"
+        self.e4s3.save(force=True)
+
+        changes = self._get_changes(changes_since)
+        self.assertEqual(
+            changes["rota_entries"],
+            [{"id": rota_entry.pk, "value": "Someone &amp; Co"}],
+        )
+        self.assertEqual(
+            changes["rota_notes"],
+            [{"id": self.e4s3.pk, "value": "New notes"}],
+        )
+        # The next fetch overlaps this one, so still includes the changes:
+        self.assertEqual(changes["until"], page_loaded.isoformat())
+        self.assertEqual(
+            self._get_changes(page_loaded)["rota_notes"],
+            [{"id": self.e4s3.pk, "value": "New notes"}],
+        )
+
+        self.assertEqual(
+            self._get_changes(later + timedelta(seconds=1)),
+            {
+                "until": page_loaded.isoformat(),
+                "rota_entries": [],
+                "rota_notes": [],
+            },
+        )
+
+    def test_changes_only_in_range(self):
+        since = datetime.now(zoneinfo.ZoneInfo("UTC")) - timedelta(minutes=1)
+        rota_entry = self.e4s3.rotaentry_set.get()
+        rota_entry.name = "Someone"
+        rota_entry.save()
+        self.e4s3.rota_notes = "New notes"
+        self.e4s3.save(force=True)
+
+        changes = self._get_changes(since)
+        self.assertIn(
+            rota_entry.pk, [e["id"] for e in changes["rota_entries"]]
+        )
+        self.assertIn(self.e4s3.pk, [n["id"] for n in changes["rota_notes"]])
+
+        # A range that doesn't include e4s3:
+        changes = self._get_changes(
+            since, start=datetime(2013, 4, 1, tzinfo=zoneinfo.ZoneInfo("UTC"))
+        )
+        self.assertNotIn(
+            rota_entry.pk, [e["id"] for e in changes["rota_entries"]]
+        )
+        self.assertNotIn(
+            self.e4s3.pk, [n["id"] for n in changes["rota_notes"]]
+        )
+
+    def test_page_fetches_changes_for_its_range(self):
+        response = self.client.get(reverse("rota-edit"), {"daysahead": 7})
+        changes_url = response.context["changes_url"]
+        self.assertTrue(changes_url.startswith(self.url + "?"))
+        params = QueryDict(changes_url.split("?", 1)[1])
+        self.assertEqual(
+            parse_datetime(params["start"]), response.context["start_date"]
+        )
+        self.assertEqual(
+            parse_datetime(params["end"]), response.context["end_date"]
+        )
+
+    def test_invalid_since(self):
+        valid = {
+            "since": "2013-06-01T12:00:00+00:00",
+            "start": "2013-06-01T00:00:00+00:00",
+            "end": "2013-07-01T00:00:00+00:00",
+        }
+        for data in (
+            {},
+            {"since": "yesterday"},
+            {"since": "2013-06-01"},
+            {**valid, "start": "2013-06-01"},
+            {key: value for key, value in valid.items() if key != "end"},
+        ):
+            response = self.client.get(self.url, data)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                response.content.decode("utf-8"), "Invalid timestamp"
+            )
+
+
 class EditRotaNotes(DiaryTestsMixin, TestCase):
     """Test of editing per-showing rota notes"""
 
@@ -378,3 +598,53 @@ class ViewRotaVacancies(DiaryTestsMixin, TestCase):
             " </p>",
             html=True,
         )
+
+    def _add_showings(self, count):
+        # Copy showing 6 (event three, which has vacant rota entries):
+        showing = Showing.objects.get(pk=6)
+        for n in range(count):
+            new_showing = Showing.objects.get(pk=6)
+            new_showing.pk = None
+            new_showing.start = showing.start + timedelta(hours=n + 1)
+            new_showing.save(force=True)
+            new_showing.clone_rota_from_showing(showing)
+
+    @patch("django.utils.timezone.now")
+    def test_query_count(self, now_patch):
+        now_patch.return_value = datetime(
+            2013, 4, 12, 11, 00, tzinfo=zoneinfo.ZoneInfo("Europe/London")
+        )
+        url = reverse("view-rota-vacancies")
+        # (First request fills the in-memory navigation cache)
+        self.client.get(url)
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertContains(response, "<i>needs</i>", count=1)
+
+        # Constant number of queries, however many showings:
+        self._add_showings(5)
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertContains(response, "<i>needs</i>", count=6)
+
+    @override_settings(ROTA_DAYS_AHEAD=30)
+    @patch(
+        "toolkit.util.management.commands.email_vols_rota_vacancies.render_to_string"
+    )
+    @patch("django.utils.timezone.now")
+    def test_email_command_query_count(self, now_patch, render_patch):
+        now_patch.return_value = datetime(
+            2013, 4, 12, 11, 00, tzinfo=zoneinfo.ZoneInfo("Europe/London")
+        )
+        self._add_showings(5)
+        command = email_vols_rota_vacancies.Command()
+        with self.assertNumQueries(2):
+            command._view_rota_vacancies(None)
+        context = render_patch.call_args[0][1]
+        vacancies = list(context["showings_vacant_roles"].values())
+        self.assertEqual(len(vacancies), 6)
+        for vacant_entries in vacancies:
+            self.assertEqual(
+                [str(entry) for entry in vacant_entries],
+                [f"Role 1 (standard) {rank}" for rank in range(1, 7)],
+            )
@@ -1,3 +1,5 @@
+import csv
+import io
 import re
 import json
 import os.path
@@ -5,20 +7,27 @@ import os.path
 import zoneinfo
 from datetime import datetime, date, time, timedelta
 import tempfile
+from io import StringIO
 
 from unittest.mock import patch
 
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
+import django.utils.timezone as timezone
 
 from toolkit.diary.models import (
     Showing,
     Event,
     Role,
     DiaryIdea,
+    EventTag,
     EventTemplate,
     MediaItem,
+    Room,
 )
 from toolkit.util.image import adjust_colour
 import toolkit.diary.edit_prefs
@@ -58,6 +67,7 @@ class ViewSecurity(DiaryTestsMixin, TestCase):
         "edit-ideas": {"year": "2012", "month": "1"},
         "delete-showing": {"showing_id": "1"},
         "add-event": {},
+        "add-event-series": {},
         "edit_event_templates": {},
         "edit_event_tags": {},
         "edit_roles": {},
@@ -79,6 +89,12 @@ class ViewSecurity(DiaryTestsMixin, TestCase):
         "set_edit_preferences": {},
         "edit-printed-programmes": {},
         "view_terms_report_csv": {"year": "2020", "month": "2", "day": "3"},
+        "view_event_field_csv": {
+            "field": "rota",
+            "year": "2020",
+            "month": "2",
+            "day": "3",
+        },
     }
 
     rota_edit_required = {
@@ -625,6 +641,35 @@ class AddEventView(DiaryTestsMixin, TestCase):
     def test_add_event_multiroom_enabled(self, now_patch):
         self._test_add_event_common(now_patch, True)
 
+    @override_settings(MULTIROOM_ENABLED=True)
+    @patch("django.utils.timezone.now")
+    def test_add_event_room_clash(self, now_patch):
+        now_patch.return_value = self._fake_now
+        self.e4s3.room = self.room_2
+        self.e4s3.save(force=True)
+        event_count_before = Event.objects.count()
+
+        response = self.client.post(
+            reverse("add-event"),
+            data={
+                "start": "09/06/2013 17:30",
+                "duration": "01:00:00",
+                "number_of_bookings": "1",
+                "event_name": "Clashing event",
+                "event_template": "1",
+                "booked_by": "Somebody",
+                "room": self.room_2.pk,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(event_count_before, Event.objects.count())
+        self.assertFormError(
+            response.context["form"],
+            None,
+            "Booking at 17:30 on 09/06/2013: Overlaps "
+            "'Event four titl\u0113' at 18:00 on 09/06/2013",
+        )
+
     @patch("django.utils.timezone.now")
     def test_add_event_in_past(self, now_patch):
         now_patch.return_value = self._fake_now
@@ -826,6 +871,40 @@ class EditDetailView(DiaryTestsMixin, TestCase):
         )
         self.assertEqual(self.e5.showings.count(), 1)
 
+    @override_settings(MULTIROOM_ENABLED=True)
+    @patch("django.utils.timezone.now")
+    def test_add_showing_room_clash_fails(self, now_patch) -> None:
+        now_patch.return_value = self._fake_now
+        self.e4s3.room = self.room_2
+        self.e4s3.save(force=True)
+
+        url = reverse(
+            "edit-event-details-view", kwargs={"event_id": self.e5.pk}
+        )
+        data = {
+            "form-TOTAL_FORMS": 1,
+            "form-INITIAL_FORMS": "0",
+            "form-0-id": "",
+            "form-0-start": "09/06/2013 09:00",
+            "form-0-booked_by": "wombat",
+            "form-0-room": self.room_2.pk,
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFormSetError(
+            response.context["showing_forms"],
+            0,
+            "start",
+            "Overlaps 'Event four titl\u0113' at 18:00 on 09/06/2013",
+        )
+        self.assertEqual(self.e5.showings.count(), 1)
+
+        # Fine in another room:
+        data["form-0-room"] = Room.objects.get(name="Room one").pk
+        response = self.client.post(url, data)
+        self.assertRedirects(response, url)
+        self.assertEqual(self.e5.showings.count(), 2)
+
     @patch("django.utils.timezone.now")
     def test_confirm_without_terms(self, now_patch) -> None:
         now_patch.return_value = self._fake_now
@@ -898,6 +977,134 @@ class EditDetailView(DiaryTestsMixin, TestCase):
         self.assertEqual(self.e7.all_showings_confirmed(), True)
 
 
+class AddEventSeriesView(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Log in:
+        self.client.login(username="admin", password="T3stPassword!")
+        self.url = reverse("add-event-series")
+
+    def _post(self, **extra):
+        data = {
+            "start": "04/06/2013 20:00",
+            "duration": "01:30:00",
+            "event_name": "Weekly club",
+            "event_template": "1",
+            "booked_by": "Somebody",
+            "frequency": "weekly",
+            "week_of_month": "",
+            "until": "2013-07-02",
+            "exceptions": "18/06/2013",
+            "room": "2",
+        }
+        data.update(extra)
+        return self.client.post(self.url, data=data)
+
+    @patch("django.utils.timezone.now")
+    def test_get_form(self, now_patch):
+        now_patch.return_value = self._fake_now
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "form_new_event_series.html")
+        self.assertNotContains(response, 'name="confirm"')
+        # Same type as the form field, so the widget can show it:
+        self.assertEqual(
+            response.context["form"]["duration"].value(), time(hour=1)
+        )
+        self.assertContains(response, 'name="duration" value="01:00:00"')
+
+    @patch("django.utils.timezone.now")
+    def test_preview(self, now_patch):
+        now_patch.return_value = self._fake_now
+        event_count_before = Event.objects.count()
+
+        response = self._post()
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "form_new_event_series.html")
+        # Nothing added yet:
+        self.assertEqual(event_count_before, Event.objects.count())
+
+        self.assertEqual(
+            [start.date() for start, _ in response.context["preview"]],
+            [
+                date(2013, 6, 4),
+                date(2013, 6, 11),
+                date(2013, 6, 25),
+                date(2013, 7, 2),
+            ],
+        )
+        self.assertContains(response, 'name="confirm"')
+
+    @override_settings(MULTIROOM_ENABLED=True)
+    @patch("django.utils.timezone.now")
+    def test_confirm(self, now_patch):
+        now_patch.return_value = self._fake_now
+
+        response = self._post(confirm="Add")
+        self.assert_redirect_to_index(response)
+
+        event = Event.objects.get(name="Weekly club")
+        self.assertEqual(event.duration, time(1, 30))
+        self.assertEqual(event.template_id, 1)
+        showings = list(event.showings.order_by("start"))
+        # Time specified was BST, so should be 7pm in UTC:
+        self.assertEqual(
+            [s.start for s in showings],
+            [
+                datetime(2013, 6, 4, 19, 0, tzinfo=UTC),
+                datetime(2013, 6, 11, 19, 0, tzinfo=UTC),
+                datetime(2013, 6, 25, 19, 0, tzinfo=UTC),
+                datetime(2013, 7, 2, 19, 0, tzinfo=UTC),
+            ],
+        )
+        role_1 = Role.objects.get(id=1)
+        for s in showings:
+            self.assertEqual(s.booked_by, "Somebody")
+            self.assertEqual(s.room_id, 2)
+            self.assertEqual(list(s.roles.all()), [role_1])
+
+    @override_settings(MULTIROOM_ENABLED=True)
+    @patch("django.utils.timezone.now")
+    def test_room_clash(self, now_patch):
+        now_patch.return_value = self._fake_now
+        # Existing showing in the same room, overlapping the third booking:
+        Showing.objects.filter(pk=self.e2s1.pk).update(
+            start=datetime(2013, 6, 25, 19, 15, tzinfo=UTC),
+            room=self.room_2,
+            cancelled=False,
+        )
+
+        response = self._post(confirm="Add")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Event.objects.filter(name="Weekly club").exists())
+        self.assertTrue(response.context["clashes"])
+        self.assertEqual(
+            [bool(clashes) for _, clashes in response.context["preview"]],
+            [False, False, True, False],
+        )
+        self.assertNotContains(response, 'name="confirm"')
+
+        # No clash in a different room:
+        response = self._post(confirm="Add", room="1")
+        self.assert_redirect_to_index(response)
+        self.assertEqual(
+            Event.objects.get(name="Weekly club").showings.count(), 4
+        )
+
+    @patch("django.utils.timezone.now")
+    def test_invalid_rule(self, now_patch):
+        now_patch.return_value = self._fake_now
+        response = self._post(until="2013-06-01", exceptions="31/31/2013")
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response.context["form"], "exceptions", "Invalid date '31/31/2013'"
+        )
+        response = self._post(until="2013-06-01")
+        self.assertFormError(
+            response.context["form"], None, "Series ends before it starts"
+        )
+
+
 class EditEventView(DiaryTestsMixin, TestCase):
     def setUp(self):
         super().setUp()
@@ -1761,6 +1968,18 @@ class ViewEventFieldTests(DiaryTestsMixin, TestCase):
         self.assertNotContains(response, "EVENT THREE TITLE")
         self.assertNotContains(response, "EVENT FOUR TITL\u0112")
 
+    def test_custom_start_date_copy_search(self):
+        url = reverse("view_event_field", kwargs={"field": "copy"})
+        url += "/2013/01/01?daysahead=365&search=c\u014dpy four"
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "view_copy.html")
+
+        self.assertEqual(
+            {s.event for s in response.context["showings"]}, {self.e4}
+        )
+
 
 class ViewTermsReportCsvTests(DiaryTestsMixin, TestCase):
     def setUp(self):
@@ -1768,6 +1987,10 @@ class ViewTermsReportCsvTests(DiaryTestsMixin, TestCase):
         # Log in:
         self.client.login(username="admin", password="T3stPassword!")
 
+    def _content(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8")
+
     def test_bad_dates(self):
         url = reverse(
             "view_terms_report_csv",
@@ -1792,9 +2015,7 @@ class ViewTermsReportCsvTests(DiaryTestsMixin, TestCase):
             response.headers["content-disposition"],
             'attachment; filename="terms-1990-01-15.csv"',
         )
-        self.assertEqual(
-            response.content.decode("utf-8"), "date,time,title,terms\r\n"
-        )
+        self.assertEqual(self._content(response), "date,time,title,terms\r\n")
 
     def test_showings(self):
         url = reverse(
@@ -1811,12 +2032,81 @@ class ViewTermsReportCsvTests(DiaryTestsMixin, TestCase):
         # Check that missing terms work as expected;
         self.assertIsNone(self.e1.terms)
         self.assertEqual(
-            response.content.decode("utf-8"),
+            self._content(response),
             "date,time,title,terms\r\n"
             f"2013-02-14,18:00,{self.e5.name},{self.e5.terms}\r\n"
             f"2013-02-15,18:00,{self.e1.name},\r\n",
         )
 
+    def test_search(self):
+        url = reverse(
+            "view_terms_report_csv",
+            kwargs={"year": "2013", "month": "2", "day": "14"},
+        )
+        response = self.client.get(url, {"daysahead": 2, "search": "five"})
+        self.assertEqual(
+            self._content(response),
+            "date,time,title,terms\r\n"
+            f"2013-02-14,18:00,{self.e5.name},{self.e5.terms}\r\n",
+        )
+
+    def _get_csv(self, field, year, month, day, days_ahead):
+        url = reverse(
+            "view_event_field_csv",
+            kwargs={"field": field, "year": year, "month": month, "day": day},
+        )
+        response = self.client.get(url, {"daysahead": days_ahead})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.headers["content-disposition"],
+            f'attachment; filename="{field}-{year}-{month:02}-{day:02}.csv"',
+        )
+        return list(csv.reader(io.StringIO(self._content(response))))
+
+    def test_copy(self):
+        rows = self._get_csv("copy", 2013, 2, 14, 2)
+        self.assertEqual(
+            rows,
+            [
+                ["date", "time", "title", "cancelled", "discounted"]
+                + ["private", "copy"],
+                ["2013-02-14", "18:00", self.e5.name, "no", "no", "yes"]
+                + [self.e5.copy],
+                # (Hidden in the programme, so private:)
+                ["2013-02-15", "18:00", self.e1.name, "no", "no", "yes"]
+                + [self.e1.copy],
+            ],
+        )
+
+    def test_copy_summary(self):
+        # In summer, so times are in local time (BST):
+        rows = self._get_csv("copy_summary", 2013, 6, 9, 1)
+        self.assertEqual(
+            rows,
+            [
+                ["date", "time", "pre_title", "title", "post_title"]
+                + ["cancelled", "discounted", "private"]
+                + ["pricing", "copy_summary"],
+                ["2013-06-09", "18:00", self.e4.pre_title, self.e4.name]
+                + [self.e4.post_title]
+                + ["no", "no", "no"]
+                + [self.e4.pricing, self.e4.copy_summary],
+            ],
+        )
+
+    def test_rota(self):
+        rows = self._get_csv("rota", 2013, 4, 13, 1)
+        self.assertEqual(
+            rows[0], ["date", "time", "title", "role", "rank", "name", "notes"]
+        )
+        self.assertEqual(
+            [row[3:5] for row in rows[1:]],
+            [["Role 1 (standard)", str(rank)] for rank in range(1, 7)],
+        )
+        self.assertEqual(
+            rows[1][:3], ["2013-04-13", "18:00", "Event three title"]
+        )
+
 
 class PreferencesTests(DiaryTestsMixin, TestCase):
     def setUp(self):
@@ -1947,6 +2237,142 @@ class EditTagsViewTests(DiaryTestsMixin, TestCase):
         self.assertTemplateUsed(response, "edit_event_tags.html")
 
 
+class BulkFormsetViewTests(DiaryTestsMixin, TestCase):
+    """Saving the pages that edit all the roles/tags/templates at once"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.login(username="admin", password="T3stPassword!")
+
+    def _formset_data(self, url):
+        # POST data for the formset on the page, as it was loaded:
+        formset = self.client.get(url).context["formset"]
+        data = {
+            f"form-{key}": value
+            for key, value in formset.management_form.initial.items()
+        }
+        for form in formset:
+            for name in form.fields:
+                value = form[name].value()
+                if value is True:
+                    value = "on"
+                elif value in (None, False):
+                    continue
+                data[form.add_prefix(name)] = value
+        return data
+
+    def _form_index(self, data, pk):
+        return next(
+            key.split("-")[1]
+            for key, value in data.items()
+            if key.endswith("-id") and value == pk
+        )
+
+    def test_edit_roles(self):
+        url = reverse("edit_roles")
+        data = self._formset_data(url)
+        role_2 = Role.objects.get(name="Role 2 (nonstandard)")
+        data[f"form-{self._form_index(data, role_2.pk)}-standard"] = "on"
+        extra = data["form-TOTAL_FORMS"] - 1
+        data[f"form-{extra}-name"] = "New role"
+
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Roles updated")
+        self.assertTrue(Role.objects.get(pk=role_2.pk).standard)
+        self.assertFalse(Role.objects.get(name="New role").standard)
+        self.assertEqual(Role.objects.count(), 4)
+
+    def test_edit_read_only_role(self):
+        url = reverse("edit_roles")
+        role_3 = Role.objects.get(name="Role 3")
+        Role.objects.filter(pk=role_3.pk).update(read_only=True)
+        data = self._formset_data(url)
+        data[f"form-{self._form_index(data, role_3.pk)}-name"] = "Renamed"
+
+        self.client.post(url, data)
+        self.assertEqual(Role.objects.get(pk=role_3.pk).name, "Role 3")
+
+    def test_edit_tags(self):
+        url = reverse("edit_event_tags")
+        tag_one = EventTag.objects.get(slug="tag-one")
+        tag_two = EventTag.objects.get(slug="tag-two")
+        EventTag.objects.filter(pk=tag_two.pk).update(read_only=True)
+        data = self._formset_data(url)
+        tag_one_index = self._form_index(data, tag_one.pk)
+        tag_two_index = self._form_index(data, tag_two.pk)
+        data[f"form-{tag_one_index}-name"] = "Tag Won"
+        data[f"form-{tag_two_index}-name"] = "tag too"
+        data[f"form-{tag_two_index}-sort_order"] = "7"
+
+        response = self.client.post(url, data)
+        self.assertContains(response, "Event tags updated")
+        tag_one.refresh_from_db()
+        self.assertEqual((tag_one.name, tag_one.slug), ("tag won", "tag-won"))
+        # Read only, so only the sort order can be changed:
+        tag_two.refresh_from_db()
+        self.assertEqual(
+            (tag_two.name, tag_two.slug, tag_two.sort_order),
+            ("tag two", "tag-two", 7),
+        )
+
+    def test_edit_templates(self):
+        url = reverse("edit_event_templates")
+        role_3 = Role.objects.get(name="Role 3")
+        tag_two = EventTag.objects.get(slug="tag-two")
+        data = self._formset_data(url)
+        index = self._form_index(data, self.tmpl2.pk)
+        data[f"form-{index}-roles"] = [
+            Role.objects.get(name="Role 1 (standard)").pk,
+            role_3.pk,
+        ]
+        data[f"form-{index}-pricing"] = "Free"
+        extra = data["form-TOTAL_FORMS"] - 1
+        data[f"form-{extra}-name"] = "New template"
+        data[f"form-{extra}-roles"] = [role_3.pk]
+        data[f"form-{extra}-tags"] = [tag_two.pk]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertContains(response, "Event templates updated")
+
+        self.tmpl2.refresh_from_db()
+        self.assertEqual(self.tmpl2.pricing, "Free")
+        self.assertEqual(
+            sorted(self.tmpl2.roles.values_list("name", flat=True)),
+            ["Role 1 (standard)", "Role 3"],
+        )
+        self.assertEqual(
+            sorted(self.tmpl2.tags.values_list("slug", flat=True)),
+            ["tag-one", "tag-three"],
+        )
+        new_template = EventTemplate.objects.get(name="New template")
+        self.assertEqual(list(new_template.roles.all()), [role_3])
+        self.assertEqual(list(new_template.tags.all()), [tag_two])
+
+        # Unchanged templates aren't validated or saved:
+        template_updates = [
+            q["sql"]
+            for q in queries
+            if q["sql"].startswith('UPDATE "EventTemplates"')
+        ]
+        self.assertEqual(len(template_updates), 1)
+
+    def test_query_count(self):
+        # The number of queries to show the page doesn't depend on the number
+        # of templates:
+        url = reverse("edit_event_templates")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for n in range(10):
+            EventTemplate.objects.create(name=f"Extra {n}").roles.set(
+                Role.objects.all()
+            )
+        with self.assertNumQueries(len(queries)):
+            self.client.get(url)
+
+
 class DiaryCalendarViewTests(DiaryTestsMixin, TestCase):
     def setUp(self):
         super().setUp()
@@ -2174,3 +2600,130 @@ class DiaryDataViewTests(DiaryTestsMixin, TestCase):
     @patch("django.utils.timezone.now")
     def test_valid_query_multiroom_enabled(self, now_patch):
         self._common_test_valid_query(now_patch, True)
+
+    @override_settings(MULTIROOM_ENABLED=True)
+    @patch("django.utils.timezone.now")
+    def test_room_clash(self, now_patch):
+        now_patch.return_value = self._fake_now
+        self.e4s3.room = self.room_2
+        self.e4s3.save(force=True)
+        # 18:30-19:30 (BST), so overlapping showing 7 (18:00-19:00), in the
+        # same room and in another room:
+        new_showings = [
+            Showing(
+                event=self.e4,
+                start=datetime(2013, 6, 9, 17, 30, tzinfo=UTC),
+                room=room,
+                booked_by="Someone",
+            )
+            for room in (self.room_2, Room.objects.get(name="Room one"))
+        ]
+        for showing in new_showings:
+            showing.save(force=True)
+
+        data = self._get_data()
+        self.assertEqual(data[7]["className"], ["s_clash", "s_confirmed"])
+        self.assertIn("s_clash", data[new_showings[0].pk]["className"])
+        self.assertNotIn("s_clash", data[new_showings[1].pk]["className"])
+
+        # Cancelling one means they don't clash:
+        new_showings[0].cancelled = True
+        new_showings[0].save(force=True)
+        self.assertEqual(self._get_data()[7]["className"], ["s_confirmed"])
+
+    @patch("django.utils.timezone.now")
+    def test_end_over_clock_change(self, now_patch):
+        now_patch.return_value = self._fake_now
+        event = Event(name="Late one", duration=time(3, 0))
+        event.save()
+        # 23:00 BST, so three hours later is 01:00 GMT (not 02:00):
+        showing = Showing(
+            event=event,
+            start=datetime(2013, 10, 26, 22, 0, tzinfo=UTC),
+            booked_by="someone",
+        )
+        showing.save()
+
+        response = self.client.get(
+            reverse("edit-diary-data"),
+            data={"start": "2013-10-01", "end": "2013-11-01"},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = {i["id"]: i for i in response.json()}
+        self.assertEqual(
+            data[showing.pk]["start"], "2013-10-26T23:00:00+01:00"
+        )
+        self.assertEqual(data[showing.pk]["end"], "2013-10-27T01:00:00+00:00")
+        self.assertEqual(
+            data[showing.pk]["end"],
+            timezone.localtime(showing.end_time).isoformat(),
+        )
+
+    def _get_data(self):
+        response = self.client.get(
+            reverse("edit-diary-data"),
+            data={"start": "2013-06-01", "end": "2013-07-01"},
+        )
+        self.assertEqual(response.status_code, 200)
+        return {i["id"]: i for i in response.json()}
+
+    def _showing_queries(self, queries):
+        return [q for q in queries if '"Showings"' in q["sql"]]
+
+    @patch("django.utils.timezone.now")
+    def test_cached(self, now_patch):
+        cache.clear()
+        now_patch.return_value = self._fake_now
+        self.assertEqual(self._get_data()[7]["className"], ["s_confirmed"])
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self._get_data()
+        self.assertEqual(self._showing_queries(queries), [])
+        self.assertEqual(data[7]["className"], ["s_confirmed"])
+
+        # Once the showing has started it's in the past, so the cached data
+        # can't be used:
+        now_patch.return_value = datetime(
+            2013, 6, 9, 18, 1, tzinfo=zoneinfo.ZoneInfo("Europe/London")
+        )
+        with CaptureQueriesContext(connection) as queries:
+            data = self._get_data()
+        self.assertNotEqual(self._showing_queries(queries), [])
+        self.assertEqual(data[7]["className"], ["s_historic", "s_confirmed"])
+        self.assertEqual(
+            data[7]["url"],
+            reverse("edit-event-details-view", kwargs={"event_id": 4}),
+        )
+
+    @override_settings(MULTIROOM_ENABLED=True)
+    @patch("django.utils.timezone.now")
+    def test_cache_invalidated(self, now_patch):
+        cache.clear()
+        now_patch.return_value = self._fake_now
+        showing = Showing.objects.get(id=7)
+        showing.room = self.room_2
+        showing.save(force=True)
+        self.assertEqual(self._get_data()[7]["color"], "#00abcd")
+
+        self.room_2.colour = "#123456"
+        self.room_2.save()
+        self.assertEqual(self._get_data()[7]["color"], "#123456")
+
+        event = showing.event
+        event.name = "New name"
+        event.save()
+        self.assertEqual(self._get_data()[7]["title"], "New name")
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command(
+            "benchmark_diary_data",
+            "--rooms=2",
+            "--showings-per-day=1",
+            "--requests=2",
+            stdout=out,
+        )
+        self.assertIn("62 showings in 2 rooms", out.getvalue())
+        self.assertIn("Cached: median", out.getvalue())
+        # Nothing left behind:
+        self.assertFalse(Room.objects.filter(name__startswith="Benchmark"))
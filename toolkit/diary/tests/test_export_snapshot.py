@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.text import slugify
+
+from .common import DiaryTestsMixin
+
+
+class ExportSnapshotTests(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def _export(self, *args):
+        out = StringIO()
+        call_command(
+            "export_programme_snapshot",
+            self.output_dir,
+            "--workers=1",
+            "--host=testserver",
+            "--verbosity=2",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def _path(self, *parts):
+        return os.path.join(self.output_dir, *parts)
+
+    def _event_page(self, event):
+        url = reverse("single-event-view", kwargs={"event_id": event.pk})
+        return self._path(url.strip("/"), "index.html")
+
+    def test_full_export(self):
+        output = self._export()
+
+        with open(self._path("programme", "index.html")) as page:
+            self.assertIn("<html", page.read())
+        with open(self._path("programme", "rss", "index.xml")) as feed:
+            self.assertIn("<rss", feed.read())
+        for path in (
+            ("programme", "view", "this_week", "index.html"),
+            ("programme", "view", "tag-one", "index.html"),
+            ("programme", "archive", "index.html"),
+            ("programme", "archive", "2013", "index.html"),
+            ("programme", "archive", "2013", "4", "index.html"),
+        ):
+            self.assertTrue(os.path.isfile(self._path(*path)), path)
+
+        # Public event:
+        with open(self._event_page(self.e4)) as page:
+            self.assertIn("Event four titlē", page.read())
+        self.assertTrue(
+            os.path.isfile(
+                self._path(
+                    "programme",
+                    "event",
+                    slugify(self.e4.name),
+                    str(self.e4.pk),
+                    "index.html",
+                )
+            )
+        )
+        # Private event:
+        self.assertFalse(os.path.exists(self._event_page(self.e5)))
+        self.assertNotIn("failed", output)
+
+        with open(self._path(".snapshot-state.json")) as state_file:
+            self.assertIn("last_run", json.load(state_file))
+
+    def test_incremental_export(self):
+        self._export()
+        e2_page = self._event_page(self.e2)
+        e4_page = self._event_page(self.e4)
+        e2_url = reverse("single-event-view", kwargs={"event_id": self.e2.pk})
+        e4_url = reverse("single-event-view", kwargs={"event_id": self.e4.pk})
+
+        # Nothing changed: only listings are rendered
+        output = self._export()
+        self.assertIn("/programme/: written", output)
+        self.assertNotIn(e4_url, output)
+        self.assertNotIn("/programme/event/", output)
+        self.assertNotIn("/programme/archive/2013/", output)
+
+        self.e4.name = "Updated event four"
+        self.e4.save()
+        self.e2.private = True
+        self.e2.save()
+
+        output = self._export()
+        self.assertIn(f"{e4_url}: written", output)
+        self.assertIn("/programme/archive/2013/6/: written", output)
+        with open(e4_page) as page:
+            self.assertIn("Updated event four", page.read())
+        # Now private, so removed:
+        self.assertIn(f"{e2_url}: removed", output)
+        self.assertFalse(os.path.exists(e2_page))
+
+    def test_invalid_state(self):
+        with open(self._path(".snapshot-state.json"), "w") as state_file:
+            state_file.write("{}")
+        with self.assertRaises(CommandError):
+            self._export()
+        # ...unless doing a full export anyway:
+        self._export("--full")
@@ -4,9 +4,12 @@ import xml.etree.ElementTree as ElementTree
 
 from unittest.mock import patch
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
+from toolkit.diary.models import Event
+
 from .common import DiaryTestsMixin
 
 
@@ -25,6 +28,32 @@ class FeedTests(DiaryTestsMixin, TestCase):
         # Will raise an exception if it can't parse XML:
         ElementTree.fromstring(response.content)
 
+    @patch("django.utils.timezone.now")
+    def test_feed_conditional_get(self, now_patch):
+        now_patch.return_value = datetime.datetime(
+            2013, 6, 4, 11, 00, tzinfo=datetime.timezone.utc
+        )
+        url = reverse("view-diary-rss")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(
+            url,
+            headers={"if-modified-since": response.headers["Last-Modified"]},
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Event in the feed changes:
+        self.e4.name = "New name"
+        self.e4.save()
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "New name")
+
     def _get_etree(self):
         url = reverse("view-diary-rss")
         response = self.client.get(url)
@@ -80,3 +109,106 @@ class FeedTests(DiaryTestsMixin, TestCase):
         tree = self._get_etree()
         items = tree.find("channel").findall("item")
         self.assertEqual(len(items), 0)
+
+
+@patch("django.utils.timezone.now")
+class ICalFeedTests(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _get_events(self, now_patch, url=None):
+        now_patch.return_value = datetime.datetime(
+            2013, 4, 1, 11, 00, tzinfo=datetime.timezone.utc
+        )
+        response = self.client.get(url or reverse("view-diary-ical"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "text/calendar; charset=utf-8"
+        )
+        content = b"".join(response)
+        for line in content.split(b"\r\n"):
+            self.assertLessEqual(len(line), 75)
+        # Unfold, and split into events:
+        lines = content.decode("utf-8").replace("\r\n ", "").split("\r\n")
+        self.assertEqual(lines[0], "BEGIN:VCALENDAR")
+        self.assertEqual(lines[-2:], ["END:VCALENDAR", ""])
+        events = []
+        for line in lines:
+            if line == "BEGIN:VEVENT":
+                events.append({})
+            elif events and line != "END:VEVENT":
+                name, _, value = line.partition(":")
+                events[-1][name] = value
+        return events
+
+    def test_feed_contents(self, now_patch):
+        events = self._get_events(now_patch)
+        self.assertEqual(
+            [event["SUMMARY"] for event in events],
+            [
+                "Event two title",
+                "Event two title (CANCELLED)",
+                "PRETITLE THREE Event three title POSTTITLE THREE",
+                "Pretitle four Event four titlē Posttitle four",
+            ],
+        )
+        self.assertEqual(
+            events[0]["UID"], f"showing-{self.e2s2.pk}@testserver"
+        )
+        self.assertEqual(events[0]["DTSTART"], "20130402T180000Z")
+        self.assertEqual(events[0]["DTEND"], "20130402T193000Z")
+        self.assertEqual(events[0]["STATUS"], "CONFIRMED")
+        self.assertEqual(events[1]["STATUS"], "CANCELLED")
+        # Newlines (and commas, etc.) are escaped:
+        self.assertEqual(events[0]["DESCRIPTION"], "Event two\\n copy summary")
+        self.assertEqual(
+            events[3]["URL"],
+            "http://testserver"
+            + reverse("single-event-view", kwargs={"event_id": self.e4.pk}),
+        )
+
+    def test_feed_by_tag(self, now_patch):
+        events = self._get_events(
+            now_patch,
+            reverse("type-view-ical", kwargs={"event_type": "tag-two"}),
+        )
+        self.assertEqual(
+            [event["SUMMARY"] for event in events],
+            [
+                "PRETITLE THREE Event three title POSTTITLE THREE",
+                "Pretitle four Event four titlē Posttitle four",
+            ],
+        )
+
+    def test_long_lines_folded(self, now_patch):
+        Event.objects.filter(pk=self.e4.pk).update(copy_summary="ā, " * 100)
+        events = self._get_events(now_patch)
+        self.assertEqual(events[3]["DESCRIPTION"], "ā\\, " * 100)
+
+    def test_cached(self, now_patch):
+        self._get_events(now_patch)
+        with self.assertNumQueries(0):
+            events = self._get_events(now_patch)
+        self.assertEqual(len(events), 4)
+
+        # Cache is invalidated when an event changes:
+        self.e4.name = "New name"
+        self.e4.save()
+        events = self._get_events(now_patch)
+        self.assertEqual(
+            events[3]["SUMMARY"], "Pretitle four New name Posttitle four"
+        )
+
+    def test_conditional_get(self, now_patch):
+        now_patch.return_value = datetime.datetime(
+            2013, 4, 1, 11, 00, tzinfo=datetime.timezone.utc
+        )
+        url = reverse("view-diary-ical")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        b"".join(response)
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
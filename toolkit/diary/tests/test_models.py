@@ -1,6 +1,9 @@
 import zoneinfo
 from datetime import datetime, date, timedelta
+from io import StringIO
+from unittest.mock import patch
 
+from django.core.management import call_command
 from django.test import TestCase
 
 import django.db
@@ -10,8 +13,10 @@ from toolkit.diary.models import (
     Event,
     PrintedProgramme,
     EventTag,
+    MediaItem,
     Role,
 )
+from toolkit.diary.search import search_events
 
 from .common import DiaryTestsMixin, NowPatchMixin
 
@@ -87,6 +92,67 @@ class ShowingModelMethods(DiaryTestsMixin, NowPatchMixin, TestCase):
         self.assertFalse(s.in_past())
 
 
+class ShowingRotaMethods(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.r1, self.r2, self.r3 = Role.objects.filter(
+            name__in=["Role 1 (standard)", "Role 2 (nonstandard)", "Role 3"]
+        ).order_by("name")
+        # Event three, with six of role 1:
+        self.showing = Showing.objects.get(pk=6)
+
+    def _rota(self, showing):
+        return sorted(showing.rotaentry_set.values_list("role__name", "rank"))
+
+    def test_reset_rota_to_default(self):
+        self.showing.event.template = self.tmpl2
+        self.showing.event.save()
+        self.showing.reset_rota_to_default()
+        self.assertEqual(
+            self._rota(self.showing),
+            [("Role 1 (standard)", 1), ("Role 2 (nonstandard)", 1)],
+        )
+
+    def test_reset_rota_to_default_no_template(self):
+        self.showing.reset_rota_to_default()
+        self.assertEqual(self._rota(self.showing), [])
+
+    def test_clone_rota_from_showing(self):
+        self.e2s1.clone_rota_from_showing(self.showing)
+        self.assertEqual(
+            self._rota(self.e2s1),
+            [("Role 1 (standard)", rank) for rank in range(1, 7)]
+            + [("Role 2 (nonstandard)", 1), ("Role 3", 1)],
+        )
+
+    def test_update_rota(self):
+        self.showing.update_rota({self.r1.pk: 2, self.r2.pk: 3})
+        self.assertEqual(
+            self._rota(self.showing),
+            [
+                ("Role 1 (standard)", 1),
+                ("Role 1 (standard)", 2),
+                ("Role 2 (nonstandard)", 1),
+                ("Role 2 (nonstandard)", 2),
+                ("Role 2 (nonstandard)", 3),
+            ],
+        )
+        # Adding more ranks after the existing ones, role 2 unchanged:
+        self.showing.update_rota({self.r1.pk: 4, self.r3.pk: 0})
+        self.assertEqual(
+            self._rota(self.showing),
+            [("Role 1 (standard)", rank) for rank in range(1, 5)]
+            + [("Role 2 (nonstandard)", rank) for rank in range(1, 4)],
+        )
+
+    def test_update_rota_query_count(self):
+        # One query to get the existing rota, one to delete, one to insert,
+        # plus the transaction savepoint/release, however many entries change:
+        with self.assertNumQueries(5):
+            self.showing.update_rota({self.r1.pk: 1, self.r2.pk: 10})
+        self.assertEqual(len(self._rota(self.showing)), 11)
+
+
 class ShowingModelCustomQueryset(DiaryTestsMixin, TestCase):
     def test_manager_public(self):
         records = list(Showing.objects.public())
@@ -207,6 +273,130 @@ class EventModelLegacyCopy(TestCase):
             " and <this> \"'<troublemaker>'\""
         )
         self.assertEqual(self.event.copy_html, expected)
+        self.assertEqual(self.event.legacy_copy_html, expected)
+
+    def test_html_stored(self):
+        reloaded = Event.objects.get(id=self.event.pk)
+        # Shouldn't need converting again:
+        with patch.object(Event, "legacy_copy_to_html") as convert:
+            self.assertEqual(reloaded.copy_html, self.event.legacy_copy_html)
+        convert.assert_not_called()
+
+    def test_html_updated_on_save(self):
+        self.event.copy = "New\ncopy www.example.com"
+        self.event.save(update_fields=["copy"])
+        reloaded = Event.objects.get(id=self.event.pk)
+        self.assertEqual(
+            reloaded.legacy_copy_html,
+            'New <br>\ncopy <a href="http://www.example.com">'
+            "www.example.com</a>",
+        )
+
+        self.event.legacy_copy = False
+        self.event.save()
+        reloaded = Event.objects.get(id=self.event.pk)
+        self.assertIsNone(reloaded.legacy_copy_html)
+        self.assertEqual(reloaded.copy_html, "New\ncopy www.example.com")
+
+    def test_backfill_command(self):
+        Event(name="Not legacy", copy="Foo\nbar").save()
+        for n in range(4):
+            Event(name=f"Legacy {n}", legacy_copy=True, copy="a\nb").save()
+        Event.objects.update(legacy_copy_html=None)
+
+        # Falls back to converting on the fly:
+        reloaded = Event.objects.get(id=self.event.pk)
+        self.assertEqual(reloaded.copy_html, self.event.legacy_copy_html)
+
+        out = StringIO()
+        call_command("backfill_legacy_copy_html", batch_size=2, stdout=out)
+        self.assertIn("Generated HTML for 5 legacy events", out.getvalue())
+
+        reloaded = Event.objects.get(id=self.event.pk)
+        self.assertEqual(
+            reloaded.legacy_copy_html, self.event.legacy_copy_html
+        )
+        self.assertEqual(
+            set(
+                Event.objects.filter(name__startswith="Legacy ").values_list(
+                    "legacy_copy_html", flat=True
+                )
+            ),
+            {"a <br>\nb"},
+        )
+        self.assertIsNone(
+            Event.objects.get(name="Not legacy").legacy_copy_html
+        )
+        # The events are still in the search index:
+        self.assertEqual(
+            search_events(Event.objects.all(), "legacy", event_path="")
+            .filter(legacy_copy=True)
+            .count(),
+            4,
+        )
+
+
+class EventMainMediaItem(TestCase):
+    def setUp(self):
+        self.event = Event(name="Test event")
+        self.event.save()
+        self.other_event = Event(name="Test event without media")
+        self.other_event.save()
+        self.item_1 = MediaItem(credit="first")
+        self.item_1.save()
+        self.item_2 = MediaItem(credit="second")
+        self.item_2.save()
+        self.event.media.set([self.item_2, self.item_1])
+
+    def test_no_media(self):
+        event = Event.objects.get(pk=self.other_event.pk)
+        with self.assertNumQueries(1):
+            self.assertIsNone(event.get_main_mediaitem())
+            self.assertIsNone(event.main_mediaitem)
+
+    def test_single_query(self):
+        event = Event.objects.get(pk=self.event.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(event.get_main_mediaitem(), self.item_1)
+            self.assertEqual(event.main_mediaitem, self.item_1)
+
+    def test_uses_prefetch_related(self):
+        event = Event.objects.prefetch_related("media").get(pk=self.event.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(event.main_mediaitem, self.item_1)
+
+    def test_with_main_mediaitem(self):
+        with self.assertNumQueries(2):
+            events = list(Event.objects.with_main_mediaitem().order_by("pk"))
+        with self.assertNumQueries(0):
+            self.assertEqual(events[0].main_mediaitem, self.item_1)
+            self.assertIsNone(events[1].main_mediaitem)
+
+    def test_showings_with_main_mediaitem(self):
+        start = datetime(2013, 6, 2, 18, 0, tzinfo=UTC)
+        for event in (self.event, self.other_event):
+            Showing(event=event, start=start).save(force=True)
+        with self.assertNumQueries(2):
+            showings = list(
+                Showing.objects.select_related("event")
+                .with_main_mediaitem()
+                .order_by("event_id")
+            )
+        with self.assertNumQueries(0):
+            self.assertEqual(showings[0].event.main_mediaitem, self.item_1)
+            self.assertIsNone(showings[1].event.main_mediaitem)
+
+    def test_set_and_clear(self):
+        event = Event.objects.get(pk=self.event.pk)
+        event.clear_main_mediaitem()
+        self.assertEqual(event.main_mediaitem, self.item_2)
+        item_3 = MediaItem(credit="third")
+        item_3.save()
+        event.set_main_mediaitem(item_3)
+        self.assertEqual(event.main_mediaitem, item_3)
+        self.assertEqual(list(event.media.all()), [item_3])
+        event.clear_main_mediaitem()
+        self.assertIsNone(event.main_mediaitem)
 
 
 class PrintedProgrammeModelTests(TestCase):
@@ -1,12 +1,23 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import os
+import tempfile
+import time
 import zoneinfo
 
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.core.cache import cache, caches
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse, resolve
 import django.http
 
+from wagtail.models import Site
+
+from toolkit.content.context_processors import site_menu
+from toolkit.content.models import SectionLink, SectionRootWithLinks
+from toolkit.diary.context_processors import promoted_tags
+from toolkit.diary.models import Event, EventTag, PrintedProgramme, Showing
+import toolkit.util.cache as toolkit_cache
 from .common import DiaryTestsMixin
 
 uktz = zoneinfo.ZoneInfo("Europe/London")
@@ -325,6 +336,425 @@ class PublicDiaryViews(DiaryTestsMixin, TestCase):
     # TODO: Cancelled/confirmed/visible/cheap
 
 
+class NavigationMenuTests(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.request = RequestFactory().get("/")
+
+    def test_promoted_tags_cached(self):
+        tags = promoted_tags(self.request)["promoted_tags"]
+        self.assertEqual([tag.slug for tag in tags], ["tag-three", "tag-two"])
+        with self.assertNumQueries(0):
+            promoted_tags(self.request)
+
+        tag = EventTag.objects.get(slug="tag-one")
+        tag.promoted = True
+        tag.save()
+        tags = promoted_tags(self.request)["promoted_tags"]
+        self.assertEqual(
+            [tag.slug for tag in tags], ["tag-one", "tag-three", "tag-two"]
+        )
+
+    def test_site_menu_cached(self):
+        root_page = Site.objects.get(is_default_site=True).root_page
+        section = root_page.add_child(
+            instance=SectionRootWithLinks(
+                title="Other things",
+                slug="other-things",
+                show_in_menus=True,
+                links=[SectionLink(text="Elsewhere", link="/elsewhere/")],
+            )
+        )
+        menu = site_menu(self.request)["site_menu"]
+        self.assertEqual(
+            menu,
+            [
+                {
+                    "title": "Other things",
+                    "url": None,
+                    "children": [{"title": "Elsewhere", "url": "/elsewhere/"}],
+                }
+            ],
+        )
+        with self.assertNumQueries(0):
+            site_menu(self.request)
+
+        # Publishing a change to a page invalidates the menu:
+        section.title = "New title"
+        section.save_revision().publish()
+        menu = site_menu(self.request)["site_menu"]
+        self.assertEqual(menu[0]["title"], "New title")
+
+        response = self.client.get(reverse("default-view"))
+        self.assertContains(
+            response, '<a href="/elsewhere/">Elsewhere</a>', html=True
+        )
+
+
+@override_settings(PROGRAMME_EVENTS_PER_PAGE=2)
+class ListingPaginationTests(DiaryTestsMixin, TestCase):
+    # Public events in 2013 are e2 (first showing in April), e3 (April) and
+    # e4 (June)
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse("year-view", kwargs={"year": "2013"})
+        self.e3 = Event.objects.get(name="Event three title")
+
+    def test_first_page(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context["events"].keys()), [self.e2, self.e3]
+        )
+        self.assertContains(response, "Event two title")
+        self.assertContains(response, "Event three title")
+        self.assertNotContains(response, "Event four")
+        self.assertContains(
+            response,
+            '<a href="/programme/view/2013?page=2"'
+            ' data-fragment-url="/programme/view/2013?page=2&amp;fragment=1">'
+            "Later events</a>",
+            html=True,
+        )
+
+    def test_second_page(self):
+        response = self.client.get(self.url, {"page": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["events"].keys()), [self.e4])
+        self.assertNotContains(response, "Event two title")
+        self.assertContains(response, '<p class="month">JUNE')
+        self.assertNotContains(response, "Later events")
+
+    def test_list_split_between_pages(self):
+        # Another showing for e3, on the same day as (but before) the first
+        # showing of e4, so in the list on the first page:
+        Showing(
+            start=datetime(2013, 6, 9, 12, 0, tzinfo=uktz),
+            event=self.e3,
+            booked_by="User",
+            confirmed=True,
+        ).save(force=True)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [entry[0].start.day for entry in response.context["list_entries"]],
+            [2, 3, 13, 9],
+        )
+        self.assertContains(response, '<p class="month">JUNE')
+
+        # ...so the first entry on the second page shouldn't have a heading:
+        response = self.client.get(self.url, {"page": 2})
+        entries = list(response.context["list_entries"])
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0][0], self.e4s3)
+        self.assertEqual(entries[0][1:], (False, False, False))
+
+    def test_daysahead_kept(self):
+        url = reverse(
+            "day-view", kwargs={"year": "2013", "month": "4", "day": "1"}
+        )
+        response = self.client.get(url, {"daysahead": 365})
+        self.assertEqual(
+            response.context["next_page_url"],
+            "/programme/view/2013/4/1?daysahead=365&page=2",
+        )
+
+    def test_other_parameters_not_in_links(self):
+        # The page is cached, so anything in the links that isn't in the
+        # cache key would be served to everyone else:
+        response = self.client.get(self.url, {"utm_source": "x", "foo": "y"})
+        self.assertEqual(
+            response.context["next_page_url"], "/programme/view/2013?page=2"
+        )
+        url = reverse(
+            "day-view", kwargs={"year": "2013", "month": "4", "day": "1"}
+        )
+        response = self.client.get(url, {"daysahead": "0365", "foo": "y"})
+        self.assertEqual(
+            response.context["next_page_url"],
+            "/programme/view/2013/4/1?daysahead=365&page=2",
+        )
+        response = self.client.get(url, {"daysahead": "365"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "foo=")
+
+    def test_fragment(self):
+        response = self.client.get(self.url, {"page": 1, "fragment": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "application/json; charset=utf-8"
+        )
+        data = response.json()
+        self.assertIn('id="event_{}"'.format(self.e2.pk), data["events"])
+        self.assertIn('id="event_{}"'.format(self.e3.pk), data["events"])
+        self.assertIn("Event two title", data["list"])
+        self.assertEqual(
+            data["next"], "/programme/view/2013?page=2&fragment=1"
+        )
+
+        # Cached copy should keep the content type:
+        response = self.client.get(self.url, {"page": 2, "fragment": 1})
+        response = self.client.get(self.url, {"page": 2, "fragment": 1})
+        self.assertEqual(
+            response["Content-Type"], "application/json; charset=utf-8"
+        )
+        data = response.json()
+        self.assertIn("Event four titl\u0113", data["events"])
+        self.assertIsNone(data["next"])
+
+    def test_invalid_page(self):
+        for page in ("3", "0", "-1", "foo"):
+            response = self.client.get(self.url, {"page": page})
+            self.assertEqual(response.status_code, 404)
+
+    def test_empty_range_has_one_page(self):
+        url = reverse("year-view", kwargs={"year": "2093"})
+        response = self.client.get(url, {"page": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context["next_page_url"])
+
+
+class ListingCacheTests(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse("year-view", kwargs={"year": "2013"})
+
+    def test_second_request_is_cached(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "Event three title")
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get(self.url)
+        self.assertEqual(cached_response.status_code, 200)
+        self.assertEqual(response.content, cached_response.content)
+
+    def test_different_tags_cached_separately(self):
+        self.client.get(self.url)
+        response = self.client.get(
+            reverse("type-view", kwargs={"event_type": "tag-one"})
+        )
+        self.assertTemplateUsed(response, "view_showing_index.html")
+
+    def test_event_change_invalidates(self):
+        self.client.get(self.url)
+
+        event = Event.objects.get(name="Event three title")
+        event.name = "Event three new title"
+        event.save()
+
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, "view_showing_index.html")
+        self.assertContains(response, "Event three new title")
+        self.assertNotContains(response, "Event three title")
+
+    def test_showing_change_invalidates(self):
+        self.client.get(self.url)
+
+        self.e2s2.cancelled = True
+        self.e2s2.save(force=True)
+
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, "view_showing_index.html")
+
+    def test_tag_change_invalidates(self):
+        self.client.get(self.url)
+
+        tag = EventTag.objects.get(slug="tag-one")
+        Event.objects.get(name="Event three title").tags.add(tag)
+
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, "view_showing_index.html")
+        self.assertContains(response, "tag_tag one")
+
+    def test_printed_programme_change_invalidates(self):
+        self.client.get(self.url)
+
+        PrintedProgramme(
+            month=date(2013, 4, 1), programme="printedprogramme/x.pdf"
+        ).save()
+
+        response = self.client.get(self.url)
+        self.assertTemplateUsed(response, "view_showing_index.html")
+        self.assertContains(response, "Printed programme for Apr 2013")
+
+    def test_generation_doesnt_expire(self):
+        # File based caches (as used in production) give incr()ed keys the
+        # default timeout, which would throw everything away every 5 minutes
+        with tempfile.TemporaryDirectory() as cache_dir:
+            file_caches = {
+                alias: {
+                    "BACKEND": (
+                        "django.core.cache.backends.filebased.FileBasedCache"
+                    ),
+                    "LOCATION": os.path.join(cache_dir, alias),
+                }
+                for alias in ("default", toolkit_cache.GENERATION_CACHE)
+            }
+            with override_settings(CACHES=file_caches):
+                toolkit_cache.invalidate(toolkit_cache.PROGRAMME)
+                toolkit_cache.invalidate(toolkit_cache.PROGRAMME)
+                generation = toolkit_cache.get_generation(
+                    toolkit_cache.PROGRAMME
+                )
+                # (FileBasedCache checks expiry with time.time())
+                with patch("time.time", return_value=time.time() + 3600):
+                    self.assertEqual(
+                        toolkit_cache.get_generation(toolkit_cache.PROGRAMME),
+                        generation,
+                    )
+
+
+class ConditionalGetTests(DiaryTestsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _assert_not_modified_after_first_get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        response = self.client.get(
+            url, headers={"if-modified-since": last_modified}
+        )
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_programme_not_modified(self):
+        url = reverse("year-view", kwargs={"year": "2013"})
+        etag = self._assert_not_modified_after_first_get(url)
+
+        # Not in the listing cache, but with matching etag, shouldn't render
+        # the template:
+        with patch("toolkit.diary.public_views.cache") as cache_mock:
+            cache_mock.get.return_value = None
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertTemplateNotUsed(response, "view_showing_index.html")
+        cache_mock.set.assert_not_called()
+
+    def test_programme_modified(self):
+        url = reverse("year-view", kwargs={"year": "2013"})
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+
+        event = Event.objects.get(name="Event three title")
+        event.name = "Event three new title"
+        event.save()
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertContains(response, "Event three new title")
+
+    def test_programme_tag_change_modifies(self):
+        # Tag changes don't update any updated_at columns:
+        url = reverse("year-view", kwargs={"year": "2013"})
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+
+        tag = EventTag.objects.get(slug="tag-one")
+        Event.objects.get(name="Event three title").tags.add(tag)
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    @patch("django.utils.timezone.now")
+    def test_programme_showing_deleted_modified_since(self, now_patch):
+        now_patch.return_value = datetime(2013, 4, 1, 11, 00, tzinfo=uktz)
+        # Deleting a showing doesn't leave anything with a newer updated_at,
+        # but clients that only send If-Modified-Since should still see it:
+        url = reverse("year-view", kwargs={"year": "2013"})
+        response = self.client.get(url)
+        last_modified = response.headers["Last-Modified"]
+
+        showing = (
+            Showing.objects.public()
+            .filter(start__year=2013, start__gt=now_patch.return_value)
+            .first()
+        )
+        # (Make sure this isn't in the same second as the first request)
+        with patch("time.time_ns", return_value=time.time_ns() + 10**10):
+            showing.delete()
+
+        response = self.client.get(
+            url, headers={"if-modified-since": last_modified}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["Last-Modified"], last_modified)
+
+    @patch("django.utils.timezone.now")
+    def test_this_week_not_modified(self, now_patch):
+        now_patch.return_value = datetime(2013, 4, 1, 11, 00, tzinfo=uktz)
+        self._assert_not_modified_after_first_get(reverse("view-this-week"))
+
+    def test_event_not_modified(self):
+        url = reverse("single-event-view", kwargs={"event_id": "2"})
+        etag = self._assert_not_modified_after_first_get(url)
+
+        self.e2.copy = "Changed copy"
+        self.e2.save()
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Changed copy")
+
+    @patch("django.utils.timezone.now")
+    def test_event_modified_since_showing_started(self, now_patch):
+        # Nothing's been changed since well before the showings:
+        long_ago = datetime(2013, 3, 1, 12, 00, tzinfo=uktz)
+        Showing.objects.update(updated_at=long_ago)
+        Event.objects.update(updated_at=long_ago)
+        caches[toolkit_cache.GENERATION_CACHE].clear()
+        with patch(
+            "time.time_ns", return_value=int(long_ago.timestamp() * 1e9)
+        ):
+            toolkit_cache.get_generation(toolkit_cache.PROGRAMME)
+
+        url = reverse("single-event-view", kwargs={"event_id": "2"})
+        now_patch.return_value = datetime(2013, 4, 2, 12, 00, tzinfo=uktz)
+        response = self.client.get(url)
+        last_modified = response.headers["Last-Modified"]
+
+        # The next showing starts, so the page is different:
+        now_patch.return_value = datetime(2013, 4, 2, 20, 00, tzinfo=uktz)
+        response = self.client.get(
+            url, headers={"if-modified-since": last_modified}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_private_event_still_404(self):
+        url = reverse("single-event-view", kwargs={"event_id": "5"})
+        response = self.client.get(url, headers={"if-none-match": "*"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_archive_year_not_modified(self):
+        self._assert_not_modified_after_first_get(
+            reverse("archive-view-year", kwargs={"year": "2013"})
+        )
+
+    def test_archive_month_not_modified(self):
+        url = reverse(
+            "archive-view-month", kwargs={"year": "2013", "month": "4"}
+        )
+        self._assert_not_modified_after_first_get(url)
+
+    def test_archive_invalid_month(self):
+        url = reverse(
+            "archive-view-month", kwargs={"year": "2013", "month": "13"}
+        )
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
+
 class UrlTests(DiaryTestsMixin, TestCase):
     """Test the regular expressions in urls.py"""
 
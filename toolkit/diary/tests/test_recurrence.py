@@ -0,0 +1,132 @@
+from datetime import date, datetime
+
+from django.test import TestCase
+
+from toolkit.diary.recurrence import (
+    FORTNIGHTLY,
+    MONTHLY,
+    RecurrenceError,
+    RecurrenceRule,
+    WEEKLY,
+)
+
+from .common import UKTZ
+
+
+class RecurrenceRuleTests(TestCase):
+    def _dates(self, rule):
+        return [start.date() for start in rule.occurrences()]
+
+    def test_weekly(self):
+        rule = RecurrenceRule(
+            WEEKLY, datetime(2025, 3, 5, 19, 30, tzinfo=UKTZ), date(2025, 4, 2)
+        )
+        self.assertEqual(
+            self._dates(rule),
+            [
+                date(2025, 3, 5),
+                date(2025, 3, 12),
+                date(2025, 3, 19),
+                date(2025, 3, 26),
+                date(2025, 4, 2),
+            ],
+        )
+
+    def test_same_local_time_over_clock_change(self):
+        # Clocks went forward on 30/3/2025:
+        rule = RecurrenceRule(
+            WEEKLY,
+            datetime(2025, 3, 26, 19, 30, tzinfo=UKTZ),
+            date(2025, 4, 2),
+        )
+        starts = rule.occurrences()
+        self.assertEqual(
+            [start.utcoffset().total_seconds() for start in starts],
+            [0, 3600],
+        )
+        self.assertEqual(
+            [(start.hour, start.minute) for start in starts],
+            [(19, 30), (19, 30)],
+        )
+
+    def test_fortnightly_with_exceptions(self):
+        rule = RecurrenceRule(
+            FORTNIGHTLY,
+            datetime(2025, 12, 3, 20, 0, tzinfo=UKTZ),
+            date(2026, 1, 31),
+            exceptions=[date(2025, 12, 31), date(2026, 1, 1)],
+        )
+        self.assertEqual(
+            self._dates(rule),
+            [
+                date(2025, 12, 3),
+                date(2025, 12, 17),
+                date(2026, 1, 14),
+                date(2026, 1, 28),
+            ],
+        )
+
+    def test_monthly_nth_weekday(self):
+        # First Friday of the month (from the first start):
+        rule = RecurrenceRule(
+            MONTHLY,
+            datetime(2025, 11, 7, 20, 0, tzinfo=UKTZ),
+            date(2026, 3, 1),
+        )
+        self.assertEqual(
+            self._dates(rule),
+            [
+                date(2025, 11, 7),
+                date(2025, 12, 5),
+                date(2026, 1, 2),
+                date(2026, 2, 6),
+            ],
+        )
+
+        # Third Tuesday, given explicitly, starting mid-month:
+        rule = RecurrenceRule(
+            MONTHLY,
+            datetime(2025, 11, 25, 20, 0, tzinfo=UKTZ),
+            date(2026, 1, 31),
+            week_of_month=3,
+        )
+        self.assertEqual(
+            self._dates(rule), [date(2025, 12, 16), date(2026, 1, 20)]
+        )
+
+    def test_monthly_last_weekday(self):
+        # 29/10/2025 is the fifth (so last) Wednesday:
+        rule = RecurrenceRule(
+            MONTHLY,
+            datetime(2025, 10, 29, 20, 0, tzinfo=UKTZ),
+            date(2026, 1, 31),
+        )
+        self.assertEqual(rule.week_of_month, -1)
+        self.assertEqual(
+            self._dates(rule),
+            [
+                date(2025, 10, 29),
+                date(2025, 11, 26),
+                date(2025, 12, 31),
+                date(2026, 1, 28),
+            ],
+        )
+
+    def test_invalid(self):
+        start = datetime(2025, 3, 5, 19, 30, tzinfo=UKTZ)
+        with self.assertRaises(RecurrenceError):
+            RecurrenceRule("daily", start, date(2025, 4, 2))
+        with self.assertRaises(RecurrenceError):
+            RecurrenceRule(WEEKLY, start, date(2025, 3, 4))
+        with self.assertRaises(RecurrenceError):
+            RecurrenceRule(MONTHLY, start, date(2025, 4, 2), week_of_month=5)
+
+    def test_too_many(self):
+        # Two years of weeks:
+        rule = RecurrenceRule(
+            WEEKLY,
+            datetime(2025, 3, 5, 19, 30, tzinfo=UKTZ),
+            date(2027, 3, 1),
+        )
+        with self.assertRaises(RecurrenceError):
+            rule.occurrences()
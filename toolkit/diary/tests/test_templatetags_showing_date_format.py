@@ -4,7 +4,14 @@ import zoneinfo
 from unittest.mock import Mock
 from django.test import TestCase
 
-from toolkit.diary.templatetags.showing_date_format import format_showing_dates
+from toolkit.diary.models import Event
+from toolkit.diary.templatetags.showing_date_format import (
+    format_showing_dates,
+    format_public_showing_dates,
+    set_public_showing_dates,
+)
+
+from .common import DiaryTestsMixin
 
 
 class TestShowingDateFormatFilter(TestCase):
@@ -123,3 +130,38 @@ class TestShowingDateFormatFilter(TestCase):
             ],
             "Thu 26th\u2013Sat 28th / 8pm, Sun 1st, Mon 2nd / 8pm",
         )
+
+
+class TestPublicShowingDates(DiaryTestsMixin, TestCase):
+    def test_bulk(self):
+        # Two instances of e4, as you get from select_related on showings:
+        events = [
+            Event.objects.get(pk=self.e2.pk),
+            Event.objects.get(pk=self.e4.pk),
+            Event.objects.get(pk=self.e4.pk),
+            Event.objects.get(pk=self.e7.pk),
+        ]
+        with self.assertNumQueries(1):
+            set_public_showing_dates(events)
+        with self.assertNumQueries(0):
+            summaries = [format_public_showing_dates(e) for e in events]
+        self.assertEqual(
+            summaries,
+            [
+                # Excludes unconfirmed/hidden showings:
+                "Tue 2nd, Wed 3rd / 7pm",
+                "Sun 9th / 6pm",
+                "Sun 9th / 6pm",
+                "",
+            ],
+        )
+
+    def test_single(self):
+        event = Event.objects.get(pk=self.e2.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                format_public_showing_dates(event), "Tue 2nd, Wed 3rd / 7pm"
+            )
+            self.assertEqual(
+                format_public_showing_dates(event), "Tue 2nd, Wed 3rd / 7pm"
+            )
@@ -12,13 +12,17 @@ from toolkit.diary.edit_views import (
     edit_diary_data,
     edit_showing,
     edit_showing_rota_notes,
+    edit_rota_batch,
+    edit_rota_changes,
     edit_ideas,
     delete_showing,
     add_event,
+    add_event_series,
     edit_event_templates,
     edit_event_tags,
     edit_roles,
     view_event_field,
+    view_event_field_csv,
     view_rota_vacancies,
     set_edit_preferences,
     get_messages,
@@ -122,6 +126,15 @@ programme_urls = [
         toolkit.diary.feeds.BasicWhatsOnFeed(),
         name="view-diary-rss",
     ),
+    # iCalendar feeds
+    re_path(
+        r"^ical/$", toolkit.diary.feeds.view_diary_ical, name="view-diary-ical"
+    ),
+    re_path(
+        r"^view/(?P<event_type>[\w-]+)/ical/$",
+        toolkit.diary.feeds.view_diary_ical,
+        name="type-view-ical",
+    ),
 ]
 
 diary_urls = [
@@ -207,6 +220,9 @@ diary_urls = [
     ),
     # Add a new event + showing
     re_path(r"^edit/event/add$", add_event, name="add-event"),
+    re_path(
+        r"^edit/event/add_series$", add_event_series, name="add-event-series"
+    ),
     # Edit event types
     re_path(
         r"^edit/eventtemplates/",
@@ -232,6 +248,12 @@ diary_urls = [
         view_terms_report_csv,
         name="view_terms_report_csv",
     ),
+    re_path(
+        r"^(?P<field>rota|copy|copy_summary)/csv/(?P<year>\d{4})/"
+        r"(?P<month>\d{1,2})/(?P<day>\d{1,2})$",
+        view_event_field_csv,
+        name="view_event_field_csv",
+    ),
     # As above, will match:
     # "edit/rota" "edit/rota/" "edit/rota/2001/01" "edit/rota/2001/01/"
     # "edit/rota/2001/1/02" "edit/rota/2001/1/2/"
@@ -242,6 +264,10 @@ diary_urls = [
         EditRotaView.as_view(),
         name="rota-edit",
     ),
+    re_path(r"^edit/rota/batch$", edit_rota_batch, name="rota-edit-batch"),
+    re_path(
+        r"^edit/rota/changes$", edit_rota_changes, name="rota-edit-changes"
+    ),
     re_path(
         r"^rota/vacancies$", view_rota_vacancies, name="view-rota-vacancies"
     ),
@@ -25,6 +25,9 @@ def run_job(job: MailoutJob) -> None:
 
     Also sends an email to settings.VENUE['mailout_delivery_report_to'] when
     done.
+
+    Can also be used to resume a job that was interrupted while sending (see
+    send_mailout_to).
     """
 
     recipients = Member.objects.mailout_recipients()
@@ -58,15 +61,17 @@ def poll_for_pending() -> List[MailoutJob]:
     )
 
 
-def clean_up() -> None:
-    interrupted_jobs = MailoutJob.objects.filter(
-        state=MailoutJob.SendState.SENDING
+def poll_for_interrupted() -> List[MailoutJob]:
+    """Jobs that were sending when mailerd was last stopped"""
+    return list(
+        MailoutJob.objects.filter(state=MailoutJob.SendState.SENDING).order_by(
+            "created_at"
+        )
     )
-    for job in interrupted_jobs:
-        logger.info(f"Will not resume interrupted job: {job}")
-        job.do_fail("Mailerd restarted while job was in progress")
-        job.save()
 
+
+def clean_up() -> None:
+    # (Interrupted jobs are left to be resumed)
     half_cancelled_jobs = MailoutJob.objects.filter(
         state=MailoutJob.SendState.CANCELLING
     )
@@ -93,6 +98,13 @@ def run() -> None:
     signal.signal(signal.SIGINT, term_handler)
     signal.signal(signal.SIGTERM, term_handler)
 
+    interrupted_jobs = poll_for_interrupted()
+    for idx, job in enumerate(interrupted_jobs):
+        logger.info(
+            f"Resuming interrupted job {idx+1}/{len(interrupted_jobs)}: {job}"
+        )
+        run_job(job)
+
     while keep_running:
         time.sleep(POLL_PERIOD_S)
         pending_jobs = poll_for_pending()
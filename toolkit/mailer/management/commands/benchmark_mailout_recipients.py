@@ -0,0 +1,87 @@
+"""
+Measure the peak memory used (with tracemalloc) going through the recipients
+of a mailout, for a large number of members, both by iterating over the whole
+queryset (as the mailout used to) and as send_mailout_to does now. Fails if
+the latter goes over a limit.
+
+The members are created in a transaction which is rolled back afterwards, so
+this can be run against a real database without leaving anything behind.
+"""
+
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from toolkit.members.models import Member
+from toolkit.mailer.sender import _iter_recipients
+
+
+class Command(BaseCommand):
+    help = "Measure peak memory use iterating over mailout recipients"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--members",
+            type=int,
+            default=100000,
+            help="Number of (synthetic) members to create",
+        )
+        parser.add_argument(
+            "--max-peak-mb",
+            type=float,
+            default=8,
+            help="Fail if the peak memory use is more than this",
+        )
+
+    def _create_members(self, count):
+        Member.objects.bulk_create(
+            (
+                Member(
+                    number=f"B{n}",
+                    name=f"Benchmark member {n}",
+                    email=f"benchmark{n}@example.com",
+                    mailout_key=f"{n:032d}",
+                    # Make the rows a realistic size:
+                    address="1 Long Street, " * 8,
+                    notes="Notes about the member. " * 20,
+                )
+                for n in range(count)
+            ),
+            batch_size=5000,
+        )
+
+    def _measure(self, recipients):
+        started = time.perf_counter()
+        tracemalloc.start()
+        try:
+            count = 0
+            for _ in recipients:
+                count += 1
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return count, peak / (1024 * 1024), time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._create_members(options["members"])
+            recipients = Member.objects.mailout_recipients()
+
+            for name, iterable in (
+                ("Whole queryset", recipients.order_by("pk")),
+                ("Batches", _iter_recipients(recipients)),
+            ):
+                count, peak_mb, elapsed = self._measure(iterable)
+                self.stdout.write(
+                    f"{name}: {count} recipients, "
+                    f"peak {peak_mb:.1f}MB, {elapsed:.1f}s"
+                )
+            transaction.set_rollback(True)
+
+        if peak_mb > options["max_peak_mb"]:
+            raise CommandError(
+                f"Peak memory use {peak_mb:.1f}MB is more than "
+                f"{options['max_peak_mb']}MB"
+            )
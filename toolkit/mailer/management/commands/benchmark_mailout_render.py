@@ -0,0 +1,94 @@
+"""
+Time building the bodies of each recipient's copy of a mailout, the slow way
+(reverse() and the template engine for every recipient) and from a skeleton
+rendered once per job (see toolkit.mailer.rendering). Also time building the
+complete message, as sent to the SMTP server, with an EmailMessage for each
+recipient and from the skeleton.
+
+The members aren't saved, so nothing touches the database.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from toolkit.members.models import Member
+from toolkit.mailer.models import MailoutJob
+from toolkit.mailer.rendering import (
+    MailoutSkeleton,
+    build_email,
+    render_message,
+)
+
+BODY_TEXT = "The programme for the next two weeks:\n\n" + (
+    "Film night. Doors 7:30pm, £5. Bring a friend!\n\n" * 40
+)
+BODY_HTML = "<h1>The programme for the next two weeks</h1>\n" + (
+    "<p>Film night. <b>Doors 7:30pm</b>, &pound;5. Bring a friend!</p>\n" * 40
+)
+
+
+class Command(BaseCommand):
+    help = "Time rendering mailout messages, per message"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--members",
+            type=int,
+            default=10000,
+            help="Number of (synthetic) members to render messages for",
+        )
+
+    def _time(self, members, render):
+        started = time.perf_counter()
+        for member in members:
+            render(member)
+        return (time.perf_counter() - started) / len(members)
+
+    def _email_message_bytes(self, job, member):
+        message = build_email(
+            member.email, job.subject, *render_message(job, member)
+        )
+        return message.message().as_bytes(linesep="\r\n")
+
+    def handle(self, *args, **options):
+        members = [
+            Member(
+                pk=n,
+                name=f"Member <{n}> O'Brien & co",
+                email=f"member{n}@example.com",
+            )
+            for n in range(1, options["members"] + 1)
+        ]
+        self.stdout.write(f"{len(members)} members")
+
+        for send_html in (False, True):
+            job = MailoutJob(
+                subject="Benchmark mailout",
+                body_text=BODY_TEXT,
+                body_html=BODY_HTML,
+                send_html=send_html,
+            )
+            before = self._time(
+                members, lambda member: render_message(job, member)
+            )
+            started = time.perf_counter()
+            skeleton = MailoutSkeleton(job)
+            setup = time.perf_counter() - started
+            after = self._time(members, skeleton.render)
+            self.stdout.write(
+                f"{'HTML and text' if send_html else 'Text only'}: "
+                f"{before * 1e6:.1f}µs per message before, "
+                f"{after * 1e6:.1f}µs per message after "
+                f"(plus {setup * 1e3:.1f}ms once per job)"
+            )
+            before = self._time(
+                members,
+                lambda member: self._email_message_bytes(job, member),
+            )
+            after = self._time(members, skeleton.raw_message)
+            self.stdout.write(
+                f"{'HTML and text' if send_html else 'Text only'}, "
+                f"complete message: {before * 1e6:.1f}µs per message before, "
+                f"{after * 1e6:.1f}µs per message after"
+            )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mailer", "0002_alter_mailoutjob_body_html"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mailoutjob",
+            name="last_sent_pk",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -55,6 +55,10 @@ class MailoutJob(models.Model):
     # blank means "don't send an HTML email, even if send_html is True"
     body_html = models.TextField(blank=True)
     recipient_filter = models.CharField(blank=True, max_length=255)
+    # Checkpoint, for resuming the job if mailerd is restarted while it's
+    # sending: every recipient with a pk up to and including this one has
+    # been sent to (recipients are sent to in pk order):
+    last_sent_pk = models.IntegerField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -89,7 +93,9 @@ class MailoutJob(models.Model):
     def keep_sending(self) -> bool:
         return self.state == MailoutJob.SendState.SENDING
 
-    def do_sending(self, sent: int, total: int) -> bool:
+    def do_sending(
+        self, sent: int, total: int, last_sent_pk: int | None = None
+    ) -> bool:
         progress_pct = int((100.0 * sent) / total) + 1 if total else 100
         if self.state not in (
             MailoutJob.SendState.PENDING,
@@ -103,6 +109,8 @@ class MailoutJob(models.Model):
         self.status = "Sending"
         self.progress_pct = progress_pct
         self.send_count = total
+        if last_sent_pk is not None:
+            self.last_sent_pk = last_sent_pk
         return True
 
     def do_cancel(self) -> None:
@@ -0,0 +1,333 @@
+"""
+Building the text and HTML bodies of each recipient's copy of a mailout.
+
+Only a few things differ between the copies (the member's name, and their id
+and key in the unsubscribe/edit/delete links), so rather than going through
+reverse() and the template engine for every recipient, MailoutSkeleton renders
+everything once, with markers in the places those go, and splits the result
+into the fixed text and the "slots" between it. Each recipient's copy is then
+just a join.
+
+The same goes for the complete message as it's sent over SMTP: the headers
+(including the encoded subject), the MIME structure and the encoded bodies
+are built once by Django, with slots for the parts that change (the To:
+header, the Date: and Message-ID: headers, which must be different for each
+copy, and the transfer encoding, which depends on whether the member's name
+is plain ASCII), and each recipient's copy is filled in as bytes, ready to
+hand to smtplib's sendmail().
+
+render_message() does the same thing the slow way, one recipient at a time,
+and is kept as the reference for what the output should be.
+"""
+
+import collections
+import re
+import secrets
+from email.utils import formatdate, make_msgid
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives
+from django.core.mail.message import (
+    forbid_multi_line_headers,
+    sanitize_address,
+)
+from django.core.mail.utils import DNS_NAME
+from django.urls import reverse
+from django.utils.html import escape
+import django.template
+
+from toolkit.members.models import Member
+from .models import MailoutJob
+
+HTML_TEMPLATE = "mailout_wrapper.html"
+
+TEXT_PREAMBLE = "Dear {name},\n\n"
+TEXT_SIGNATURE = (
+    "\n"
+    "\n"
+    "If you no longer wish to receive emails from us, please use this "
+    "link:\n"
+    "{host}{unsubscribe_link}?k={key}\n"
+    "To see what details we hold on you and to edit the details of "
+    "your membership, please use this link:\n"
+    "{host}{edit_link}?k={key}\n"
+    "To permanently remove your membership details from our records, "
+    "please use this link:\n"
+    "{host}{delete_link}?k={key}\n"
+)
+
+# Member id to reverse() the links with, to be swapped for the id slot (the
+# URL patterns only match digits); big enough not to turn up by accident:
+_PLACEHOLDER_ID = 918273645546372819
+
+# Slots:
+NAME = "name"
+MEMBER_ID = "member_id"
+KEY = "key"
+HTML_NAME = "html_name"
+HTML_KEY = "html_key"
+TO = "to"
+DATE = "date"
+MESSAGE_ID = "message_id"
+TRANSFER_ENCODING = "transfer_encoding"
+
+# A complete message, for smtplib's sendmail():
+RawMessage = collections.namedtuple(
+    "RawMessage", "destination from_email recipients message"
+)
+
+_TRANSFER_ENCODING_RE = re.compile(
+    rb"^Content-Transfer-Encoding: (\S+)\r$", re.MULTILINE
+)
+
+
+# Plain ASCII addresses that sanitize_address() leaves as they are (it's
+# slow, and this covers nearly everyone):
+_SIMPLE_ADDRESS_RE = re.compile(
+    r"^[A-Za-z0-9_%+-]+(\.[A-Za-z0-9_%+-]+)*"
+    r"@[A-Za-z0-9-]{1,63}(\.[A-Za-z0-9-]{1,63})*$"
+)
+
+
+def _sanitize_address(address: str) -> str:
+    if _SIMPLE_ADDRESS_RE.match(address):
+        return address
+    return sanitize_address(address, "utf-8")
+
+
+def build_email(
+    destination: str,
+    subject: str,
+    body_text: str,
+    body_html: Optional[str],
+) -> EmailMessage:
+    msg_class = EmailMultiAlternatives if body_html else EmailMessage
+
+    msg = msg_class(
+        subject=subject,
+        body=body_text,
+        from_email=settings.VENUE["mailout_from_address"],
+        to=[destination],
+    )
+
+    if body_html:
+        msg.attach_alternative(body_html, "text/html")
+
+    return msg
+
+
+def _links(member_id) -> Dict[str, str]:
+    return {
+        "unsubscribe_link": reverse("unsubscribe-member", args=(member_id,)),
+        "edit_link": reverse("edit-member", args=(member_id,)),
+        "delete_link": reverse("delete-member", args=(member_id,)),
+    }
+
+
+def _html_context(job: MailoutJob, name: str, key: str, links) -> Dict:
+    return {
+        "subject": job.subject,
+        "body": job.body_html,
+        "email_unsubscribe_host": settings.VENUE["email_unsubscribe_host"],
+        "member_name": name,
+        "mailout_key": key,
+        **links,
+    }
+
+
+def _sends_html(job: MailoutJob) -> bool:
+    return bool(job.send_html and job.body_html)
+
+
+def render_message(
+    job: MailoutJob, recipient: Member
+) -> Tuple[str, Optional[str]]:
+    """Return the text and HTML (or None, if the job is text only) bodies of
+    the recipient's copy of the mailout"""
+    links = _links(recipient.pk)
+    body_text = (
+        TEXT_PREAMBLE.format(name=recipient.name)
+        + job.body_text
+        + TEXT_SIGNATURE.format(
+            host=settings.VENUE["email_unsubscribe_host"],
+            key=recipient.mailout_key,
+            **links,
+        )
+    )
+    if not _sends_html(job):
+        return body_text, None
+    html_template = django.template.loader.get_template(HTML_TEMPLATE)
+    body_html = html_template.render(
+        _html_context(job, recipient.name, recipient.mailout_key, links)
+    )
+    return body_text, body_html
+
+
+class _Skeleton:
+    # Fixed text, split by slots: parts alternates between fixed text and
+    # slot names, starting and ending with fixed text. Works for str or bytes
+    def __init__(self, rendered, marker: re.Pattern) -> None:
+        self.parts = marker.split(rendered)
+        for idx in range(1, len(self.parts), 2):
+            if isinstance(self.parts[idx], bytes):
+                self.parts[idx] = self.parts[idx].decode("ascii")
+        self._join = rendered[:0].join
+
+    def slots(self) -> List[str]:
+        return self.parts[1::2]
+
+    def fill(self, values: Dict):
+        parts = self.parts[:]
+        for idx in range(1, len(parts), 2):
+            parts[idx] = values[parts[idx]]
+        return self._join(parts)
+
+
+class MailoutSkeleton:
+    """The job's text and HTML bodies (and, where possible, the complete
+    message) rendered once, for filling in with the details of each recipient
+    by render() (or raw_message())"""
+
+    def __init__(self, job: MailoutJob) -> None:
+        # Random, so that it can't clash with anything in the job's body:
+        token = secrets.token_hex(8)
+        marker = f"{token}:(\\w+):{token}"
+
+        def slot(name: str) -> str:
+            return f"{token}:{name}:{token}"
+
+        links = {
+            name: link.replace(str(_PLACEHOLDER_ID), slot(MEMBER_ID))
+            for name, link in _links(_PLACEHOLDER_ID).items()
+        }
+
+        body_text = (
+            TEXT_PREAMBLE.format(name=slot(NAME))
+            + job.body_text
+            + TEXT_SIGNATURE.format(
+                host=settings.VENUE["email_unsubscribe_host"],
+                key=slot(KEY),
+                **links,
+            )
+        )
+        self._text = _Skeleton(body_text, re.compile(marker))
+        body_html = None
+        self._html: Optional[_Skeleton] = None
+        if _sends_html(job):
+            html_template = django.template.loader.get_template(HTML_TEMPLATE)
+            # (The template escapes the values, but that doesn't change the
+            # markers)
+            body_html = html_template.render(
+                _html_context(job, slot(HTML_NAME), slot(HTML_KEY), links)
+            )
+            self._html = _Skeleton(body_html, re.compile(marker))
+
+        self._mime = self._build_mime(
+            job, slot, re.compile(marker.encode()), body_text, body_html
+        )
+        self._from_email = sanitize_address(
+            settings.VENUE["mailout_from_address"], "utf-8"
+        )
+
+    def _build_mime(
+        self, job: MailoutJob, slot, marker, body_text, body_html
+    ) -> Optional[_Skeleton]:
+        # The message the same as build_email() gives, with slots (or None,
+        # if that can't be done)
+        if settings.DEFAULT_CHARSET.lower() != "utf-8":
+            return None
+        msg = build_email(slot(TO), job.subject, body_text, body_html)
+        msg.extra_headers = {
+            "Date": slot(DATE),
+            "Message-ID": slot(MESSAGE_ID),
+        }
+        rendered = msg.message().as_bytes(linesep="\r\n")
+
+        # Parts that are plain ASCII are sent as "7bit", but need to be
+        # "8bit" for recipients whose names aren't. If the bodies were
+        # encoded any other way (quoted-printable is used for very long
+        # lines) the values can't simply be dropped in:
+        bodies = [body_text] + ([body_html] if body_html else [])
+        encodings = _TRANSFER_ENCODING_RE.findall(rendered)
+        if sorted(encodings) != sorted(
+            b"7bit" if body.isascii() else b"8bit" for body in bodies
+        ):
+            return None
+        rendered = rendered.replace(
+            b"Content-Transfer-Encoding: 7bit\r",
+            b"Content-Transfer-Encoding: "
+            + slot(TRANSFER_ENCODING).encode()
+            + b"\r",
+        )
+        mime = _Skeleton(rendered, marker)
+
+        # Check that every slot made it through (once for each place it's
+        # used):
+        expected = collections.Counter(self._text.slots())
+        if self._html is not None:
+            expected.update(self._html.slots())
+        expected.update(
+            [TO, DATE, MESSAGE_ID]
+            + [TRANSFER_ENCODING] * encodings.count(b"7bit")
+        )
+        if collections.Counter(mime.slots()) != expected:
+            return None
+        return mime
+
+    def render(self, recipient: Member) -> Tuple[str, Optional[str]]:
+        """Return the text and HTML (or None, if the job is text only) bodies
+        of the recipient's copy of the mailout; the same as render_message()
+        does"""
+        member_id = str(recipient.pk)
+        body_text = self._text.fill(
+            {
+                NAME: recipient.name,
+                MEMBER_ID: member_id,
+                KEY: recipient.mailout_key,
+            }
+        )
+        if self._html is None:
+            return body_text, None
+        return body_text, self._html.fill(
+            {
+                HTML_NAME: escape(recipient.name),
+                MEMBER_ID: member_id,
+                HTML_KEY: escape(recipient.mailout_key),
+            }
+        )
+
+    @property
+    def has_raw_messages(self) -> bool:
+        """Whether raw_message() can be used for this job"""
+        return self._mime is not None
+
+    def raw_message(self, recipient: Member) -> RawMessage:
+        """Return the recipient's copy of the mailout as a RawMessage, as
+        Django would send it for build_email(...) with the bodies from
+        render()"""
+        # Raises ValueError for an invalid address, as sending would:
+        to = forbid_multi_line_headers("To", recipient.email, "utf-8")[1]
+        envelope_to = _sanitize_address(recipient.email)
+        message = self._mime.fill(
+            {
+                NAME: recipient.name.encode(),
+                MEMBER_ID: str(recipient.pk).encode(),
+                KEY: recipient.mailout_key.encode(),
+                HTML_NAME: escape(recipient.name).encode(),
+                HTML_KEY: escape(recipient.mailout_key).encode(),
+                TO: to.encode(),
+                DATE: formatdate(
+                    localtime=settings.EMAIL_USE_LOCALTIME
+                ).encode(),
+                MESSAGE_ID: make_msgid(domain=DNS_NAME).encode(),
+                TRANSFER_ENCODING: (
+                    b"7bit"
+                    if (recipient.name + recipient.mailout_key).isascii()
+                    else b"8bit"
+                ),
+            }
+        )
+        return RawMessage(
+            recipient.email, self._from_email, [envelope_to], message
+        )
@@ -1,52 +1,50 @@
+import collections
 import logging
+import queue
+import threading
 import time
 import smtplib
 import email.errors
-from typing import List, Optional, Tuple
+from typing import Deque, Iterator, List, Optional, Set, Tuple, Union
 
-from django.core.mail import (
-    get_connection,
-    EmailMessage,
-    EmailMultiAlternatives,
-)
+from django.core.mail import get_connection, EmailMessage
 from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.smtp import EmailBackend as SMTPEmailBackend
 from django.conf import settings
 from django.db.models import QuerySet
-from django.urls import reverse
-import django.template
 
 from toolkit.members.models import Member
 from .models import MailoutJob
+from .rendering import MailoutSkeleton, RawMessage, build_email
 
 logger = logging.getLogger(__name__)
 
 POLL_FOR_CANCEL_PERIOD_S = 1
+# Number of rendered messages that can be waiting to be sent, for each SMTP
+# connection:
+QUEUE_LENGTH_PER_CONNECTION = 10
+# Number of recipients to load from the database at a time:
+RECIPIENT_BATCH_SIZE = 1000
+# The member fields that are used to build each message:
+RECIPIENT_FIELDS = ("pk", "name", "email", "mailout_key")
 
 
-def _send_email(
-    email_conn: BaseEmailBackend,
-    destination: str,
-    subject: str,
-    body_text: str,
-    body_html: Optional[str],
+def _send_message(
+    email_conn: BaseEmailBackend, msg: Union[EmailMessage, RawMessage]
 ) -> Optional[str]:
     error = None
-
-    msg_class = EmailMultiAlternatives if body_html else EmailMessage
-
-    msg = msg_class(
-        subject=subject,
-        body=body_text,
-        from_email=settings.VENUE["mailout_from_address"],
-        to=[destination],
-        connection=email_conn,
-    )
-
-    if body_html:
-        msg.attach_alternative(body_html, "text/html")
+    is_raw = isinstance(msg, RawMessage)
+    destination = msg.destination if is_raw else msg.to[0]
 
     try:
-        msg.send()
+        if is_raw:
+            # Straight to the SMTP server:
+            email_conn.connection.sendmail(
+                msg.from_email, msg.recipients, msg.message
+            )
+        else:
+            msg.connection = email_conn
+            msg.send()
     except email.errors.MessageParseError as hpe:
         error = f"Failed sending to '{destination}': {hpe}"
         logger.error(error)
@@ -61,6 +59,177 @@ def _send_email(
     return error
 
 
+def _send_email(
+    email_conn: BaseEmailBackend,
+    destination: str,
+    subject: str,
+    body_text: str,
+    body_html: Optional[str],
+) -> Optional[str]:
+    return _send_message(
+        email_conn, build_email(destination, subject, body_text, body_html)
+    )
+
+
+def _close_connection(email_conn: BaseEmailBackend) -> None:
+    try:
+        email_conn.close()
+    except smtplib.SMTPException as smtpe:
+        logger.error(f"SMTP Quit failed: {smtpe}")
+
+
+class _SenderPool:
+    """
+    Sends messages through several SMTP connections at once, each used by its
+    own thread, which take messages from a shared (bounded) queue.
+
+    If a connection is dropped, it's reopened and the message is tried again,
+    once. Any other failure stops all the threads sending (the rest of the
+    queued messages are discarded), and is raised from the next call to
+    send() or finish().
+
+    The threads don't use the database, so all the job bookkeeping stays in
+    the calling thread. Messages are queued with a key (the recipient's pk),
+    and must be queued in key order, so that last_sent() can say how far
+    through the recipients the sending has got.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.connections = [
+            get_connection(fail_silently=False) for _ in range(size)
+        ]
+        self.sent = 0
+        self.errors: List[str] = []
+        self._queue: queue.Queue[
+            Optional[Tuple[int, Union[EmailMessage, RawMessage]]]
+        ] = queue.Queue(maxsize=size * QUEUE_LENGTH_PER_CONNECTION)
+        self._lock = threading.Lock()
+        # Keys of the messages queued but not yet known to be sent, in
+        # order, and of those (from among them) which have been sent:
+        self._unconfirmed: Deque[int] = collections.deque()
+        self._done: Set[int] = set()
+        self._last_sent: Optional[int] = None
+        self._failure: Optional[Exception] = None
+        self._discard = False
+        self._threads: List[threading.Thread] = []
+
+    def open(self) -> None:
+        for email_conn in self.connections:
+            email_conn.open()
+
+    def start(self) -> None:
+        for idx, email_conn in enumerate(self.connections):
+            thread = threading.Thread(
+                target=self._run,
+                args=(email_conn,),
+                name=f"mailout-sender-{idx}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _send(
+        self,
+        email_conn: BaseEmailBackend,
+        key: int,
+        msg: Union[EmailMessage, RawMessage],
+    ) -> None:
+        try:
+            error = _send_message(email_conn, msg)
+        except smtplib.SMTPServerDisconnected:
+            logger.info("Reconnecting to SMTP server")
+            _close_connection(email_conn)
+            email_conn.open()
+            error = _send_message(email_conn, msg)
+        with self._lock:
+            if error:
+                self.errors.append(error)
+            self.sent += 1
+            self._done.add(key)
+
+    def _run(self, email_conn: BaseEmailBackend) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            # After a failure (or cancellation) keep taking messages off the
+            # queue, so that send() and finish() can't block, but just drop
+            # them:
+            if self._failure is not None or self._discard:
+                continue
+            try:
+                self._send(email_conn, *item)
+            except Exception as exc:
+                with self._lock:
+                    if self._failure is None:
+                        self._failure = exc
+
+    def _raise_failure(self) -> None:
+        if self._failure is not None:
+            raise self._failure
+
+    def send(self, key: int, msg: Union[EmailMessage, RawMessage]) -> None:
+        """Queue a message to be sent, waiting if the queue is full"""
+        self._raise_failure()
+        self._unconfirmed.append(key)
+        self._queue.put((key, msg))
+
+    def last_sent(self) -> Optional[int]:
+        """Return the highest key for which the message, and every message
+        queued before it, has been sent (or failed with a per-recipient
+        error), or None if there isn't one yet"""
+        with self._lock:
+            while self._unconfirmed and self._unconfirmed[0] in self._done:
+                self._last_sent = self._unconfirmed.popleft()
+                self._done.remove(self._last_sent)
+        return self._last_sent
+
+    def discard_queued(self) -> None:
+        """Drop all the messages which haven't been sent yet"""
+        self._discard = True
+
+    def _stop(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def finish(self) -> None:
+        """Wait for the queued messages to be sent, and stop the threads"""
+        self._stop()
+        self._raise_failure()
+
+    def close(self) -> None:
+        """Stop the threads, if they're still running (dropping anything
+        still queued) and close the connections"""
+        if self._threads:
+            self.discard_queued()
+            self._stop()
+        for email_conn in self.connections:
+            _close_connection(email_conn)
+
+
+def _iter_recipients(
+    recipients: QuerySet[Member], batch_size: int = RECIPIENT_BATCH_SIZE
+) -> Iterator[Member]:
+    # Yield the recipients in pk order, loading a batch at a time (each
+    # starting after the last pk of the one before, rather than with an
+    # OFFSET) and only the fields that are needed, so that memory use doesn't
+    # grow with the number of recipients:
+    recipients = recipients.order_by("pk").only(*RECIPIENT_FIELDS)
+    last_pk = None
+    while True:
+        batch = recipients
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last_pk = batch[-1].pk
+
+
 def send_mailout_report(
     email_conn: BaseEmailBackend,
     report_to: str,
@@ -68,12 +237,18 @@ def send_mailout_report(
     err_list: List[str],
     subject: str,
     body_text: str,
+    resumed: bool = False,
 ) -> None:
     # All done? Send report:
     report_text = (
         "%d copies of the following were sent out on %s members"
         " list\n" % (sent, settings.VENUE["name"])
     )
+    if resumed:
+        report_text += (
+            "(The mailout was interrupted and then resumed; any errors from"
+            " before it was interrupted aren't listed)\n"
+        )
     if len(err_list) > 0:
         # Only send a max of 100 error messages!
         report_text += "{0} errors:\n{1}".format(
@@ -88,33 +263,6 @@ def send_mailout_report(
     _send_email(email_conn, report_to, subject, report_text, None)
 
 
-def _get_text_preamble_signature(recipient: Member) -> Tuple[str, str]:
-    preamble_template = "Dear {0},\n\n"
-    signature_template = (
-        "\n"
-        "\n"
-        "If you no longer wish to receive emails from us, please use this "
-        "link:\n"
-        "{0}{1}?k={4}\n"
-        "To see what details we hold on you and to edit the details of "
-        "your membership, please use this link:\n"
-        "{0}{2}?k={4}\n"
-        "To permanently remove your membership details from our records, "
-        "please use this link:\n"
-        "{0}{3}?k={4}\n"
-    )
-    return (
-        preamble_template.format(recipient.name),
-        signature_template.format(
-            settings.VENUE["email_unsubscribe_host"],
-            reverse("unsubscribe-member", args=(recipient.pk,)),
-            reverse("edit-member", args=(recipient.pk,)),
-            reverse("delete-member", args=(recipient.pk,)),
-            recipient.mailout_key,
-        ),
-    )
-
-
 def send_mailout_to(
     job: MailoutJob,
     recipients: QuerySet[Member],
@@ -123,107 +271,104 @@ def send_mailout_to(
     """
     Sends email with supplied subject/body to supplied set of recipients.
     Requires subject and body to be unicode.
+
+    Recipients are sent to in pk order, and the job's last_sent_pk is kept up
+    to date as it goes. If that's already set (i.e. the job was interrupted
+    part way through) sending carries on from the next recipient after it.
+    Anyone sent to in the few seconds before the interruption may get a
+    second copy, but no-one is missed.
     """
 
     count = recipients.count()
-    sent = 0
     one_percent = count // 100 or 1
     last_poll_for_cancel = time.monotonic()
 
-    logger.info(f"Sending mailout to {count} recipients")
+    resumed = job.last_sent_pk is not None
+    already_sent = 0
+    if resumed:
+        already_sent = recipients.filter(pk__lte=job.last_sent_pk).count()
+        recipients = recipients.filter(pk__gt=job.last_sent_pk)
+        logger.info(
+            f"Resuming mailout after member {job.last_sent_pk}, "
+            f"{already_sent}/{count} already sent"
+        )
+    logger.info(f"Sending mailout to {count - already_sent} recipients")
 
-    html_mail_template = django.template.loader.get_template(
-        "mailout_wrapper.html"
-    )
-    html_mail_context = {
-        "subject": job.subject,
-        "body": job.body_html,
-        "email_unsubscribe_host": settings.VENUE["email_unsubscribe_host"],
-        "member_name": "member",
-        "unsubscribe_link": "[error]",
-        "edit_link": "[error]",
-        "delete_link": "[error]",
-        "mailout_key": "",
-    }
-
-    # Open connection to SMTP server:
-    email_conn = get_connection(fail_silently=False)
+    # Render everything that's the same for every recipient:
+    skeleton = MailoutSkeleton(job)
+
+    # Open connections to SMTP server:
+    pool = _SenderPool(settings.MAILOUT_SMTP_CONNECTIONS)
     try:
-        email_conn.open()
+        pool.open()
     except Exception as exc:
         msg = f"Failed to connect to SMTP server: {exc}"
         logger.error(msg)
         job.do_fail(msg)
         job.save()
+        pool.close()
         return
 
-    err_list = []
+    # If the messages are going to an SMTP server (rather than, say, the
+    # console) send the bytes of each message straight to it, rather than
+    # building an EmailMessage for each one:
+    send_raw = skeleton.has_raw_messages and all(
+        isinstance(email_conn, SMTPEmailBackend)
+        for email_conn in pool.connections
+    )
 
     try:
-        for recipient in recipients:
+        pool.start()
+        queued = 0
+        for recipient in _iter_recipients(recipients):
             now_m = time.monotonic()
-            if sent % one_percent == 0 or (
+            if queued % one_percent == 0 or (
                 now_m - last_poll_for_cancel > POLL_FOR_CANCEL_PERIOD_S
             ):
                 job.refresh_from_db()
                 if job.keep_sending():
-                    job.do_sending(sent, count)
+                    job.do_sending(
+                        already_sent + pool.sent, count, pool.last_sent()
+                    )
                     job.save()
                 last_poll_for_cancel = now_m
 
             if not job.keep_sending():
                 logger.info(f"Aborting job: {job}")
+                pool.discard_queued()
                 break
 
-            # Build per-recipient signature, with customised unsubscribe links:
-            text_pre, text_post = _get_text_preamble_signature(recipient)
-
-            # Build final email, still in unicode:
-            mail_body_text = text_pre + job.body_text + text_post
-
-            if job.send_html and job.body_html:
-                html_mail_context.update(
-                    {
-                        "member_name": recipient.name,
-                        "unsubscribe_link": reverse(
-                            "unsubscribe-member", args=(recipient.pk,)
-                        ),
-                        "edit_link": reverse(
-                            "edit-member", args=(recipient.pk,)
-                        ),
-                        "delete_link": reverse(
-                            "delete-member", args=(recipient.pk,)
-                        ),
-                        "mailout_key": recipient.mailout_key,
-                    }
-                )
-                mail_body_html = html_mail_template.render(html_mail_context)
+            # Fill in the per-recipient name and unsubscribe links:
+            if send_raw:
+                pool.send(recipient.pk, skeleton.raw_message(recipient))
             else:
-                mail_body_html = None
-
-            error = _send_email(
-                email_conn,
-                recipient.email,
-                job.subject,
-                mail_body_text,
-                mail_body_html,
-            )
-            if error:
-                err_list.append(error)
+                mail_body_text, mail_body_html = skeleton.render(recipient)
+                pool.send(
+                    recipient.pk,
+                    build_email(
+                        recipient.email,
+                        job.subject,
+                        mail_body_text,
+                        mail_body_html,
+                    ),
+                )
+            queued += 1
 
-            sent += 1
+        # Wait for everything queued to be sent:
+        pool.finish()
 
-        job.do_complete(sent=sent)
+        job.do_complete(sent=already_sent + pool.sent)
         job.save()
 
         if report_to:
             send_mailout_report(
-                email_conn,
+                pool.connections[0],
                 report_to,
-                sent,
-                err_list,
+                already_sent + pool.sent,
+                pool.errors,
                 job.subject,
                 job.body_text,
+                resumed=resumed,
             )
 
     except Exception as exc:
@@ -231,9 +376,6 @@ def send_mailout_to(
         job.do_fail(f"Mailout job died: '{exc}'")
         job.save()
     finally:
-        try:
-            email_conn.close()
-        except smtplib.SMTPException as smtpe:
-            logger.error(f"SMTP Quit failed: {smtpe}")
+        pool.close()
 
     logger.info("Mailout complete")
@@ -1,6 +1,8 @@
+import time
 from unittest.mock import patch
 from datetime import timedelta
 
+from django.core import mail
 from django.test import TestCase
 from django.conf import settings
 import django.utils.timezone as timezone
@@ -9,6 +11,7 @@ from ...members.tests.common import MembersTestsMixin
 from ...members.models import Member
 from ..models import MailoutJob
 import toolkit.mailer.mailerd as mailerd
+import toolkit.mailer.sender as sender
 
 
 class TestPollForPending(TestCase):
@@ -77,7 +80,9 @@ class TestCleanUp(TestCase):
         )
         mailerd.clean_up()
         job.refresh_from_db()
-        self.assertEqual(MailoutJob.SendState.FAILED, job.state)
+        # Left to be resumed:
+        self.assertEqual(MailoutJob.SendState.SENDING, job.state)
+        self.assertListEqual([job], mailerd.poll_for_interrupted())
 
     def test_clean_up_cancelled(self) -> None:
         job = MailoutJob.objects.create(
@@ -162,3 +167,91 @@ class TestRunJob(MembersTestsMixin, TestCase):
 
         job.refresh_from_db()
         self.assertEqual(MailoutJob.SendState.FAILED, job.state)
+
+
+class Killed(BaseException):
+    # Stands in for the process being killed; not caught by send_mailout_to
+    pass
+
+
+class TestResumeInterrupted(MembersTestsMixin, TestCase):
+    def _recipient_pks(self, messages) -> list[int]:
+        by_email = dict(
+            Member.objects.mailout_recipients().values_list("email", "pk")
+        )
+        return [by_email[message.to[0]] for message in messages]
+
+    @patch("toolkit.mailer.sender.POLL_FOR_CANCEL_PERIOD_S", -1)
+    def test_killed_mid_send(self) -> None:
+        recipient_pks = list(
+            Member.objects.mailout_recipients()
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        self.assertEqual(len(recipient_pks), 6)
+        job = MailoutJob.objects.create(
+            subject="s",
+            body_text="t",
+            body_html="",
+            send_html=False,
+            send_at=timezone.now(),
+        )
+
+        build_email = sender.build_email
+        built = 0
+
+        def build_email_then_die(*args, **kwargs):
+            nonlocal built
+            built += 1
+            if built == 4:
+                # Let the first three get sent (and so be checkpointed
+                # before the next one):
+                for _ in range(500):
+                    if len(mail.outbox) >= 3:
+                        break
+                    time.sleep(0.01)
+            elif built == 5:
+                raise Killed()
+            return build_email(*args, **kwargs)
+
+        with patch(
+            "toolkit.mailer.sender.build_email",
+            side_effect=build_email_then_die,
+        ):
+            with self.assertRaises(Killed):
+                mailerd.run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(MailoutJob.SendState.SENDING, job.state)
+        checkpoint = job.last_sent_pk
+        self.assertIn(checkpoint, recipient_pks[2:4])
+        first_run = self._recipient_pks(mail.outbox)
+        checkpointed = [pk for pk in recipient_pks if pk <= checkpoint]
+        self.assertTrue(set(checkpointed) <= set(first_run))
+        mail.outbox = []
+
+        # Restart:
+        mailerd.clean_up()
+        interrupted = mailerd.poll_for_interrupted()
+        self.assertListEqual([job], interrupted)
+        mailerd.run_job(interrupted[0])
+
+        job.refresh_from_db()
+        self.assertEqual(MailoutJob.SendState.SENT, job.state)
+        self.assertEqual(6, job.send_count)
+        # The rest, in order, plus the report:
+        self.assertListEqual(
+            [pk for pk in recipient_pks if pk > checkpoint],
+            self._recipient_pks(mail.outbox[:-1]),
+        )
+        report = mail.outbox[-1]
+        self.assertEqual(
+            [settings.VENUE["mailout_delivery_report_to"]], report.to
+        )
+        self.assertIn("6 copies of the following were sent out", report.body)
+        self.assertIn("interrupted and then resumed", report.body)
+        # No-one missed:
+        self.assertEqual(
+            set(recipient_pks),
+            set(first_run) | set(self._recipient_pks(mail.outbox[:-1])),
+        )
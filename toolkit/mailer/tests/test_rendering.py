@@ -0,0 +1,159 @@
+import re
+from io import StringIO
+
+from django.core.mail.message import sanitize_address
+from django.core.management import call_command
+from django.test import TestCase
+
+from ...members.tests.common import MembersTestsMixin
+from ...members.models import Member
+from ..models import MailoutJob
+from ..rendering import (
+    MailoutSkeleton,
+    _sanitize_address,
+    build_email,
+    render_message,
+)
+
+
+def _normalise(message: bytes) -> bytes:
+    # Blank out the parts which are different every time:
+    message = re.sub(rb"(?m)^(Date|Message-ID): .*\r$", rb"\1: X\r", message)
+    boundary = re.search(rb'boundary="([^"]+)"', message)
+    if boundary:
+        message = message.replace(boundary.group(1), b"BOUNDARY")
+    return message
+
+
+class TestMailoutSkeleton(MembersTestsMixin, TestCase):
+    def _job(self, send_html: bool) -> MailoutJob:
+        return MailoutJob(
+            subject="The <Subject> ☃!",
+            body_text="The Body! {name} {0} %s\nThat will be €1",
+            body_html="<h1>Body</h1>\n<p>{{ member_name }} {name} €1</p>",
+            send_html=send_html,
+        )
+
+    def _assert_same_as_render_message(self, job: MailoutJob) -> None:
+        member = Member.objects.get(id=1)
+        member.name = 'Ms <Bold> O\'Brien & "Co" {name}'
+        skeleton = MailoutSkeleton(job)
+        for recipient in [member] + list(Member.objects.all()):
+            self.assertEqual(
+                skeleton.render(recipient), render_message(job, recipient)
+            )
+
+    def test_text(self) -> None:
+        job = self._job(send_html=False)
+        self._assert_same_as_render_message(job)
+
+        member = Member.objects.get(id=1)
+        body_text, body_html = MailoutSkeleton(job).render(member)
+        self.assertIsNone(body_html)
+        self.assertTrue(body_text.startswith(f"Dear {member.name},\n\n"))
+        self.assertIn(
+            f"/members/1/unsubscribe/?k={member.mailout_key}\n", body_text
+        )
+
+    def test_html(self) -> None:
+        job = self._job(send_html=True)
+        self._assert_same_as_render_message(job)
+
+        member = Member.objects.get(id=1)
+        member.name = "<Bold>"
+        body_text, body_html = MailoutSkeleton(job).render(member)
+        self.assertIn("Dear <Bold>,", body_text)
+        self.assertIn("<p>Dear &lt;Bold&gt;</p>", body_html)
+        self.assertIn(f"/members/1/edit/?k={member.mailout_key}", body_html)
+
+    def test_html_no_body(self) -> None:
+        job = self._job(send_html=True)
+        job.body_html = ""
+        self._assert_same_as_render_message(job)
+        self.assertIsNone(
+            MailoutSkeleton(job).render(Member.objects.get(id=1))[1]
+        )
+
+    def _assert_raw_same_as_django(self, job: MailoutJob) -> None:
+        member = Member.objects.get(id=1)
+        member.name = "Ms <Bold> O'Brien & \u2603"
+        member.email = "\u0205ne@\u0205xample.com"
+        skeleton = MailoutSkeleton(job)
+        self.assertTrue(skeleton.has_raw_messages)
+        for recipient in [member] + list(Member.objects.mailout_recipients()):
+            raw = skeleton.raw_message(recipient)
+            expected = build_email(
+                recipient.email, job.subject, *render_message(job, recipient)
+            )
+            self.assertEqual(
+                _normalise(raw.message),
+                _normalise(expected.message().as_bytes(linesep="\r\n")),
+            )
+            self.assertEqual(raw.destination, recipient.email)
+            self.assertEqual(raw.from_email, "mailout@cubecinema.com")
+        self.assertEqual(raw.recipients, [recipient.email])
+        self.assertEqual(
+            skeleton.raw_message(member).recipients,
+            ["=?utf-8?q?=C8=85ne?=@xn--xample-2hc.com"],
+        )
+
+    def test_raw_text(self) -> None:
+        job = self._job(send_html=False)
+        self._assert_raw_same_as_django(job)
+        # All ASCII:
+        job.subject = "Subject"
+        job.body_text = "Body"
+        self._assert_raw_same_as_django(job)
+
+    def test_raw_html(self) -> None:
+        job = self._job(send_html=True)
+        self._assert_raw_same_as_django(job)
+        job.subject = "Subject"
+        job.body_text = "Body"
+        job.body_html = "<p>Body</p>"
+        self._assert_raw_same_as_django(job)
+
+    def test_raw_unique_headers(self) -> None:
+        skeleton = MailoutSkeleton(self._job(send_html=True))
+        member = Member.objects.get(id=1)
+        first = skeleton.raw_message(member).message
+        second = skeleton.raw_message(member).message
+        message_id = re.compile(rb"(?m)^Message-ID: (.*)\r$")
+        self.assertNotEqual(
+            message_id.search(first).group(1),
+            message_id.search(second).group(1),
+        )
+
+    def test_no_raw_for_long_lines(self) -> None:
+        # Long lines mean the body is quoted-printable encoded:
+        job = self._job(send_html=False)
+        job.body_text = "x" * 1000
+        skeleton = MailoutSkeleton(job)
+        self.assertFalse(skeleton.has_raw_messages)
+        # Can still render the bodies:
+        self.assertEqual(
+            skeleton.render(Member.objects.get(id=1)),
+            render_message(job, Member.objects.get(id=1)),
+        )
+
+    def test_sanitize_address(self) -> None:
+        for address in [
+            "one@example.com",
+            "Foo.Bar@Example.COM",
+            "a+b_c%d-e@x-y.co.uk",
+            "x@localhost",
+            "\u0205ne@\u0205xample.com",
+            "one@\u0205xample.com",
+            "Some One <one@example.com>",
+            '"one two"@example.com',
+            "one..two@example.com",
+        ]:
+            self.assertEqual(
+                _sanitize_address(address), sanitize_address(address, "utf-8")
+            )
+
+    def test_benchmark_command(self) -> None:
+        out = StringIO()
+        call_command("benchmark_mailout_render", "--members=10", stdout=out)
+        self.assertIn("10 members", out.getvalue())
+        self.assertIn("HTML and text: ", out.getvalue())
@@ -2,16 +2,18 @@ import email.parser
 import email.header
 import smtplib
 from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch, Mock
 
 from django.core import mail
+from django.core.management import CommandError, call_command
 from django.conf import settings
-from django.test import TestCase
+from django.test import TestCase, override_settings
 import django.utils.timezone
 
 from ...members.tests.common import MembersTestsMixin
 from ...members.models import Member
-from ..sender import send_mailout_to
+from ..sender import _iter_recipients, send_mailout_to
 from ..models import MailoutJob
 
 SUMMARY_RECIPIENT = "cubeadmin@example.com"
@@ -171,7 +173,10 @@ class TestSendMailoutTo(MembersTestsMixin, TestCase):
         job = self._test_send(subject, body)
         self._assert_mail_sent(subject, body, None, True)
 
-        close_mock.assert_called_once()
+        # Once for each connection:
+        self.assertEqual(
+            close_mock.call_count, settings.MAILOUT_SMTP_CONNECTIONS
+        )
 
         self.assertEqual(MailoutJob.SendState.SENT, job.state)
         self.assertEqual("Complete", job.status)
@@ -209,6 +214,109 @@ class TestSendMailoutTo(MembersTestsMixin, TestCase):
         self.assertEqual(MailoutJob.SendState.FAILED, job.state)
         self.assertEqual("Mailout job died: 'Something failed'", job.status)
 
+    @patch("toolkit.mailer.sender.get_connection")
+    def test_send_reconnect(self, connection_mock: Mock) -> None:
+        # Disconnected once, then fine after reconnecting:
+        connection_mock.return_value.send_messages.side_effect = [
+            smtplib.SMTPServerDisconnected("Dropped")
+        ] + [1] * 7
+
+        job = self._test_send(
+            "The \xa31 Subject!",
+            "The Body!\nThat will be $1, please\nTa!",
+        )
+
+        self.assertEqual(MailoutJob.SendState.SENT, job.state)
+        self.assertEqual("Complete", job.status)
+        self.assertEqual(6, job.send_count)
+        # Each connection opened once, plus one reconnection:
+        self.assertEqual(
+            connection_mock.return_value.open.call_count,
+            settings.MAILOUT_SMTP_CONNECTIONS + 1,
+        )
+        report = connection_mock.return_value.send_messages.call_args[0][0][0]
+        self.assertNotIn("errors:", report.body)
+
+    @patch("toolkit.mailer.sender.get_connection")
+    def test_send_fail_some(self, connection_mock: Mock) -> None:
+        def send_messages(messages):
+            if messages[0].to[0] == "two@example.com":
+                raise smtplib.SMTPException("Refused two")
+            return 1
+
+        connection_mock.return_value.send_messages.side_effect = send_messages
+
+        job = self._test_send(
+            "The \xa31 Subject!",
+            "The Body!\nThat will be $1, please\nTa!",
+        )
+
+        self.assertEqual(MailoutJob.SendState.SENT, job.state)
+        self.assertEqual(6, job.send_count)
+        report = connection_mock.return_value.send_messages.call_args[0][0][0]
+        self.assertIn("1 errors:\nRefused two\n", report.body)
+
+    @override_settings(
+        EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend"
+    )
+    @patch("smtplib.SMTP")
+    def test_send_smtp(self, smtp_mock: Mock) -> None:
+        # Messages go straight to the SMTP connection's sendmail(), with the
+        # same contents as Django would send
+        def sendmail(from_addr, to_addrs, msg):
+            if to_addrs == ["two@example.com"]:
+                raise smtplib.SMTPRecipientsRefused(
+                    {"two@example.com": (550, b"No such user")}
+                )
+
+        smtp_mock.return_value.sendmail.side_effect = sendmail
+        subject = "The Subject \u2603!"
+        body = "The Body!\nThat will be \u20ac1, please\nTa \u2603!"
+        body_html = "<p>That will be \u20ac1, please</p>"
+
+        job = self._test_send(subject, body, body_html, send_html=True)
+
+        self.assertEqual(MailoutJob.SendState.SENT, job.state)
+        self.assertEqual(6, job.send_count)
+        self.assertEqual(
+            smtp_mock.call_count, settings.MAILOUT_SMTP_CONNECTIONS
+        )
+        calls = smtp_mock.return_value.sendmail.call_args_list
+        # 6 mails, plus the summary:
+        self.assertEqual(len(calls), 7)
+        recipients = set()
+        for call in calls[:-1]:
+            from_addr, to_addrs, msg_bytes = call[0]
+            self.assertEqual(from_addr, settings.VENUE["mailout_from_address"])
+            message = email.message_from_bytes(msg_bytes)
+            self.assertEqual(message["To"], to_addrs[0])
+            recipients.add(message["To"])
+            self.assertEqual(
+                message.get_content_type(), "multipart/alternative"
+            )
+            text_part, html_part = (
+                part.get_payload(decode=True).decode().replace("\r\n", "\n")
+                for part in message.get_payload()
+            )
+            self.assertIn(body, text_part)
+            self.assertIn(body_html, html_part)
+        self.assertEqual(
+            recipients,
+            set(
+                Member.objects.mailout_recipients().values_list(
+                    "email", flat=True
+                )
+            ),
+        )
+
+        # Summary includes the error:
+        report = email.message_from_bytes(calls[-1][0][2])
+        self.assertEqual(report["To"], SUMMARY_RECIPIENT)
+        self.assertIn(
+            "1 errors:\n{'two@example.com': (550, b'No such user')}\n",
+            report.get_payload(decode=True).decode().replace("\r\n", "\n"),
+        )
+
     @patch("toolkit.mailer.sender.get_connection")
     def test_random_error(self, connection_mock: Mock) -> None:
         # Test a non SMTP error
@@ -224,6 +332,62 @@ class TestSendMailoutTo(MembersTestsMixin, TestCase):
         self.assertEqual(MailoutJob.SendState.FAILED, job.state)
         self.assertEqual("Mailout job died: 'something'", job.status)
 
+    def test_cancelled(self) -> None:
+        job = MailoutJob(
+            subject="The Subject!",
+            body_text="The Body!",
+            send_html=False,
+            send_at=django.utils.timezone.now() + timedelta(days=1),
+        )
+        job.do_sending(sent=0, total=0)
+        job.do_cancel()
+        job.save()
+
+        send_mailout_to(
+            job,
+            Member.objects.mailout_recipients(),
+            report_to=SUMMARY_RECIPIENT,
+        )
+
+        self.assertEqual(MailoutJob.SendState.CANCELLED, job.state)
+        self.assertEqual(0, job.send_count)
+        # Just the report:
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [SUMMARY_RECIPIENT])
+
+    def test_resume(self) -> None:
+        recipients = Member.objects.mailout_recipients()
+        pks = sorted(recipients.values_list("pk", flat=True))
+        job = MailoutJob(
+            subject="The Subject!",
+            body_text="The Body!",
+            send_html=False,
+            send_at=django.utils.timezone.now() + timedelta(days=1),
+            last_sent_pk=pks[3],
+        )
+        job.do_sending(sent=0, total=0)
+        job.save()
+
+        send_mailout_to(job, recipients, report_to=SUMMARY_RECIPIENT)
+
+        self.assertEqual(MailoutJob.SendState.SENT, job.state)
+        # Including the ones sent before:
+        self.assertEqual(6, job.send_count)
+        # The last two, and the report:
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            sorted(msg.to[0] for msg in mail.outbox[:2]),
+            sorted(
+                Member.objects.filter(pk__in=pks[4:]).values_list(
+                    "email", flat=True
+                )
+            ),
+        )
+        self.assertIn(
+            "6 copies of the following were sent out", mail.outbox[2].body
+        )
+        self.assertIn("interrupted and then resumed", mail.outbox[2].body)
+
     def test_no_recipients(self) -> None:
         Member.objects.all().delete()
         job = self._test_send(
@@ -245,8 +409,53 @@ class TestSendMailoutTo(MembersTestsMixin, TestCase):
         job = self._test_send(subject, body)
 
         self._assert_mail_sent(subject, body, None, True)
-        self.assertEqual(mail.outbox[0].to, ["\u0205ne@\u0205xample.com"])
+        # (Messages are sent concurrently, so not necessarily in order)
+        self.assertIn(
+            ["\u0205ne@\u0205xample.com"], [msg.to for msg in mail.outbox]
+        )
 
         self.assertEqual(MailoutJob.SendState.SENT, job.state)
         self.assertEqual("Complete", job.status)
         self.assertEqual(6, job.send_count)
+
+
+class TestIterRecipients(MembersTestsMixin, TestCase):
+    def test_iter_recipients(self) -> None:
+        recipients = Member.objects.mailout_recipients()
+        # 6 recipients, in batches of 2 (the last query finds none):
+        with self.assertNumQueries(4):
+            members = list(_iter_recipients(recipients, batch_size=2))
+            # Only the fields needed to build the messages are loaded, but
+            # those don't need another query:
+            for member in members:
+                (member.name, member.email, member.mailout_key)
+        self.assertEqual(
+            [member.pk for member in members],
+            sorted(recipients.values_list("pk", flat=True)),
+        )
+
+    def test_iter_recipients_filtered(self) -> None:
+        recipients = Member.objects.mailout_recipients().filter(pk__gt=3)
+        self.assertEqual(
+            [member.pk for member in _iter_recipients(recipients, 2)],
+            sorted(recipients.values_list("pk", flat=True)),
+        )
+
+    def test_benchmark_command(self) -> None:
+        out = StringIO()
+        call_command(
+            "benchmark_mailout_recipients", "--members=3000", stdout=out
+        )
+        self.assertIn("Whole queryset: 3006 recipients", out.getvalue())
+        self.assertIn("Batches: 3006 recipients", out.getvalue())
+        # Nothing left behind:
+        self.assertEqual(6, Member.objects.mailout_recipients().count())
+
+    def test_benchmark_command_limit(self) -> None:
+        with self.assertRaisesRegex(CommandError, "Peak memory use"):
+            call_command(
+                "benchmark_mailout_recipients",
+                "--members=100",
+                "--max-peak-mb=0.001",
+                stdout=StringIO(),
+            )
@@ -76,6 +76,14 @@ PROGRAMME_COPY_SUMMARY_MAX_CHARS = 450
 PROGRAMME_EVENT_TERMS_MIN_WORDS = 3
 # Max size of uploaded diary media items (enforced by MediaItemForm)
 PROGRAMME_MEDIA_MAX_SIZE_MB = 5  # Megabytes (i.e. * 1024 * 1024 bytes)
+# Upper limit on how long rendered programme pages are cached for. (Cached
+# pages are thrown away as soon as any of the events/showings/etc. in them
+# change, so this only really matters for things that aren't tracked, like
+# the CMS menu)
+PROGRAMME_CACHE_TIMEOUT_SECONDS = 60 * 60
+# The public programme listing is split into pages of this many events, which
+# are loaded progressively as the page is scrolled
+PROGRAMME_EVENTS_PER_PAGE = 24
 
 DEFAULT_MUGSHOT = "/static/members/default_mugshot.gif"
 
@@ -85,6 +93,9 @@ EMAIL_HOST = "localhost"
 EMAIL_PORT = 25
 # TODO add username and password
 
+# Number of SMTP connections to send a mailout through at once
+MAILOUT_SMTP_CONNECTIONS = 4
+
 # Default number of days ahead for which to include detailed copy in the
 # member's mailout
 MAILOUT_DETAILS_DAYS_AHEAD = 9
@@ -115,6 +126,8 @@ CALENDAR_DEFAULT_COLOUR = "#33CC33"
 # Parameters to tweak colour by:
 CALENDAR_HISTORIC_LIGHTER = 0.75
 CALENDAR_HISTORIC_SHADIER = 1.0
+# How long to cache the data for the editing calendar:
+CALENDAR_DATA_CACHE_TIMEOUT_SECONDS = 5 * 60
 
 
 ###############################################################################
@@ -207,6 +220,25 @@ THUMBNAIL_ALIASES = {
     },
 }
 
+# Cache shared between all the processes running the site (used for rendered
+# programme pages, etc.) The generation numbers for the namespaces in
+# toolkit.util.cache are kept separately, so they're never culled along with
+# the pages (there are only a few of them, so this never fills up):
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "var", "cache"),
+        "OPTIONS": {
+            "MAX_ENTRIES": 5000,
+        },
+    },
+    "generations": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "var", "cache-generations"),
+        "TIMEOUT": None,
+    },
+}
+
 # Custom tweaks:
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 APPEND_SLASH = True
@@ -338,6 +370,7 @@ TEMPLATES = [
                 "toolkit.util.context_processors.venue",
                 "toolkit.diary.context_processors.diary_settings",
                 "toolkit.diary.context_processors.promoted_tags",
+                "toolkit.content.context_processors.site_menu",
             ),
             # May be worth enabling for improved performance?
             # 'loaders':
@@ -0,0 +1,107 @@
+"""
+Helpers for caching things (mostly rendered pages) that have to be thrown
+away whenever the data they were built from changes.
+
+Rather than trying to find and delete every cache key that might depend on a
+changed row, each namespace has a "generation" number which is built into
+every key in that namespace. Invalidating the namespace just sets a new
+generation, so all the old keys stop being used and are left to expire.
+
+The generation is the time (in nanoseconds) the namespace was invalidated,
+which also serves things (like Last-Modified headers) that need a time
+rather than just a number that changes. It's written with a plain set(),
+rather than incr(), as not every backend's incr() is atomic or keeps the
+key's timeout. Generations are kept in their own cache (GENERATION_CACHE in
+settings.CACHES), so they aren't culled along with the (much more numerous)
+cached pages.
+"""
+
+import hashlib
+import logging
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Alias of the cache that holds the generations:
+GENERATION_CACHE = "generations"
+
+# Namespaces:
+# Public programme pages, invalidated when anything shown on them changes:
+PROGRAMME = "programme"
+# Data for the editing calendar, invalidated when showings, events or rooms
+# change:
+DIARY_CALENDAR = "diary_calendar"
+# Site navigation menu (promoted tags and CMS menu pages/links):
+NAVIGATION = "navigation"
+
+# Values held in this process's memory by get_local, as
+# {(namespace, key): (generation, value)}
+_local_values = {}
+
+
+def _generation_key(namespace: str) -> str:
+    return f"toolkit:generation:{namespace}"
+
+
+def get_generation(namespace: str) -> int:
+    generations = caches[GENERATION_CACHE]
+    key = _generation_key(namespace)
+    generation = generations.get(key)
+    if generation is None:
+        # Either never set, or lost. Start from the current time, rather
+        # than from 0, so keys from before it was lost can't be reused:
+        generations.add(key, time.time_ns(), timeout=None)
+        generation = generations.get(key, 0)
+    return generation
+
+
+def invalidate(namespace: str) -> None:
+    logger.debug(f"Invalidating cache namespace '{namespace}'")
+    # (If two processes do this at once, either value will do, as both are
+    # later than the old generation)
+    generation = max(time.time_ns(), get_generation(namespace) + 1)
+    caches[GENERATION_CACHE].set(
+        _generation_key(namespace), generation, timeout=None
+    )
+
+
+def get_invalidated_time(namespace: str) -> float:
+    """Return the time (as a unix timestamp) that the namespace was last
+    invalidated. If that isn't known (because it was lost, or never set)
+    then this is the first time it was asked for since, so the answer is
+    never earlier than the real one."""
+    return get_generation(namespace) / 1e9
+
+
+def invalidate_on_commit(namespace: str) -> None:
+    """Invalidate the namespace now, and again when the current transaction
+    (if any) commits. The second go catches anything that was cached by
+    another request between the change being made and being committed."""
+    invalidate(namespace)
+    transaction.on_commit(lambda: invalidate(namespace))
+
+
+def make_key(namespace: str, *parts) -> str:
+    """Build a key for the current generation of the namespace from the given
+    parts (which can be anything with a sensible str())"""
+    digest = hashlib.md5(
+        "\0".join(str(part) for part in parts).encode("utf-8")
+    ).hexdigest()
+    return f"toolkit:{namespace}:{get_generation(namespace)}:{digest}"
+
+
+def get_local(namespace: str, key, build):
+    """Return the value for key, held in this process's memory until the
+    namespace is invalidated (by any process), calling build() to make it if
+    necessary. For small things that are needed on nearly every request, so
+    are worth not even unpickling from the shared cache."""
+    generation = get_generation(namespace)
+    held = _local_values.get((namespace, key))
+    if held is not None and held[0] == generation:
+        return held[1]
+    value = build()
+    _local_values[(namespace, key)] = (generation, value)
+    return value
@@ -0,0 +1,56 @@
+"""
+Streaming CSV downloads.
+
+Rather than building the whole file in memory before sending any of it, the
+rows are written out as they're read from the database, a few at a time, so
+memory use doesn't depend on how many rows there are. Querysets should be
+passed as .values_list(...).iterator(chunk_size=CHUNK_SIZE), so that only the
+columns that are needed are fetched, and the model instances (and the
+queryset's result cache) are never built.
+"""
+
+import csv
+
+from django.http import StreamingHttpResponse
+
+# Rows to fetch from the database at a time:
+CHUNK_SIZE = 500
+# Rows to send to the client at a time:
+ROWS_PER_WRITE = 100
+
+
+class _Buffer:
+    # Minimal file-like object for csv.writer, which collects what's written
+    # until it's taken
+    def __init__(self):
+        self._parts = []
+
+    def write(self, value):
+        self._parts.append(value)
+
+    def take(self):
+        value = "".join(self._parts)
+        self._parts = []
+        return value
+
+
+def _generate_csv(header, rows):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % ROWS_PER_WRITE == 0:
+            yield buffer.take()
+    yield buffer.take()
+
+
+def stream_csv(filename, header, rows):
+    """Return a response that downloads a CSV file called filename, with the
+    header row followed by each of rows (an iterable of sequences, which is
+    consumed as the response is sent)"""
+    return StreamingHttpResponse(
+        _generate_csv(header, rows),
+        content_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,55 @@
+"""
+Generate the stored HTML version of the copy for events imported from the
+legacy toolkit (this normally happens when an event is saved, but events
+saved before the legacy_copy_html column was added won't have it).
+"""
+
+from django.core.management.base import BaseCommand
+
+from toolkit.diary.models import Event
+
+
+class Command(BaseCommand):
+    help = "Generate stored HTML for legacy event copy, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of events to load and update at a time",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Regenerate HTML for all legacy events, not just those "
+            "without it",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        events = Event.objects.filter(legacy_copy=True, copy__isnull=False)
+        if not options["all"]:
+            events = events.filter(legacy_copy_html__isnull=True)
+        events = events.only("pk", "copy", "legacy_copy").order_by("pk")
+
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(events.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for event in batch:
+                event.legacy_copy_html = event.legacy_copy_to_html()
+            # bulk_update() doesn't touch updated_at, which is right, as
+            # what's displayed hasn't changed. (Nor does it update the search
+            # index, which is also fine, as that only has names and copy)
+            Event.objects.bulk_update(batch, ["legacy_copy_html"])
+            updated += len(batch)
+            last_pk = batch[-1].pk
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Updated {updated} events...")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated HTML for {updated} legacy events")
+        )
@@ -0,0 +1,132 @@
+"""
+Time the data feed for the editing calendar (edit_diary_data) for a busy
+month, with and without the cached copy.
+
+The showings, events and rooms for the test month are created in a
+transaction which is rolled back afterwards, so this can be run against a
+real database without leaving anything behind. The month used is far in the
+future so that it won't include any real showings.
+"""
+
+import datetime
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+import django.utils.timezone as timezone
+
+from toolkit.diary.edit_views import edit_diary_data
+from toolkit.diary.models import Event, Room, Showing
+import toolkit.diary.search as search
+import toolkit.util.cache as toolkit_cache
+
+YEAR = 2199
+
+
+class Command(BaseCommand):
+    help = "Time the editing calendar data view for a busy month"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rooms",
+            type=int,
+            default=4,
+            help="Number of rooms",
+        )
+        parser.add_argument(
+            "--showings-per-day",
+            type=int,
+            default=6,
+            help="Number of showings per day in each room",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=20,
+            help="Number of requests to time in each case",
+        )
+
+    def _create_month(self, rooms, showings_per_day):
+        rooms = Room.objects.bulk_create(
+            Room(name=f"Benchmark room {n}", colour="#336699")
+            for n in range(rooms)
+        )
+        month_start = timezone.make_aware(datetime.datetime(YEAR, 1, 1, 10))
+        events = []
+        starts = []
+        for day in range(31):
+            for slot in range(showings_per_day):
+                for room in rooms:
+                    events.append(
+                        Event(
+                            name=f"Benchmark event {len(events)}",
+                            duration=datetime.time(1, 30),
+                            private=(slot % 3 == 0),
+                        )
+                    )
+                    starts.append(
+                        (
+                            month_start
+                            + datetime.timedelta(days=day, hours=2 * slot),
+                            room,
+                        )
+                    )
+        events = Event.objects.bulk_create(events)
+        search.update_index_many(events)
+        Showing.objects.bulk_create(
+            Showing(
+                event=event,
+                start=start,
+                room=room,
+                booked_by="Benchmark",
+                confirmed=bool(event.pk % 2),
+            )
+            for event, (start, room) in zip(events, starts)
+        )
+        return len(events)
+
+    def _time_requests(self, request, count, cached):
+        times = []
+        for _ in range(count):
+            if not cached:
+                toolkit_cache.invalidate(toolkit_cache.DIARY_CALENDAR)
+            started = time.perf_counter()
+            response = edit_diary_data(request)
+            times.append(time.perf_counter() - started)
+            assert response.status_code == 200
+        times.sort()
+        return times[len(times) // 2], times[-1]
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get(
+            reverse("edit-diary-data"),
+            {"start": f"{YEAR}-01-01", "end": f"{YEAR}-02-01"},
+        )
+        request.user = User(username="benchmark", is_superuser=True)
+
+        with transaction.atomic(), override_settings(MULTIROOM_ENABLED=True):
+            showings = self._create_month(
+                options["rooms"], options["showings_per_day"]
+            )
+            self.stdout.write(
+                f"{showings} showings in {options['rooms']} rooms"
+            )
+            # Warm up (connection, URL resolver, etc.):
+            edit_diary_data(request)
+
+            for cached in (False, True):
+                median, worst = self._time_requests(
+                    request, options["requests"], cached
+                )
+                self.stdout.write(
+                    f"{'Cached' if cached else 'Uncached'}: "
+                    f"median {median * 1000:.1f}ms, "
+                    f"worst {worst * 1000:.1f}ms per request"
+                )
+            transaction.set_rollback(True)
+        # Throw away anything cached for the month:
+        toolkit_cache.invalidate(toolkit_cache.DIARY_CALENDAR)
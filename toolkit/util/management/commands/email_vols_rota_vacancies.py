@@ -45,17 +45,11 @@ class Command(BaseCommand):
             .confirmed()
             .start_in_range(start, end_date)
             .order_by("start")
-            .prefetch_related("rotaentry_set__role")
+            .with_vacant_rota_entries()
             .select_related()
         )
         showings_vacant_roles = OrderedDict(
-            (
-                showing,
-                showing.rotaentry_set.filter(
-                    Q(name="") | Q(name__isnull=True)
-                ),
-            )
-            for showing in showings
+            (showing, showing.vacant_rota_entries) for showing in showings
         )
 
         # Surprisingly round-about way to get tomorrow's date:
@@ -0,0 +1,245 @@
+"""
+Render the public programme pages to static files, so they can be served
+directly by the web server (e.g. when there's a spike in traffic).
+
+The pages are rendered by the real views, using the Django test client, and
+written to <output_dir>/<url path>/index.html (or index.xml, for the RSS
+feed). Only the first page of each listing is exported; requests for
+later pages (which have a query string) should be passed on to Django.
+
+By default only the pages which depend on events or showings that have been
+updated since the last run are regenerated (along with the listings, which
+change every day anyway). The time of the last run is kept in a state file
+in the output directory. Changes that don't touch an updated_at column (e.g.
+changing an event's image or tags, or deleting a showing) won't be spotted;
+use --full to regenerate everything.
+"""
+
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import tempfile
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils.text import slugify
+import django.utils.timezone as timezone
+
+from toolkit.diary.models import Event, EventTag, Showing
+
+STATE_FILE = ".snapshot-state.json"
+
+# Output file name for each content type; anything not listed is an error:
+FILE_NAMES = {
+    "text/html": "index.html",
+    "application/rss+xml": "index.xml",
+}
+
+# Per-process state for rendering pages, set up by _init_renderer:
+_renderer = {}
+
+
+def _init_renderer(output_dir, host, secure):
+    _renderer["client"] = Client(HTTP_HOST=host)
+    _renderer["secure"] = secure
+    _renderer["output_dir"] = output_dir
+
+
+def _write_atomically(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as temp_file:
+        temp_file.write(content)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+
+
+def _render_page(url):
+    """Render the page at url and write it to the output directory. Returns
+    (url, result), where result is "written", "removed" (for pages that no
+    longer exist), or an error message"""
+    response = _renderer["client"].get(url, secure=_renderer["secure"])
+    page_dir = os.path.join(_renderer["output_dir"], url.strip("/"))
+
+    if response.status_code == 404:
+        # e.g. an event that's been made private. Remove any existing copy:
+        removed = False
+        for file_name in FILE_NAMES.values():
+            try:
+                os.unlink(os.path.join(page_dir, file_name))
+                removed = True
+            except FileNotFoundError:
+                pass
+        return url, "removed" if removed else "not found"
+    elif response.status_code != 200:
+        return url, f"failed with status {response.status_code}"
+
+    content_type = response["Content-Type"].split(";")[0].strip()
+    if content_type not in FILE_NAMES:
+        return url, f"unexpected content type {content_type}"
+    _write_atomically(
+        os.path.join(page_dir, FILE_NAMES[content_type]), response.content
+    )
+    return url, "written"
+
+
+class Command(BaseCommand):
+    help = "Render the public programme to static files in <output_dir>"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output_dir", type=str)
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Regenerate all pages, not just those that have changed "
+            "since the last run",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes to render pages with",
+        )
+        parser.add_argument(
+            "--host",
+            type=str,
+            default=None,
+            help="Host name to render pages for (default: the host in "
+            "the VENUE url setting)",
+        )
+
+    def _read_state(self, output_dir):
+        try:
+            with open(os.path.join(output_dir, STATE_FILE)) as state_file:
+                state = json.load(state_file)
+            return datetime.datetime.fromisoformat(state["last_run"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as exc:
+            raise CommandError(f"Invalid state file: {exc}")
+
+    def _write_state(self, output_dir, run_started):
+        _write_atomically(
+            os.path.join(output_dir, STATE_FILE),
+            json.dumps({"last_run": run_started.isoformat()}).encode("utf-8"),
+        )
+
+    def _listing_urls(self):
+        urls = [
+            reverse("programme-view"),
+            reverse("view-this-week"),
+            reverse("view-next-week"),
+            reverse("view-this-month"),
+            reverse("view-next-month"),
+            reverse("view-diary-rss"),
+            reverse("archive-view-index"),
+        ]
+        urls.extend(
+            reverse("type-view", kwargs={"event_type": slug})
+            for slug in EventTag.objects.values_list("slug", flat=True)
+        )
+        return urls
+
+    def _changed_urls(self, since):
+        # Pages for events, and archive pages for the months/years of
+        # showings, which have changed since the given time (or all of them,
+        # if since is None):
+        showings = Showing.objects.public()
+        events = Event.objects.all()
+        if since is not None:
+            changed_event_ids = set(
+                events.filter(updated_at__gt=since).values_list(
+                    "pk", flat=True
+                )
+            ) | set(
+                Showing.objects.filter(updated_at__gt=since).values_list(
+                    "event_id", flat=True
+                )
+            )
+            events = events.filter(pk__in=changed_event_ids)
+            showings = showings.filter(event_id__in=changed_event_ids)
+        else:
+            # Only events that have ever had a public showing:
+            events = events.filter(showings__in=showings).distinct()
+
+        urls = []
+        for event_id, name in events.values_list("pk", "name"):
+            urls.append(
+                reverse("single-event-view", kwargs={"event_id": event_id})
+            )
+            urls.append(
+                reverse(
+                    "single-event-view-with-slug",
+                    kwargs={"event_id": event_id, "event_slug": slugify(name)},
+                )
+            )
+        months = showings.dates("start", "month")
+        urls.extend(
+            reverse("archive-view-year", kwargs={"year": f"{year:04d}"})
+            for year in sorted({month.year for month in months})
+        )
+        urls.extend(
+            reverse(
+                "archive-view-month",
+                kwargs={"year": f"{month.year:04d}", "month": month.month},
+            )
+            for month in months
+        )
+        return urls
+
+    def handle(self, *args, **options):
+        output_dir = os.path.abspath(options["output_dir"])
+        venue_url = urlsplit(settings.VENUE["url"])
+        host = options["host"] or venue_url.netloc
+        secure = venue_url.scheme == "https"
+        workers = max(1, options["workers"])
+
+        run_started = timezone.now()
+        since = None if options["full"] else self._read_state(output_dir)
+
+        urls = self._listing_urls() + self._changed_urls(since)
+        self.stdout.write(
+            f"Rendering {len(urls)} pages"
+            + (f" (changes since {since})" if since else "")
+        )
+
+        if workers == 1:
+            _init_renderer(output_dir, host, secure)
+            results = map(_render_page, urls)
+        else:
+            # Don't share database connections with the worker processes:
+            connections.close_all()
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_renderer,
+                initargs=(output_dir, host, secure),
+            )
+            results = executor.map(_render_page, urls, chunksize=8)
+
+        counts = {}
+        failed = False
+        try:
+            for url, result in results:
+                counts[result] = counts.get(result, 0) + 1
+                if result not in ("written", "removed", "not found"):
+                    failed = True
+                    self.stderr.write(f"{url}: {result}")
+                elif options["verbosity"] > 1:
+                    self.stdout.write(f"{url}: {result}")
+        finally:
+            if workers > 1:
+                executor.shutdown()
+
+        self.stdout.write(
+            ", ".join(f"{count} {result}" for result, count in counts.items())
+        )
+        if failed:
+            raise CommandError("Some pages couldn't be rendered")
+        self._write_state(output_dir, run_started)
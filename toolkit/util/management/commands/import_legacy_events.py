@@ -28,10 +28,10 @@ import zoneinfo
 import shutil
 
 from django.core.management.base import BaseCommand
-import django.utils.timezone
 
-from toolkit.diary.models import Event, EventTag, Showing, Room
+from toolkit.diary.models import Event, EventTag, Room
 from toolkit.diary.models import MediaItem
+from toolkit.diary.bookings import create_showings
 
 import MySQLdb
 
@@ -151,6 +151,7 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
 
         timezone = zoneinfo.ZoneInfo("Europe/London")
+        cinema = Room.objects.filter(name="Cinema").first()
         db = self._conn_to_archive_database()
         cursor = db.cursor()
 
@@ -271,29 +272,20 @@ class Command(BaseCommand):
                     media_item.save()
                     e.media.add(media_item)
 
-                # Graft event to a showing
-                fake_start = django.utils.timezone.now() + datetime.timedelta(
-                    days=1
-                )
-
-                s = Showing()
-                s.event = e
-                # The full_clean checks that start is in the future
-                # so set a valid start date now, and after the call to
-                # full_clean change it to the actual value before saving
-                s.start = fake_start
+                # Graft event to a showing (allowing a start in the past)
                 if programmerName is not None and programmerName.strip() != "":
-                    s.booked_by = programmerName
+                    booked_by = programmerName
                 else:
-                    s.booked_by = "unknown"
-                s.confirmed = True
-                s.room = Room.objects.filter(name="Cinema").first()
-
-                s.full_clean()
-                # Store datetime with timezone information
-                s.start = startDateAsaTime.replace(tzinfo=timezone)
-                # Force, to allow saving of showing with start in past
-                s.save(force=True)
+                    booked_by = "unknown"
+                create_showings(
+                    e,
+                    # Store datetime with timezone information
+                    [startDateAsaTime.replace(tzinfo=timezone)],
+                    allow_past=True,
+                    booked_by=booked_by,
+                    confirmed=True,
+                    room=cinema,
+                )
 
             self.stdout.write(
                 self.style.SUCCESS(f"{table} {len(events)} events imported")
@@ -395,29 +387,20 @@ class Command(BaseCommand):
                 media_item.save()
                 e.media.add(media_item)
 
-            # Graft event to a showing
-            fake_start = django.utils.timezone.now() + datetime.timedelta(
-                days=1
-            )
-
-            s = Showing()
-            s.event = e
-            # The full_clean checks that start is in the future
-            # so set a valid start date now, and after the call to
-            # full_clean change it to the actual value before saving
-            s.start = fake_start
+            # Graft event to a showing (allowing a start in the past)
             if programmerName is not None and programmerName.strip() != "":
-                s.booked_by = programmerName
+                booked_by = programmerName
             else:
-                s.booked_by = "unknown"
-            s.confirmed = True
-            s.room = Room.objects.filter(name="Cinema").first()
-
-            s.full_clean()
-            # Store datetime with timezone information
-            s.start = timezone.localize(startDateAsaTime)
-            # Force, to allow saving of showing with start in past
-            s.save(force=True)
+                booked_by = "unknown"
+            create_showings(
+                e,
+                # Store datetime with timezone information
+                [startDateAsaTime.replace(tzinfo=timezone)],
+                allow_past=True,
+                booked_by=booked_by,
+                confirmed=True,
+                room=cinema,
+            )
 
         self.stdout.write(
             self.style.SUCCESS(f"{len(films)} legacy films imported")